@@ -0,0 +1,448 @@
+"""
+Almacenamiento durable de respuestas.
+
+Las respuestas se guardan en una base SQLite embebida (modo WAL) en lugar de
+vivir solo en ``st.session_state``, de modo que sobreviven a recargas del
+navegador y reinicios del servidor. Varios procesos de Streamlit del mismo
+host pueden compartir la base: cada uno escribe desde un único hilo con
+commits agrupados, y los números de ficha salen de un contador global.
+Las lecturas usan el índice por sesión.
+
+Cada respuesta puede llevar un token de idempotencia (un reintento con el
+mismo token no agrega otra fila) y la huella del encuestado; ambos tienen
+índice, de modo que ``buscar_duplicado`` resuelve en O(1) (ver
+``duplicados.py``).
+
+Como los ids solo crecen, la tabla es también la bandeja de salida de la
+sincronización con un colector central (ver ``sincronizacion.py``):
+``pendientes`` lee las filas posteriores a la marca de agua que el colector
+confirmó (``marca_envio`` / ``confirmar_envio``).
+
+El backend es intercambiable: ``abrir_almacen()`` elige la implementación
+según la variable de entorno ``KEPCHUP_ALMACEN`` ("sqlite:///ruta.db" o
+"memoria").
+"""
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from duplicados import IndiceDuplicados
+
+RUTA_POR_DEFECTO = os.path.join("datos", "respuestas.db")
+
+
+class AlmacenBase:
+    """API mínima que deben ofrecer todos los backends."""
+
+    def append(self, sesion, respuesta, esperar=True, token=None, huella=None):
+        """
+        Guarda la respuesta y devuelve su id. Si ``token`` ya está guardado
+        no agrega nada y devuelve el id de esa fila. Con ``esperar=False`` el
+        backend puede devolver antes de confirmar (``flush`` espera).
+        """
+        raise NotImplementedError
+
+    def buscar_duplicado(self, token=None, huella=None):
+        """``("token", ficha)`` o ``("huella", ficha)`` de una respuesta ya guardada, o None."""
+        raise NotImplementedError
+
+    def asignar_ficha(self):
+        """Número de ficha nuevo, único y creciente para todo el almacén."""
+        raise NotImplementedError
+
+    def count(self, sesion=None):
+        raise NotImplementedError
+
+    def version(self, sesion=None):
+        """Número monótono que cambia con cada ``append`` (sirve como clave de caché)."""
+        raise NotImplementedError
+
+    def iterate(self, sesion=None, tam_bloque=500, desde=0):
+        """Respuestas en orden de guardado, salteando las primeras ``desde``."""
+        raise NotImplementedError
+
+    def iterate_desde_id(self, marca=0, tam_bloque=500):
+        """
+        Pares ``(id, respuesta)`` de todas las sesiones con id mayor que
+        ``marca``, en orden de id (para mantener agregados incrementales).
+        """
+        raise NotImplementedError
+
+    def pendientes(self, marca=0, limite=500):
+        """
+        Hasta ``limite`` filas ``(id, sesion, token, huella, guardada,
+        respuesta)`` con id mayor que ``marca``, en orden de id (``guardada``
+        es la hora del guardado en segundos desde la época, o None en filas
+        anteriores a la sincronización).
+        """
+        raise NotImplementedError
+
+    def marca_envio(self, destino):
+        """Id de la última fila que ``destino`` confirmó haber recibido (0 si ninguna)."""
+        raise NotImplementedError
+
+    def confirmar_envio(self, destino, marca):
+        """Registra que ``destino`` recibió las filas hasta ``marca`` (la marca nunca retrocede)."""
+        raise NotImplementedError
+
+    def to_frame(self, sesion=None):
+        import pandas as pd
+        return pd.DataFrame.from_records(list(self.iterate(sesion)))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+class AlmacenMemoria(AlmacenBase):
+    """Backend volátil (equivalente a la lista en ``st.session_state``)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filas = {}
+        self._orden = []  # todas las respuestas; la de id i está en la posición i - 1
+        self._meta = []  # (sesion, token, huella, guardada) de cada respuesta, como _orden
+        self._envios = {}
+        self._versiones = {}
+        self._version = 0
+        self._ultima_ficha = 0
+        self._indice = IndiceDuplicados()  # token/huella -> (id, ficha)
+
+    def append(self, sesion, respuesta, esperar=True, token=None, huella=None):
+        with self._lock:
+            previa = self._indice.buscar(token=token)
+            if previa is not None:
+                return previa[1][0]
+            filas = self._filas.setdefault(sesion, [])
+            filas.append(dict(respuesta))
+            self._orden.append(filas[-1])
+            self._meta.append((sesion, token, huella, time.time()))
+            self._version += 1
+            self._versiones[sesion] = self._version
+            self._indice.agregar((self._version, str(respuesta.get("Ficha N°", ""))), token, huella)
+            return self._version
+
+    def buscar_duplicado(self, token=None, huella=None):
+        with self._lock:
+            previa = self._indice.buscar(token, huella)
+        return None if previa is None else (previa[0], previa[1][1])
+
+    def asignar_ficha(self):
+        with self._lock:
+            self._ultima_ficha += 1
+            return self._ultima_ficha
+
+    def count(self, sesion=None):
+        with self._lock:
+            if sesion is None:
+                return sum(len(f) for f in self._filas.values())
+            return len(self._filas.get(sesion, ()))
+
+    def version(self, sesion=None):
+        with self._lock:
+            if sesion is None:
+                return self._version
+            return self._versiones.get(sesion, 0)
+
+    def iterate(self, sesion=None, tam_bloque=500, desde=0):
+        with self._lock:
+            if sesion is None:
+                filas = self._orden[desde:]  # en orden de guardado, como SQLite
+            else:
+                filas = self._filas.get(sesion, [])[desde:]
+        for fila in filas:
+            yield dict(fila)
+
+    def iterate_desde_id(self, marca=0, tam_bloque=500):
+        with self._lock:
+            filas = self._orden[marca:]
+        for id_fila, fila in enumerate(filas, start=marca + 1):
+            yield id_fila, dict(fila)
+
+    def pendientes(self, marca=0, limite=500):
+        with self._lock:
+            filas = self._orden[marca:marca + limite]
+            metas = self._meta[marca:marca + limite]
+        return [(id_fila, *meta, dict(fila)) for id_fila, (meta, fila) in enumerate(zip(metas, filas), start=marca + 1)]
+
+    def marca_envio(self, destino):
+        with self._lock:
+            return self._envios.get(destino, 0)
+
+    def confirmar_envio(self, destino, marca):
+        with self._lock:
+            self._envios[destino] = max(self._envios.get(destino, 0), marca)
+
+
+class AlmacenSQLite(AlmacenBase):
+    """
+    Backend SQLite en modo WAL, compartible entre varios procesos del host.
+
+    Cada proceso tiene un único hilo escritor alimentado por una cola. El
+    escritor agrupa lo que esté encolado (hasta ``tam_lote`` filas) en una sola
+    transacción ``BEGIN IMMEDIATE`` (group commit): mientras confirma un lote,
+    las fichas que llegan forman el siguiente. ``append`` espera por defecto el
+    commit de su lote, de modo que al volver la ficha ya es durable y visible
+    para todos los procesos.
+
+    Entre procesos, la exclusión la dan los bloqueos de archivo de SQLite: la
+    transacción del escritor toma el bloqueo de escritura y los demás esperan
+    hasta ``espera_bloqueo`` segundos. Las lecturas no bloquean (WAL).
+    """
+
+    def __init__(self, ruta=RUTA_POR_DEFECTO, tam_lote=256, espera_bloqueo=30.0):
+        carpeta = os.path.dirname(ruta)
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+        self.ruta = ruta
+        self.tam_lote = tam_lote
+        self.espera_bloqueo = espera_bloqueo
+        self.commits = 0
+        self._lock = threading.RLock()
+        # Conexión para lecturas y para asignar fichas (la usan los hilos de
+        # las sesiones de Streamlit, protegida por el lock).
+        self._con = self._conectar()
+        self._con.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS respuestas (
+                id     INTEGER PRIMARY KEY AUTOINCREMENT,
+                sesion TEXT NOT NULL,
+                ficha  TEXT,
+                fecha  TEXT,
+                datos  TEXT NOT NULL,
+                token  TEXT,
+                huella TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_respuestas_sesion ON respuestas (sesion, id);
+            CREATE TABLE IF NOT EXISTS fichas (
+                id     INTEGER PRIMARY KEY CHECK (id = 1),
+                ultima INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO fichas (id, ultima) VALUES (1, 0);
+            CREATE TABLE IF NOT EXISTS envios (
+                destino TEXT PRIMARY KEY,
+                marca   INTEGER NOT NULL
+            );
+            """
+        )
+        # Bases creadas antes de los tokens, las huellas y la sincronización
+        existentes = {fila[1] for fila in self._con.execute("PRAGMA table_info(respuestas)")}
+        for columna, tipo in (("token", "TEXT"), ("huella", "TEXT"), ("guardada", "REAL")):
+            if columna not in existentes:
+                self._con.execute(f"ALTER TABLE respuestas ADD COLUMN {columna} {tipo}")
+        self._con.executescript(
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_respuestas_token ON respuestas (token) WHERE token IS NOT NULL;
+            CREATE INDEX IF NOT EXISTS idx_respuestas_huella ON respuestas (huella) WHERE huella IS NOT NULL;
+            """
+        )
+        self._cola = queue.Queue()
+        self._escritor = threading.Thread(target=self._escribir, name="almacen-escritor", daemon=True)
+        self._escritor.start()
+        atexit.register(self.close)
+
+    def _conectar(self):
+        con = sqlite3.connect(self.ruta, timeout=self.espera_bloqueo, check_same_thread=False,
+                              isolation_level=None)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        return con
+
+    def append(self, sesion, respuesta, esperar=True, token=None, huella=None):
+        """
+        Encola la respuesta para el escritor. Con ``esperar`` devuelve el id de
+        la fila una vez confirmada (o el de la fila que ya tenía ``token``);
+        si no, devuelve un ``Future``.
+        """
+        datos = json.dumps(respuesta, ensure_ascii=False, default=str)
+        futuro = Future()
+        self._cola.put(((sesion, str(respuesta.get("Ficha N°", "")), respuesta.get("Fecha"), datos, token, huella,
+                         time.time()), futuro))
+        return futuro.result() if esperar else futuro
+
+    def buscar_duplicado(self, token=None, huella=None):
+        with self._lock:
+            for motivo, valor in (("token", token), ("huella", huella)):
+                if valor is None:
+                    continue
+                fila = self._con.execute(
+                    f"SELECT ficha FROM respuestas WHERE {motivo} = ? LIMIT 1", (valor,)
+                ).fetchone()
+                if fila is not None:
+                    return motivo, fila[0]
+        return None
+
+    def asignar_ficha(self):
+        # Un solo UPDATE atómico sobre el contador: único y monótono entre
+        # todos los procesos que comparten la base.
+        with self._lock:
+            # fetchall() termina la sentencia y libera el bloqueo de escritura
+            (ultima,), = self._con.execute(
+                "UPDATE fichas SET ultima = ultima + 1 WHERE id = 1 RETURNING ultima"
+            ).fetchall()
+            return ultima
+
+    def count(self, sesion=None):
+        with self._lock:
+            if sesion is None:
+                cur = self._con.execute("SELECT COUNT(*) FROM respuestas")
+            else:
+                cur = self._con.execute("SELECT COUNT(*) FROM respuestas WHERE sesion = ?", (sesion,))
+            return cur.fetchone()[0]
+
+    def version(self, sesion=None):
+        # El id autoincremental nunca se reutiliza: su máximo es una versión
+        # monótona que se resuelve con el índice (sesion, id).
+        with self._lock:
+            if sesion is None:
+                cur = self._con.execute("SELECT COALESCE(MAX(id), 0) FROM respuestas")
+            else:
+                cur = self._con.execute(
+                    "SELECT COALESCE(MAX(id), 0) FROM respuestas WHERE sesion = ?", (sesion,)
+                )
+            return cur.fetchone()[0]
+
+    def iterate(self, sesion=None, tam_bloque=500, desde=0):
+        # Recorrido por bloques sobre la clave primaria: no se mantiene un
+        # cursor abierto entre bloques ni se carga toda la tabla.
+        ultimo = 0
+        if desde:
+            with self._lock:
+                if sesion is None:
+                    cur = self._con.execute("SELECT id FROM respuestas ORDER BY id LIMIT 1 OFFSET ?", (desde - 1,))
+                else:
+                    cur = self._con.execute(
+                        "SELECT id FROM respuestas WHERE sesion = ? ORDER BY id LIMIT 1 OFFSET ?", (sesion, desde - 1)
+                    )
+                fila = cur.fetchone()
+            if fila is None:
+                return
+            ultimo = fila[0]
+        while True:
+            with self._lock:
+                if sesion is None:
+                    cur = self._con.execute(
+                        "SELECT id, datos FROM respuestas WHERE id > ? ORDER BY id LIMIT ?",
+                        (ultimo, tam_bloque),
+                    )
+                else:
+                    cur = self._con.execute(
+                        "SELECT id, datos FROM respuestas WHERE sesion = ? AND id > ? ORDER BY id LIMIT ?",
+                        (sesion, ultimo, tam_bloque),
+                    )
+                bloque = cur.fetchall()
+            if not bloque:
+                return
+            for ultimo, datos in bloque:
+                yield json.loads(datos)
+
+    def iterate_desde_id(self, marca=0, tam_bloque=500):
+        while True:
+            with self._lock:
+                bloque = self._con.execute(
+                    "SELECT id, datos FROM respuestas WHERE id > ? ORDER BY id LIMIT ?", (marca, tam_bloque)
+                ).fetchall()
+            if not bloque:
+                return
+            for marca, datos in bloque:
+                yield marca, json.loads(datos)
+
+    def pendientes(self, marca=0, limite=500):
+        with self._lock:
+            bloque = self._con.execute(
+                "SELECT id, sesion, token, huella, guardada, datos FROM respuestas WHERE id > ? ORDER BY id LIMIT ?",
+                (marca, limite),
+            ).fetchall()
+        return [(*fila[:5], json.loads(fila[5])) for fila in bloque]
+
+    def marca_envio(self, destino):
+        with self._lock:
+            fila = self._con.execute("SELECT marca FROM envios WHERE destino = ?", (destino,)).fetchone()
+        return 0 if fila is None else fila[0]
+
+    def confirmar_envio(self, destino, marca):
+        # Varios procesos pueden sincronizar la misma base: la marca solo avanza
+        with self._lock:
+            self._con.execute(
+                "INSERT INTO envios (destino, marca) VALUES (?, ?) "
+                "ON CONFLICT (destino) DO UPDATE SET marca = MAX(marca, excluded.marca)",
+                (destino, marca),
+            )
+
+    def flush(self):
+        """Espera a que todo lo encolado hasta ahora esté confirmado."""
+        if self._escritor.is_alive():
+            futuro = Future()
+            self._cola.put((None, futuro))
+            futuro.result()
+
+    def close(self):
+        if self._escritor.is_alive():
+            self._cola.put(None)
+            self._escritor.join()
+        with self._lock:
+            self._con.close()
+        atexit.unregister(self.close)
+
+    def _escribir(self):
+        con = self._conectar()
+        terminar = False
+        while not terminar:
+            item = self._cola.get()
+            lote = []
+            while item is not None:
+                lote.append(item)
+                if len(lote) >= self.tam_lote:
+                    break
+                try:
+                    item = self._cola.get_nowait()
+                except queue.Empty:
+                    break
+            else:
+                terminar = True
+            filas = [(fila, futuro) for fila, futuro in lote if fila is not None]
+            try:
+                ids = []
+                if filas:
+                    con.execute("BEGIN IMMEDIATE")
+                    for fila, _ in filas:
+                        cur = con.execute(
+                            "INSERT INTO respuestas (sesion, ficha, fecha, datos, token, huella, guardada) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (token) WHERE token IS NOT NULL DO NOTHING",
+                            fila,
+                        )
+                        if cur.rowcount:
+                            ids.append(cur.lastrowid)
+                        else:
+                            # Reintento de un envío ya guardado: se devuelve esa fila
+                            ids.append(con.execute("SELECT id FROM respuestas WHERE token = ?", (fila[4],))
+                                       .fetchone()[0])
+                    con.execute("COMMIT")
+                    self.commits += 1
+            except Exception as error:
+                if con.in_transaction:
+                    con.execute("ROLLBACK")
+                for _, futuro in lote:
+                    futuro.set_exception(error)
+                continue
+            resultados = iter(ids)
+            for fila, futuro in lote:
+                futuro.set_result(next(resultados) if fila is not None else None)
+        con.close()
+
+
+def abrir_almacen(url=None):
+    """Crea el backend indicado por ``url`` o por ``KEPCHUP_ALMACEN``."""
+    url = url or os.environ.get("KEPCHUP_ALMACEN", "sqlite:///" + RUTA_POR_DEFECTO)
+    if url == "memoria":
+        return AlmacenMemoria()
+    if url.startswith("sqlite:///"):
+        return AlmacenSQLite(url[len("sqlite:///"):])
+    raise ValueError(f"Backend de almacenamiento desconocido: {url}")
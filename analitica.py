@@ -0,0 +1,176 @@
+"""
+Tablas de análisis mantenidas de forma incremental.
+
+La pestaña de análisis muestra, sobre todas las respuestas del almacén:
+
+- aceptación (porcentaje de "Sí" de las preguntas de ``aceptacion``) por
+  cada agrupación de ``por`` (género, rangos de edad);
+- co-ocurrencia de las casillas de ``coocurrencia``: cuántas respuestas
+  marcan a la vez cada par (la diagonal es el total de cada una);
+- participación de cada opción de ``participacion`` (marca preferida).
+
+En lugar de recalcularlas sobre un DataFrame con todas las fichas, son
+contadores: cada respuesta nueva los actualiza en O(1) y las tablas se arman
+en tiempo constante, haya las fichas que haya. ``actualizar()`` lee del
+almacén solo las filas con id mayor que la marca de agua (las guardadas por
+esta sesión, por otras o por otros procesos; las de otros cuestionarios que
+comparten el almacén se saltean) y ``reconstruir()`` vuelve a contar desde
+cero.
+
+Qué se cruza se declara en el bloque ``analitica`` del esquema.
+"""
+import bisect
+import threading
+from collections import Counter
+
+import metricas
+
+SIN_DATO = "(sin dato)"
+
+
+def _marcada(valor):
+    # Casillas ("Sí"/"No") y textos de "otros" (vacío si no se marcó)
+    return valor not in (None, "", "No", False)
+
+
+def _porcentaje(parte, total):
+    return round(100 * parte / total, 1) if total else None
+
+
+def _markdown(filas):
+    # Las tablas son chicas y de tamaño fijo: una tabla de markdown evita
+    # pasar por pandas/Arrow (y cargarlos) en cada dibujo de la pestaña
+    columnas = list(filas[0])
+    lineas = ["| " + " | ".join(columnas) + " |", "|" + " --- |" * len(columnas)]
+    for fila in filas:
+        lineas.append("| " + " | ".join("–" if fila[c] is None else str(fila[c]) for c in columnas) + " |")
+    return "\n".join(lineas)
+
+
+class TablasAnaliticas:
+    """Contadores de las tablas de análisis de un esquema (uno por proceso)."""
+
+    def __init__(self, definicion):
+        self.definicion = definicion
+        self._lock = threading.Lock()
+        self._reiniciar()
+
+    def _reiniciar(self):
+        self.marca = 0  # id de la última respuesta contada
+        self.n = 0
+        # columna de agrupación -> Counter(grupo -> respuestas)
+        self.grupos = {columna: Counter() for columna, _, _ in self.definicion["por"]}
+        # columna de agrupación -> Counter((grupo, pregunta) -> respuestas "Sí")
+        self.si = {columna: Counter() for columna, _, _ in self.definicion["por"]}
+        k = len(self.definicion["coocurrencia"])
+        self.pares = [[0] * k for _ in range(k)]
+        self.participacion = Counter()
+
+    def _grupo(self, valor, cortes):
+        if cortes is None:
+            return valor if valor not in (None, "") else SIN_DATO
+        try:
+            return bisect.bisect_right(cortes, float(valor))
+        except (TypeError, ValueError):
+            return SIN_DATO
+
+    def agregar(self, respuesta):
+        """Cuenta una respuesta (diccionario con etiquetas, como en el almacén)."""
+        definicion = self.definicion
+        for columna, cortes, etiquetas in definicion["por"]:
+            grupo = self._grupo(respuesta.get(columna), cortes)
+            if cortes is not None and grupo != SIN_DATO:
+                grupo = etiquetas[grupo]
+            self.grupos[columna][grupo] += 1
+            si = self.si[columna]
+            for pregunta in definicion["aceptacion"]:
+                if respuesta.get(pregunta) == "Sí":
+                    si[grupo, pregunta] += 1
+        marcadas = [i for i, columna in enumerate(definicion["coocurrencia"]) if _marcada(respuesta.get(columna))]
+        for i in marcadas:
+            fila = self.pares[i]
+            for j in marcadas:
+                fila[j] += 1
+        if definicion["participacion"] is not None:
+            self.participacion[respuesta.get(definicion["participacion"]) or SIN_DATO] += 1
+        self.n += 1
+
+    @metricas.medido("analisis.actualizar")
+    def actualizar(self, almacen):
+        """Cuenta las respuestas guardadas después de la marca; devuelve cuántas."""
+        columnas = self.definicion["columnas"]
+        with self._lock:
+            nuevas = 0
+            for self.marca, respuesta in almacen.iterate_desde_id(self.marca):
+                # Respuestas de otro cuestionario que comparte el almacén
+                if not columnas <= respuesta.keys():
+                    continue
+                self.agregar(respuesta)
+                nuevas += 1
+            return nuevas
+
+    def reconstruir(self, almacen):
+        """Vuelve a contar todas las respuestas del almacén."""
+        with self._lock:
+            self._reiniciar()
+        return self.actualizar(almacen)
+
+    # ---- Tablas (listas de filas) ----
+    def _orden(self, conocidos, contador):
+        # Primero los grupos declarados (aunque aún no tengan respuestas) y
+        # después los que aparezcan en respuestas viejas o incompletas
+        return list(conocidos) + sorted((g for g in contador if g not in conocidos), key=str)
+
+    def tabla_aceptacion(self, columna):
+        with self._lock:
+            _, _, etiquetas = next(p for p in self.definicion["por"] if p[0] == columna)
+            grupos, si = self.grupos[columna], self.si[columna]
+            filas = []
+            for grupo in self._orden(etiquetas, grupos):
+                fila = {columna: grupo, "n": grupos[grupo]}
+                for pregunta in self.definicion["aceptacion"]:
+                    fila[f"{pregunta} (% Sí)"] = _porcentaje(si[grupo, pregunta], grupos[grupo])
+                filas.append(fila)
+            fila = {columna: "Total", "n": self.n}
+            for pregunta in self.definicion["aceptacion"]:
+                total = sum(si[grupo, pregunta] for grupo in grupos)
+                fila[f"{pregunta} (% Sí)"] = _porcentaje(total, self.n)
+            filas.append(fila)
+            return filas
+
+    def tabla_coocurrencia(self):
+        with self._lock:
+            columnas = self.definicion["coocurrencia"]
+            return [{"": columnas[i], **dict(zip(columnas, fila))} for i, fila in enumerate(self.pares)]
+
+    def tabla_participacion(self):
+        with self._lock:
+            columna = self.definicion["participacion"]
+            return [
+                {columna: opcion, "n": self.participacion[opcion],
+                 "%": _porcentaje(self.participacion[opcion], self.n)}
+                for opcion in self._orden(self.definicion["opciones_participacion"], self.participacion)
+            ]
+
+
+def mostrar_analitica(tablas, almacen):
+    """Pestaña de análisis: se pone al día con el almacén y dibuja las tablas."""
+    import streamlit as st
+
+    if st.button("Recalcular desde el almacén", key="analisis_reconstruir"):
+        tablas.reconstruir(almacen)
+    else:
+        tablas.actualizar(almacen)
+    definicion = tablas.definicion
+    st.markdown(f"**Respuestas analizadas:** {tablas.n} (todas las sesiones)")
+    if definicion["aceptacion"]:
+        st.subheader("Aceptación")
+        for columna, _, _ in definicion["por"]:
+            st.markdown(_markdown(tablas.tabla_aceptacion(columna)))
+    if definicion["coocurrencia"]:
+        st.subheader("Co-ocurrencia de aderezos similares")
+        st.caption("Respuestas que marcan a la vez la fila y la columna (la diagonal es el total de cada una).")
+        st.markdown(_markdown(tablas.tabla_coocurrencia()))
+    if definicion["participacion"] is not None:
+        st.subheader("Participación por marca")
+        st.markdown(_markdown(tablas.tabla_participacion()))
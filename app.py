@@ -1,264 +1,288 @@
 import streamlit as st
-import pandas as pd
-from io import BytesIO
 import datetime
+import os
 import uuid
+from functools import partial
+from almacen import abrir_almacen
+from busqueda import IndiceBusqueda
+from duplicados import aviso
+from analitica import TablasAnaliticas, mostrar_analitica
+from esquema import cargar_esquema
+from exportaciones import LISTO, ColaExportaciones, ColaLlena
+from exportar import EXPORTADORES, MIME
+import metricas
+import sesiones
+import sincronizacion
+from registro_compacto import codec_para
 
 # Configuración de la página
 st.set_page_config(page_title="Evaluación sensorial", layout="wide")
 
-# Generar identificador único de sesión
+# Tiempos por sección (solo con KEPCHUP_METRICAS=1)
+metricas.iniciar_endpoint()
+
+# Almacén durable compartido por todas las sesiones del proceso
+@st.cache_resource
+def obtener_almacen():
+    return abrir_almacen()
+
+almacen = obtener_almacen()
+
+# Envío de las respuestas al colector central en segundo plano (solo con
+# KEPCHUP_COLECTOR): el kiosco sigue funcionando sin conexión
+@st.cache_resource
+def obtener_sincronizador():
+    return sincronizacion.iniciar(almacen)
+
+sincronizador = obtener_sincronizador()
+
+# Cuestionario del estudio (compilado una vez por proceso)
+NOMBRE_ESQUEMA = os.environ.get("KEPCHUP_ESQUEMA", "evaluacion_sensorial")
+esquema = cargar_esquema(NOMBRE_ESQUEMA)
+codec = codec_para(esquema)
+
+
+# Tablas de análisis de todas las sesiones: contadores compartidos por el
+# proceso (una por esquema) que se ponen al día con el almacén (la primera
+# vez lo recorren)
+@st.cache_resource
+def obtener_analitica(nombre_esquema):
+    return TablasAnaliticas(esquema.analitica)
+
+analitica = obtener_analitica(NOMBRE_ESQUEMA) if esquema.analitica else None
+
+
+def frame_sesion(sesion):
+    """
+    Respuestas de la sesión en columnas tipadas, con su índice para el
+    buscador; solo se leen (e indexan) las nuevas.
+    """
+    coleccion = st.session_state.get("coleccion")
+    if coleccion is None or coleccion[0] != sesion:
+        coleccion = st.session_state.coleccion = (sesion, codec.coleccion(),
+                                                  IndiceBusqueda(esquema.columnas_busqueda))
+    for fila in almacen.iterate(sesion, desde=len(coleccion[1])):
+        codec.agregar(coleccion[1], fila)
+        coleccion[2].agregar(fila)
+    registrar_sesion()
+    return coleccion[1].frame()
+
+
+def buscar_en_sesion(consulta):
+    """Posiciones de las respuestas de la sesión que coinciden con el buscador."""
+    return st.session_state.coleccion[2].buscar(consulta)
+
+
+def liberar_sesion(coleccion, visor):
+    """
+    Vacía la copia en columnas y la caché del visor de una sesión inactiva
+    (las respuestas ya están en el almacén).
+    """
+    almacen.flush()
+    if coleccion is not None:
+        coleccion[1].clear()
+        coleccion[2].clear()
+    if visor is not None:
+        visor.clear()
+
+
+def registrar_sesion():
+    """Marca la sesión como en uso en el registro de sesiones del proceso."""
+    coleccion, visor = st.session_state.get("coleccion"), st.session_state.get("_visor_respuestas")
+    sesiones.tocar("app.py", [coleccion, visor], partial(liberar_sesion, coleccion, visor))
+
+# Generar identificador único de sesión (se conserva en la URL para que una
+# recarga del navegador recupere las respuestas ya guardadas)
 if 'session_id' not in st.session_state:
-    st.session_state.session_id = str(uuid.uuid4())
+    st.session_state.session_id = st.query_params.get("sesion") or str(uuid.uuid4())
+    st.query_params["sesion"] = st.session_state.session_id
+
+# Token de idempotencia del envío en curso: va en la clave del formulario y en
+# los argumentos de su botón, de modo que un reenvío del formulario ya dibujado
+# (doble toque, reintento) trae el token viejo. Se renueva después de guardar.
+if 'token_envio' not in st.session_state:
+    st.session_state.token_envio = uuid.uuid4().hex
+
+# Registro de sesiones del proceso: si la sesión queda inactiva se libera su
+# copia en columnas (se vuelve a leer del almacén al volver)
+registrar_sesion()
+
+# Exportaciones en segundo plano: pool acotado compartido por las sesiones
+# del proceso, con los archivos en una carpeta de spool
+@st.cache_resource
+def obtener_exportaciones():
+    return ColaExportaciones()
+
+exportaciones = obtener_exportaciones()
+
 
-# ---- ESTILOS PERSONALIZADOS (sin cambios) ----
-st.markdown(
+@metricas.medido("exportar", app="app.py")
+def escribir_excel(sesion, ruta, progreso):
     """
-    <style>
-    .stApp {
-        background-color: #d4edda;
-        color: black;
-    }
-    .stTextInput label, .stNumberInput label, .stSelectbox label, 
-    .stRadio label, .stCheckbox label {
-        color: black !important;
-        font-weight: 500;
-    }
-    .stTextInput input, .stNumberInput input, .stSelectbox select, 
-    .stTextArea textarea, .stDateInput input {
-        background-color: white !important;
-        color: black !important;
-        border: 1px solid #aaa !important;
-    }
-    .stButton button {
-        background-color: #28a745;
-        color: white;
-        border: 1px solid #1e7e34;
-    }
-    .stButton button:hover {
-        background-color: #218838;
-        color: white;
-    }
-    .stTabs [data-baseweb="tab-list"] {
-        background-color: #c3e6cb;
-        border: 1px solid #28a745;
-        border-radius: 8px;
-        padding: 4px;
-    }
-    .stTabs [data-baseweb="tab"] {
-        color: black;
-        border-radius: 6px;
-        padding: 8px 16px;
-        margin: 2px;
-    }
-    .stTabs [aria-selected="true"] {
-        background-color: #28a745 !important;
-        color: white !important;
-        border: 1px solid #1e7e34;
-    }
-    .stDataFrame {
-        background-color: white;
-        color: black;
-    }
-    h1, h2, h3, h4, h5, h6, .stMarkdown {
-        color: black;
-    }
-    hr {
-        border-color: #28a745;
-    }
-    </style>
-    """,
-    unsafe_allow_html=True
-)
+    Trabajo de exportación: el XLSX de la sesión, escrito por bloques (la cola
+    escribe en un ``.parcial`` y lo renombra al terminar).
+    """
+    EXPORTADORES["xlsx"](progreso(almacen.iterate(sesion)), ruta)
 
-st.title("Evaluación sensorial")
 
-# Inicializar respuestas
-if 'responses' not in st.session_state:
-    st.session_state.responses = []
+def leer_archivo(ruta):
+    with open(ruta, "rb") as f:
+        return f.read()
 
-# Crear pestañas
-tab1, tab2, tab3 = st.tabs(["inicial", "encuesta", "datos"])
+
+# Avance de la exportación: se consulta cada segundo mientras el trabajo está
+# pendiente; al terminar se redibuja la app para ofrecer la descarga
+@st.fragment(run_every=1)
+def seguimiento_exportacion(trabajo):
+    if not trabajo.pendiente:
+        st.rerun()
+    st.progress(trabajo.avance, text=f"Preparando la exportación: {trabajo.filas} de {trabajo.total} fichas")
+
+st.title("Evaluación sensorial")
 
 # ---------- PESTAÑA 1: Inicial (sin cambios) ----------
-with tab1:
-    st.header("Condiciones que pueden influir en la percepción")
-    st.markdown("*(Esta información es solo para referencia del encuestador y no se almacena)*")
-    st.radio("¿Tiene alguna condición médica que afecte el gusto, el olfato o la sensibilidad oral?",
-             options=["Sí", "No"], index=1, key="cond_medica", horizontal=True)
-    st.radio("¿Toma actualmente algún medicamento que pueda alterar el gusto, el olfato o la salivación?",
-             options=["Sí", "No"], index=1, key="medicamentos", horizontal=True)
-    st.radio("¿Tiene alguna alergia alimentaria relacionada con aceite de oliva, lactosa, gluten, proteínas del huevo algún condimento?",
-             options=["Sí", "No"], index=1, key="alergias", horizontal=True)
-    st.radio("¿Ha fumado cigarrillos u otros productos en la última hora?",
-             options=["Sí", "No"], index=1, key="fumado", horizontal=True)
-    st.radio("¿Ha consumido alcohol en la última hora?",
-             options=["Sí", "No"], index=1, key="alcohol", horizontal=True)
-    st.radio("¿Ha consumido café, chicles, menta en la última hora?",
-             options=["Sí", "No"], index=1, key="cafe", horizontal=True)
-    st.radio("¿Se cepilló los dientes justo antes del test?",
-             options=["Sí", "No"], index=1, key="cepillado", horizontal=True)
-    st.radio("¿Se siente fatigado/a o con sueño?",
-             options=["Sí", "No"], index=1, key="fatigado", horizontal=True)
-    st.radio("¿Siente estrés, ansiedad o malestar emocional?",
-             options=["Sí", "No"], index=1, key="estres", horizontal=True)
+@st.fragment(key="condiciones")
+@metricas.medido("condiciones")
+def panel_condiciones():
+    seccion = esquema.secciones["condiciones"]
+    st.header(seccion.titulo)
+    st.markdown(seccion.nota)
+    esquema.renderizar("condiciones")
 
 # ---------- PESTAÑA 2: Encuesta ----------
-with tab2:
-    st.header("Encuesta")
-    # Encabezado: solo muestra el número secuencial (sin UUID)
-    st.markdown(f"**Ficha N.º:** {len(st.session_state.responses) + 1}")
-
-    # Función de reseteo: elimina las claves para que los widgets usen valores por defecto
-    def reset_encuesta_form():
-        keys_to_reset = [
-            "nombre", "apellido", "edad", "genero", "volveria", "contacto",
-            "conoce", "ha_probado", "sim_mayonesa", "sim_aioli", "sim_cesar",
-            "sim_otros", "sim_otros_text", "consumirian", "frecuencia",
-            "cantidad", "marca", "marca_otros_text"
-        ]
-        for key in keys_to_reset:
-            if key in st.session_state:
-                del st.session_state[key]
-
-    with st.form(key="encuesta_form"):
-        # --- Pregunta 1: Nombre ---
-        st.markdown("**1. Nombre**")
-        nombre = st.text_input("Nombre", key="nombre", label_visibility="collapsed")
-
-        # --- Pregunta 2: Apellido ---
-        st.markdown("**2. Apellido**")
-        apellido = st.text_input("Apellido", key="apellido", label_visibility="collapsed")
-
-        # --- Pregunta 3: Edad ---
-        st.markdown("**3. Edad**")
-        edad = st.number_input("Edad", min_value=0, max_value=120, step=1, key="edad", label_visibility="collapsed")
-
-        # --- Pregunta 4: Género ---
-        st.markdown("**4. Género**")
-        genero = st.selectbox("Género", options=["Femenino", "Masculino", "Prefiero no responder"], key="genero", label_visibility="collapsed")
-
-        # --- Pregunta 5: ¿Volvería a participar? ---
-        st.markdown("**5. ¿Volvería a participar?**")
-        volveria = st.radio("¿Volvería a participar?", options=["Sí", "No"], index=1, key="volveria", horizontal=True, label_visibility="collapsed")
-
-        # --- Pregunta 5b: Contacto (condicional) ---
-        if volveria == "Sí":
-            contacto = st.text_input("Contacto (número de teléfono)", key="contacto")
-        else:
-            contacto = ""
-            # Aseguramos que la clave se elimine si existe para evitar valores residuales
-            if "contacto" in st.session_state:
-                del st.session_state["contacto"]
-
-        st.markdown("---")
-        st.markdown("**Información sobre el producto**")
-        st.markdown("*Este aderezo tiene aceite de oliva, aceite de girasol y leche de cabra*")
-
-        # --- Pregunta 6: ¿Conoce este tipo de producto? ---
-        st.markdown("**6. ¿Conoce este tipo de producto?**")
-        conoce = st.radio("¿Conoce este tipo de producto?", options=["Sí", "No"], index=1, key="conoce", horizontal=True, label_visibility="collapsed")
-
-        # --- Pregunta 7: ¿Ha probado antes? ---
-        st.markdown("**7. ¿Ha probado antes este tipo de producto?**")
-        ha_probado = st.radio("¿Ha probado este tipo de producto antes?", options=["Sí", "No"], index=1, key="ha_probado", horizontal=True, label_visibility="collapsed")
-
-        # --- Pregunta 8: Consumo de aderezos similares (múltiple) ---
-        st.markdown("**8. ¿Suele consumir aderezos similares? (puede seleccionar varios)**")
-        col1, col2, col3, col4 = st.columns(4)
-        with col1:
-            mayonesa = st.checkbox("Mayonesa", key="sim_mayonesa")
-        with col2:
-            aioli = st.checkbox("Aioli", key="sim_aioli")
-        with col3:
-            cesar = st.checkbox("Salsas César", key="sim_cesar")
-        with col4:
-            otros_sim = st.checkbox("Otros", key="sim_otros")
-
-        otros_sim_text = ""
-        if otros_sim:
-            otros_sim_text = st.text_input("Especifique otros aderezos similares", key="sim_otros_text")
-        else:
-            if "sim_otros_text" in st.session_state:
-                del st.session_state["sim_otros_text"]
-
-        # --- Pregunta 9: ¿Cree que todos consumirían? ---
-        st.markdown("**9. ¿Cree que todos los integrantes de su hogar consumirían este aderezo por sus ingredientes?**")
-        consumirian = st.radio("¿Cree que todos...?", options=["Sí", "No"], index=1, key="consumirian", horizontal=True, label_visibility="collapsed")
-
-        # --- Pregunta 10: Frecuencia de consumo ---
-        st.markdown("**10. ¿Con qué frecuencia consume aderezos?**")
-        frecuencia = st.text_input("Frecuencia", key="frecuencia", label_visibility="collapsed")
-
-        # --- Pregunta 11: Cantidad mensual ---
-        st.markdown("**11. ¿Qué cantidad de aderezos consumen en su hogar por mes?**")
-        cantidad = st.text_input("Cantidad mensual", key="cantidad", label_visibility="collapsed")
-
-        # --- Pregunta 12: Marca preferida ---
-        st.markdown("**12. Marca de aderezos más consumida normalmente en su hogar**")
-        marca = st.selectbox("Marca", options=["Mayonesa", "Aioli", "Salsas César", "Otros"], key="marca", label_visibility="collapsed")
-        otros_marca_text = ""
-        if marca == "Otros":
-            otros_marca_text = st.text_input("Especifique otra marca", key="marca_otros_text")
-        else:
-            if "marca_otros_text" in st.session_state:
-                del st.session_state["marca_otros_text"]
-
-        # Botón de guardar
-        submitted = st.form_submit_button("Guardar respuesta")
-
-        if submitted:
-            nueva_ficha_num = len(st.session_state.responses) + 1
-            id_unico = f"{st.session_state.session_id}_{nueva_ficha_num}"
-            respuesta = {
-                "Ficha N°": id_unico,
-                "Fecha": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "P1_Nombre": nombre,
-                "P2_Apellido": apellido,
-                "P3_Edad": edad,
-                "P4_Género": genero,
-                "P5_Volvería a participar": volveria,
-                "P5_Contacto": contacto if volveria == "Sí" else "",
-                "P6_Conoce producto": conoce,
-                "P7_Ha probado antes": ha_probado,
-                "P8_Mayonesa": "Sí" if mayonesa else "No",
-                "P8_Aioli": "Sí" if aioli else "No",
-                "P8_Salsas César": "Sí" if cesar else "No",
-                "P8_Otros similares (especificar)": otros_sim_text if otros_sim else "",
-                "P9_Todos consumirían": consumirian,
-                "P10_Frecuencia consumo": frecuencia,
-                "P11_Cantidad mensual": cantidad,
-                "P12_Marca preferida": marca,
-                "P12_Otra marca especificada": otros_marca_text if marca == "Otros" else ""
-            }
-            st.session_state.responses.append(respuesta)
-            reset_encuesta_form()
-            st.success(f"Respuesta guardada correctamente. Ficha N° {id_unico}")
-            st.rerun()
+# Función de reseteo: elimina las claves para que los widgets usen valores por defecto
+def reset_encuesta_form():
+    esquema.reiniciar(st.session_state, "encuesta")
+
+
+@metricas.medido("guardar")
+def guardar_respuesta(token):
+    """
+    Guarda la ficha del formulario de encuesta (callback de "Guardar
+    respuesta"); ``token`` es el del formulario que se envió.
+    """
+    estado = st.session_state
+    # Envío repetido (mismo token) o persona que ya respondió (misma huella):
+    # se resuelve con los índices del almacén, sin recorrer las respuestas
+    huella = esquema.huella(esquema.registro(estado))
+    duplicado = almacen.buscar_duplicado(token, huella)
+    if duplicado is not None:
+        estado.mensaje_encuesta = ("warning", aviso(*duplicado))
+        st.rerun(["encuesta"])
+    # Número global: único aunque varios procesos guarden fichas a la vez
+    ficha = almacen.asignar_ficha()
+    respuesta = esquema.registro(estado, ficha, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    almacen.append(estado.session_id, respuesta, token=token, huella=huella)
+    estado.token_envio = uuid.uuid4().hex
+    if sincronizador is not None:
+        sincronizador.avisar()
+    reset_encuesta_form()
+    estado.mensaje_encuesta = ("success", f"Respuesta guardada correctamente. Ficha N° {ficha}")
+    # Solo cambian la encuesta (número de ficha), el panel de datos y el
+    # análisis (que cuenta la respuesta nueva al volver a dibujarse)
+    st.rerun(["encuesta", "datos"] + (["analisis"] if analitica is not None else []))
+
+
+@st.fragment(key="encuesta")
+@metricas.medido("encuesta")
+def panel_encuesta():
+    st.header(esquema.secciones["encuesta"].titulo)
+    # El número de ficha lo asigna el almacén al guardar (contador global)
+    st.markdown(f"**Ficha N.º:** (se asignará al guardar) · fichas de esta sesión: "
+                f"{almacen.count(st.session_state.session_id)}")
+    if 'mensaje_encuesta' in st.session_state:
+        tipo, mensaje = st.session_state.pop('mensaje_encuesta')
+        getattr(st, tipo)(mensaje)
+
+    token = st.session_state.token_envio
+    with st.form(key=f"encuesta_form_{token}"):
+        # Preguntas, opciones y campos condicionales definidos en el esquema
+        esquema.renderizar("encuesta")
+
+        # Botón de guardar: la ficha se guarda en el callback, antes del rerun
+        st.form_submit_button("Guardar respuesta", on_click=guardar_respuesta, args=(token,), type="primary")
 
 # ---------- PESTAÑA 3: Datos (exportación y reinicio) ----------
-with tab3:
+@st.fragment(key="datos")
+@metricas.medido("datos")
+def panel_datos():
     st.header("Exportar datos")
 
-    if st.session_state.responses:
-        df = pd.DataFrame(st.session_state.responses)
-        st.dataframe(df)
+    sesion = st.session_state.session_id
+    if almacen.count(sesion):
+        # El visor (numpy/pandas) solo se carga cuando hay datos para mostrar
+        from visor import mostrar_paginado
 
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, index=False, sheet_name='Respuestas')
-        output.seek(0)
+        version = almacen.version(sesion)
+        mostrar_paginado(
+            "respuestas", version, partial(frame_sesion, sesion),
+            fecha="Fecha", edad="P3_Edad", categoricas=esquema.categoricas,
+            presentar=codec.presentar, buscar=buscar_en_sesion
+        )
 
-        # Botón de descarga con etiqueta "Exportar"
-        if st.download_button(
+        # El XLSX se genera en segundo plano (uno por versión de los datos) y
+        # la descarga se ofrece cuando el archivo está escrito en disco
+        clave = (sesion, version, "xlsx")
+        trabajo = exportaciones.buscar(clave)
+        if trabajo is None or not (trabajo.pendiente or trabajo.estado == LISTO):
+            if trabajo is not None:
+                st.error(f"No se pudo generar la exportación: {trabajo.error}")
+            if st.button("Preparar exportación", key="exportar_preparar", type="primary"):
+                try:
+                    trabajo = exportaciones.encolar(clave, partial(escribir_excel, sesion),
+                                                    total=almacen.count(sesion), sufijo=".xlsx")
+                except ColaLlena:
+                    st.warning("Hay muchas exportaciones en curso. Intente de nuevo en unos segundos.")
+        if trabajo is not None and trabajo.pendiente:
+            seguimiento_exportacion(trabajo)
+        elif trabajo is not None and trabajo.estado == LISTO and st.download_button(
             label="Exportar",
-            data=output,
+            data=partial(leer_archivo, trabajo.ruta),
             file_name=f"evaluacion_sensorial_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            mime=MIME["xlsx"],
+            type="primary"
         ):
-            # Limpiar datos y reiniciar sesión (efecto F5)
-            st.session_state.responses = []
+            # Reiniciar sesión (efecto F5), solo con el archivo ya confirmado:
+            # las respuestas quedan en el almacén, pero la nueva sesión empieza
+            # sin fichas. El archivo lo borra la recolección de la cola.
             st.session_state.session_id = str(uuid.uuid4())
+            st.query_params["sesion"] = st.session_state.session_id
             st.rerun()
     else:
         st.info("Aún no hay respuestas guardadas. Complete y guarde al menos una para poder exportar.")
+
+# ---------- PESTAÑA 4: Análisis (todas las sesiones) ----------
+@st.fragment(key="analisis")
+@metricas.medido("analisis")
+def panel_analisis():
+    st.header("Análisis")
+    mostrar_analitica(analitica, almacen)
+
+
+def panel_admin():
+    metricas.mostrar_admin()
+    st.subheader("Sesiones")
+    sesiones.mostrar_admin()
+    st.subheader("Sincronización")
+    sincronizacion.mostrar_admin(sincronizador)
+
+
+# Crear pestañas: cada panel es un fragmento, de modo que interactuar con uno
+# vuelve a ejecutar solo ese panel y no todo el script
+# La pestaña de administración solo aparece con ?admin=1 en la URL
+pestanas = [esquema.secciones["condiciones"].pestana, esquema.secciones["encuesta"].pestana, "datos"]
+extras = []
+if analitica is not None:
+    extras.append(("análisis", panel_analisis))
+if st.query_params.get("admin") == "1":
+    extras.append(("admin", panel_admin))
+tab1, tab2, tab3, *tabs_extra = st.tabs(pestanas + [nombre for nombre, _ in extras])
+with tab1:
+    panel_condiciones()
+with tab2:
+    panel_encuesta()
+with tab3:
+    panel_datos()
+for tab, (_, panel) in zip(tabs_extra, extras):
+    with tab:
+        panel()
@@ -1,125 +1,235 @@
 import streamlit as st
-import pandas as pd
 import os
+import uuid
 from datetime import datetime
+from functools import partial
+from almacen import abrir_almacen
+from esquema import cargar_esquema
+from exportar import MIME, contenido_frame, filas_de_frame
+from busqueda import IndiceBusqueda
+from duplicados import IndiceDuplicados
+from estadisticas import EstadisticasColumnas
+import metricas
+import sesiones
 
 # Configuración de la página
 st.set_page_config(page_title="Recolección de Datos", page_icon="📊")
 
+# Tiempos por sección (solo con KEPCHUP_METRICAS=1)
+metricas.iniciar_endpoint()
+exportar_frame = metricas.medido("exportar", app="app0.py")(contenido_frame)
+
 # Título de la aplicación
 st.title("📊 Sistema de Recolección de Datos")
 st.markdown("Ingresa 3 datos cuantitativos y 3 datos cualitativos")
 
-# Inicializar el DataFrame en session_state si no existe
-if 'dataframe' not in st.session_state:
-    st.session_state.dataframe = pd.DataFrame(columns=[
-        'fecha', 
-        'cuantitativo_1', 'cuantitativo_2', 'cuantitativo_3',
-        'cualitativo_1', 'cualitativo_2', 'cualitativo_3'
-    ])
-
-# Crear un formulario para la entrada de datos
-with st.form("formulario_datos", clear_on_submit=True):
-    st.header("📝 Ingreso de Datos")
-    
-    # Crear dos columnas
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.subheader("Datos Cuantitativos")
-        # Campos numéricos
-        cuant_1 = st.number_input("Cuantitativo 1", value=0.0, step=0.1)
-        cuant_2 = st.number_input("Cuantitativo 2", value=0.0, step=0.1)
-        cuant_3 = st.number_input("Cuantitativo 3", value=0.0, step=0.1)
-    
-    with col2:
-        st.subheader("Datos Cualitativos")
-        # Campos de texto
-        cual_1 = st.text_input("Cualitativo 1")
-        cual_2 = st.text_input("Cualitativo 2")
-        cual_3 = st.text_input("Cualitativo 3")
-    
-    # Botón para agregar datos
-    submitted = st.form_submit_button("💾 Guardar Datos")
-    
-    if submitted:
-        if cual_1 and cual_2 and cual_3:  # Validar que los campos cualitativos no estén vacíos
-            # Crear nuevo registro
-            nuevo_registro = {
-                'fecha': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                'cuantitativo_1': cuant_1,
-                'cuantitativo_2': cuant_2,
-                'cuantitativo_3': cuant_3,
-                'cualitativo_1': cual_1,
-                'cualitativo_2': cual_2,
-                'cualitativo_3': cual_3
-            }
-            
-            # Agregar al DataFrame
-            st.session_state.dataframe = pd.concat([
-                st.session_state.dataframe, 
-                pd.DataFrame([nuevo_registro])
-            ], ignore_index=True)
-            
-            st.success("✅ Datos guardados exitosamente!")
+# Campos del formulario y tipos de las columnas (compilados una vez por proceso)
+esquema = cargar_esquema(os.environ.get("KEPCHUP_ESQUEMA", "recoleccion_datos"))
+
+# Buffer de registros de la sesión: se crea con el primer registro, así el
+# primer dibujo (solo el formulario) no carga NumPy
+if 'registros' not in st.session_state:
+    st.session_state.registros = None
+
+def buffer_registros():
+    if st.session_state.registros is None:
+        from buffer_columnar import BufferColumnar
+
+        st.session_state.registros = BufferColumnar(esquema.tipos_columnas)
+    return st.session_state.registros
+
+def cantidad_registros():
+    registros = st.session_state.registros
+    return 0 if registros is None else len(registros)
+
+# Estadísticas que se actualizan con cada registro (sin recalcular describe())
+if 'estadisticas' not in st.session_state:
+    st.session_state.estadisticas = EstadisticasColumnas(esquema.numericas)
+estadisticas = st.session_state.estadisticas
+
+# Tokens de envío y huellas de los registros de la sesión: un envío repetido
+# se rechaza en O(1). El token va en la clave del formulario y en los
+# argumentos de su botón (un reenvío del formulario ya dibujado trae el token
+# viejo) y se renueva después de cada guardado.
+if 'duplicados' not in st.session_state:
+    st.session_state.duplicados = IndiceDuplicados()
+duplicados = st.session_state.duplicados
+
+# Índice del buscador de la pestaña de datos (se actualiza con cada registro)
+if 'busqueda' not in st.session_state:
+    st.session_state.busqueda = IndiceBusqueda(esquema.columnas_busqueda)
+busqueda = st.session_state.busqueda
+if 'token_envio' not in st.session_state:
+    st.session_state.token_envio = uuid.uuid4().hex
+
+# Almacén durable: recibe los registros de la sesión si queda inactiva
+@st.cache_resource
+def obtener_almacen():
+    return abrir_almacen()
+
+almacen = obtener_almacen()
+if 'sesion_datos' not in st.session_state:
+    st.session_state.sesion_datos = uuid.uuid4().hex
+
+def liberar_registros(registros, busqueda, visor, sesion):
+    """
+    Guarda los registros en el almacén (un token por fila: repetirlo no
+    duplica) y vacía el buffer, el índice del buscador y la caché del visor.
+    """
+    if registros is not None and len(registros):
+        for i, registro in enumerate(filas_de_frame(registros.frame())):
+            almacen.append(sesion, registro, esperar=False, token=f"{sesion}:{i}")
+        almacen.flush()
+        registros.clear()
+    busqueda.clear()
+    if visor is not None:
+        visor.clear()
+
+# Registro de sesiones del proceso: una sesión inactiva se desaloja (sus
+# registros pasan al almacén) y al volver se recargan desde ahí
+def sesion_en_uso():
+    sesion, visor = st.session_state.sesion_datos, st.session_state.get("_visor_registros")
+    registros = st.session_state.registros
+    if sesiones.tocar("app0.py", [registros, visor, estadisticas, duplicados, busqueda],
+                      partial(liberar_registros, registros, busqueda, visor, sesion)):
+        for registro in almacen.iterate(sesion):
+            buffer_registros().append(registro)
+            busqueda.agregar(registro)
+
+sesion_en_uso()
+
+# Guardado del formulario (callbacks de los botones, antes del rerun)
+def agregar_registro(registro, token, huella):
+    # Agregar al buffer (O(1) amortizado, sin copiar lo ya guardado)
+    registros = buffer_registros()
+    registros.append(registro)
+    estadisticas.agregar(registro)
+    busqueda.agregar(registro)
+    duplicados.agregar(len(registros), token, huella)
+    st.session_state.token_envio = uuid.uuid4().hex
+
+    st.session_state.mensaje_formulario = ("success", "✅ Datos guardados exitosamente!")
+    # Solo cambian el formulario y el panel de datos
+    st.rerun(["formulario", "datos"])
+
+@metricas.medido("guardar")
+def guardar_datos(token):
+    """Guarda el registro del formulario; ``token`` es el del formulario que se envió."""
+    sesion_en_uso()
+    estado = st.session_state
+    if not esquema.validar(estado):  # Validar que los campos obligatorios no estén vacíos
+        # Crear nuevo registro
+        nuevo_registro = esquema.registro(estado, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        huella = esquema.huella(nuevo_registro)
+        duplicado = duplicados.buscar(token, huella)
+        if duplicado is None:
+            agregar_registro(nuevo_registro, token, huella)
+        elif duplicado[0] == "token":
+            estado.mensaje_formulario = ("warning", f"⚠️ Estos datos ya estaban guardados (registro N° {duplicado[1]})")
         else:
-            st.warning("⚠️ Por favor completa todos los campos cualitativos")
+            # Los mismos valores que un registro anterior pueden ser una
+            # medición repetida legítima: se guarda si el usuario lo confirma
+            estado.posible_duplicado = (nuevo_registro, token, huella, duplicado[1])
+    else:
+        estado.mensaje_formulario = ("warning", "⚠️ Por favor completa todos los campos cualitativos")
 
-# Mostrar los datos almacenados
-st.header("📋 Datos Almacenados")
-if not st.session_state.dataframe.empty:
-    st.dataframe(st.session_state.dataframe, use_container_width=True)
-    
-    # Estadísticas básicas
-    st.subheader("📈 Estadísticas de Datos Cuantitativos")
-    st.write(st.session_state.dataframe[['cuantitativo_1', 'cuantitativo_2', 'cuantitativo_3']].describe())
-else:
-    st.info("No hay datos almacenados aún. Agrega algunos datos usando el formulario arriba.")
-
-# Sección para descargar los datos
-st.header("💾 Exportar Datos")
-if not st.session_state.dataframe.empty:
-    # Opciones de formato
-    formato = st.radio("Selecciona el formato de descarga:", 
-                       ["CSV", "Excel", "JSON"], horizontal=True)
-    
-    if formato == "CSV":
-        csv = st.session_state.dataframe.to_csv(index=False)
-        st.download_button(
-            label="📥 Descargar CSV",
-            data=csv,
-            file_name="datos_recolectados.csv",
-            mime="text/csv"
+def resolver_posible_duplicado(guardar):
+    """Callback de los botones de confirmación de un posible duplicado."""
+    pendiente = st.session_state.pop("posible_duplicado", None)
+    if pendiente is None:  # ya resuelto (clic repetido)
+        return
+    registro, token, huella, _ = pendiente
+    if guardar and duplicados.buscar(token) is None:
+        agregar_registro(registro, token, huella)
+    elif not guardar:
+        st.session_state.mensaje_formulario = ("info", "Registro descartado")
+
+# Formulario para la entrada de datos (fragmento: se vuelve a ejecutar solo)
+@st.fragment(key="formulario")
+@metricas.medido("formulario")
+def panel_formulario():
+    sesion_en_uso()
+    token = st.session_state.token_envio
+    with st.form(f"formulario_datos_{token}", clear_on_submit=True):
+        st.header(esquema.secciones["formulario"].titulo)
+        
+        # Campos cuantitativos y cualitativos en dos columnas (ver el esquema)
+        esquema.renderizar("formulario")
+        
+        # Botón para agregar datos
+        st.form_submit_button("💾 Guardar Datos", on_click=guardar_datos, args=(token,))
+        
+        if 'mensaje_formulario' in st.session_state:
+            tipo, mensaje = st.session_state.pop('mensaje_formulario')
+            getattr(st, tipo)(mensaje)
+
+    # Posible duplicado: los mismos valores que un registro ya guardado
+    if 'posible_duplicado' in st.session_state:
+        st.warning(f"⚠️ Estos datos son iguales a los del registro N° {st.session_state.posible_duplicado[3]}. "
+                   "¿Es una medición nueva?")
+        guardar, descartar = st.columns(2)
+        guardar.button("Guardar de todos modos", key=f"duplicado_guardar_{token}",
+                       on_click=resolver_posible_duplicado, args=(True,))
+        descartar.button("Descartar", key=f"duplicado_descartar_{token}",
+                         on_click=resolver_posible_duplicado, args=(False,))
+
+# Datos almacenados, estadísticas y exportación (fragmento)
+@st.fragment(key="datos")
+@metricas.medido("datos")
+def panel_datos():
+    sesion_en_uso()
+    st.header("📋 Datos Almacenados")
+    registros = st.session_state.registros
+    if cantidad_registros():
+        from visor import mostrar_paginado  # pandas recién con el primer registro
+
+        mostrar_paginado(
+            "registros", registros.version, registros.frame,
+            fecha="fecha", categoricas=esquema.categoricas,
+            buscar=busqueda.buscar
         )
     
-    elif formato == "Excel":
-        # Para Excel necesitamos crear un archivo temporal
-        excel_file = st.session_state.dataframe.to_excel(
-            index=False, 
-            engine='openpyxl'
-        )
-        st.download_button(
-            label="📥 Descargar Excel",
-            data=excel_file,
-            file_name="datos_recolectados.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+        # Estadísticas básicas
+        st.subheader("📈 Estadísticas de Datos Cuantitativos")
+        with metricas.medir("estadisticas"):
+            st.write(estadisticas.describe(registros.columna))
+    else:
+        st.info("No hay datos almacenados aún. Agrega algunos datos usando el formulario arriba.")
+
+    # Sección para descargar los datos
+    st.header("💾 Exportar Datos")
+    if cantidad_registros():
+        # Opciones de formato
+        formato = st.radio("Selecciona el formato de descarga:", 
+                           ["CSV", "Excel", "JSON Lines", "Parquet"], horizontal=True)
+        extension = {"CSV": "csv", "Excel": "xlsx", "JSON Lines": "jsonl", "Parquet": "parquet"}[formato]
     
-    elif formato == "JSON":
-        json = st.session_state.dataframe.to_json(orient="records", indent=2)
+        # El archivo se genera por bloques recién al hacer clic en la descarga
         st.download_button(
-            label="📥 Descargar JSON",
-            data=json,
-            file_name="datos_recolectados.json",
-            mime="application/json"
+            label=f"📥 Descargar {formato}",
+            data=partial(exportar_frame, registros.frame(), extension, esquema.tipos_columnas),
+            file_name=f"datos_recolectados.{extension}",
+            mime=MIME[extension]
         )
     
-    # Botón para limpiar todos los datos
-    if st.button("🗑️ Limpiar Todos los Datos"):
-        st.session_state.dataframe = pd.DataFrame(columns=st.session_state.dataframe.columns)
-        st.rerun()
-else:
-    st.warning("Agrega datos para habilitar la descarga")
+        # Botón para limpiar todos los datos
+        if st.button("🗑️ Limpiar Todos los Datos"):
+            registros.clear()
+            estadisticas.clear()
+            duplicados.clear()
+            busqueda.clear()
+            st.session_state.pop("posible_duplicado", None)
+            # Lo ya guardado en el almacén queda con la sesión anterior
+            st.session_state.sesion_datos = uuid.uuid4().hex
+            st.rerun()
+    else:
+        st.warning("Agrega datos para habilitar la descarga")
+
+    # Contador de registros (el espacio en la barra lateral se reserva siempre,
+    # para que el fragmento pueda actualizarlo en sus reruns)
+    contador = st.sidebar.empty()
+    if cantidad_registros():
+        contador.metric("📊 Registros almacenados", cantidad_registros())
 
 # Información adicional
 st.sidebar.header("ℹ️ Información")
@@ -135,6 +245,13 @@ st.sidebar.info("""
 - **Cualitativos:** Texto (ej: 'Alto', 'Verde', 'Aprobado')
 """)
 
-# Contador de registros
-if not st.session_state.dataframe.empty:
-    st.sidebar.metric("📊 Registros almacenados", len(st.session_state.dataframe))
+# Paneles
+panel_formulario()
+panel_datos()
+
+# Administración: solo aparece con ?admin=1 en la URL
+if st.query_params.get("admin") == "1":
+    with st.expander("Administración"):
+        metricas.mostrar_admin()
+        st.subheader("Sesiones")
+        sesiones.mostrar_admin()
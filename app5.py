@@ -1,210 +1,240 @@
 import streamlit as st
-import pandas as pd
-from io import BytesIO
 import datetime
+import os
+import uuid
+from functools import partial
+from almacen import abrir_almacen
+from busqueda import IndiceBusqueda
+from duplicados import aviso
+from analitica import TablasAnaliticas, mostrar_analitica
+from esquema import cargar_esquema
+from exportar import MIME, contenido
+import metricas
+import sesiones
+import sincronizacion
+from registro_compacto import codec_para
 
 # Configuración de la página
 st.set_page_config(page_title="Evaluación sensorial", layout="wide")
 
+# Tiempos por sección (solo con KEPCHUP_METRICAS=1)
+metricas.iniciar_endpoint()
+
+# Cuestionario del estudio (compilado una vez por proceso)
+NOMBRE_ESQUEMA = os.environ.get("KEPCHUP_ESQUEMA", "evaluacion_sensorial_completa")
+esquema = cargar_esquema(NOMBRE_ESQUEMA)
+codec = codec_para(esquema)
+
+
+def frame_sesion(sesion):
+    """
+    Respuestas de la sesión en columnas tipadas, con su índice para el
+    buscador; solo se leen (e indexan) las nuevas.
+    """
+    coleccion = st.session_state.get("coleccion")
+    if coleccion is None or coleccion[0] != sesion:
+        coleccion = st.session_state.coleccion = (sesion, codec.coleccion(),
+                                                  IndiceBusqueda(esquema.columnas_busqueda))
+    for fila in almacen.iterate(sesion, desde=len(coleccion[1])):
+        codec.agregar(coleccion[1], fila)
+        coleccion[2].agregar(fila)
+    registrar_sesion()
+    return coleccion[1].frame()
+
+
+def buscar_en_sesion(consulta):
+    """Posiciones de las respuestas de la sesión que coinciden con el buscador."""
+    return st.session_state.coleccion[2].buscar(consulta)
+
+
+def liberar_sesion(coleccion, visor):
+    """
+    Vacía la copia en columnas y la caché del visor de una sesión inactiva
+    (las respuestas ya están en el almacén).
+    """
+    almacen.flush()
+    if coleccion is not None:
+        coleccion[1].clear()
+        coleccion[2].clear()
+    if visor is not None:
+        visor.clear()
+
+
+def registrar_sesion():
+    """Marca la sesión como en uso en el registro de sesiones del proceso."""
+    coleccion, visor = st.session_state.get("coleccion"), st.session_state.get("_visor_respuestas")
+    sesiones.tocar("app5.py", [coleccion, visor], partial(liberar_sesion, coleccion, visor))
+
 # Título común
 st.title("Evaluación sensorial")
 
-# Inicializar el estado de la sesión para almacenar las respuestas
-if 'responses' not in st.session_state:
-    st.session_state.responses = []
+# Almacén compartido por todas las sesiones (y por otros procesos del host)
+@st.cache_resource
+def obtener_almacen():
+    return abrir_almacen()
+
+almacen = obtener_almacen()
+
+# Envío de las respuestas al colector central en segundo plano (solo con
+# KEPCHUP_COLECTOR): el kiosco sigue funcionando sin conexión
+@st.cache_resource
+def obtener_sincronizador():
+    return sincronizacion.iniciar(almacen)
+
+sincronizador = obtener_sincronizador()
+
+
+# Tablas de análisis de todas las sesiones: contadores compartidos por el
+# proceso (una por esquema) que se ponen al día con el almacén (la primera
+# vez lo recorren)
+@st.cache_resource
+def obtener_analitica(nombre_esquema):
+    return TablasAnaliticas(esquema.analitica)
+
+analitica = obtener_analitica(NOMBRE_ESQUEMA) if esquema.analitica else None
+
+# Identificador de la sesión de encuesta (se conserva en la URL)
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = st.query_params.get("sesion") or str(uuid.uuid4())
+    st.query_params["sesion"] = st.session_state.session_id
+
+# Token de idempotencia del envío en curso: va en la clave y en los argumentos
+# del botón de guardar, de modo que un clic repetido sobre el botón ya dibujado
+# trae el token viejo. Se renueva después de guardar.
+if 'token_envio' not in st.session_state:
+    st.session_state.token_envio = uuid.uuid4().hex
+
+# Registro de sesiones del proceso: si la sesión queda inactiva se libera su
+# copia en columnas (se vuelve a leer del almacén al volver)
+registrar_sesion()
+
 
-# Crear las pestañas
-tab1, tab2, tab3 = st.tabs([
-    "Condiciones que pueden influir en la percepción",
-    "Datos Personales",
-    "Encuesta"
-])
+@metricas.medido("exportar", app="app5.py")
+def construir_excel(sesion):
+    """XLSX de las respuestas de la sesión, escrito por bloques al hacer clic."""
+    return contenido(almacen.iterate(sesion), "xlsx")
 
 # ---------- PESTAÑA 1: Condiciones médicas y hábitos ----------
-with tab1:
-    st.header("Condiciones que pueden influir en la percepción")
-
-    cond_medica = st.radio(
-        "¿Tiene alguna condición médica que afecte el gusto, el olfato o la sensibilidad oral (como sinusitis, rinitis, resfrío, gripe, congestión nasal u otra afección en este momento, etc.)?",
-        options=["Sí", "No"],
-        index=1,
-        key="cond_medica"
-    )
-    medicamentos = st.radio(
-        "¿Toma actualmente algún medicamento que pueda alterar el gusto, el olfato o la salivación (como antihistamínicos, antibióticos, ansiolíticos, etc.)?",
-        options=["Sí", "No"],
-        index=1,
-        key="medicamentos"
-    )
-    alergias = st.radio(
-        "¿Tiene alguna alergia alimentaria relacionada con aceite de oliva, lactosa, gluten, proteínas del huevo algún condimento?",
-        options=["Sí", "No"],
-        index=1,
-        key="alergias"
-    )
-    fumado = st.radio(
-        "¿Ha fumado cigarrillos u otros productos en la última hora, antes de hacer esta prueba?",
-        options=["Sí", "No"],
-        index=1,
-        key="fumado"
-    )
-    alcohol = st.radio(
-        "¿Ha consumido alcohol en la última hora, antes de hacer esta prueba?",
-        options=["Sí", "No"],
-        index=1,
-        key="alcohol"
-    )
-    cafe = st.radio(
-        "¿Ha consumido café, chicles, menta en la última hora, antes de hacer esta prueba?",
-        options=["Sí", "No"],
-        index=1,
-        key="cafe"
-    )
-    cepillado = st.radio(
-        "¿Se cepilló los dientes justo antes del test?",
-        options=["Sí", "No"],
-        index=1,
-        key="cepillado"
-    )
-    fatigado = st.radio(
-        "¿Se siente fatigado/a o con sueño?",
-        options=["Sí", "No"],
-        index=1,
-        key="fatigado"
-    )
-    estres = st.radio(
-        "¿Siente estrés, ansiedad o malestar emocional?",
-        options=["Sí", "No"],
-        index=1,
-        key="estres"
-    )
+@st.fragment(key="condiciones")
+@metricas.medido("condiciones")
+def panel_condiciones():
+    st.header(esquema.secciones["condiciones"].titulo)
+    esquema.renderizar("condiciones")
 
 # ---------- PESTAÑA 2: Datos personales ----------
-with tab2:
-    st.header("Datos Personales")
-
-    st.markdown(f"**Ficha N.º:** {len(st.session_state.responses) + 1} (se asignará al guardar)")
-
-    nombre = st.text_input("Nombre", key="nombre")
-    apellido = st.text_input("Apellido", key="apellido")
-    edad = st.number_input("Edad", min_value=0, max_value=120, step=1, key="edad")
-    genero = st.selectbox(
-        "Sexo o Género",
-        options=["Femenino", "Masculino", "Prefiero no responder"],
-        key="genero"
-    )
-
-    volveria = st.radio(
-        "¿Volvería a participar en esta prueba?",
-        options=["Sí", "No"],
-        index=1,
-        key="volveria"
-    )
-
-    contacto = ""
-    if volveria == "Sí":
-        contacto = st.text_input("Contacto (número de teléfono)", key="contacto")
-    else:
-        st.session_state["contacto"] = ""
+@st.fragment(key="datos_personales")
+@metricas.medido("datos_personales")
+def panel_datos_personales():
+    st.header(esquema.secciones["datos_personales"].titulo)
+
+    st.markdown(f"**Ficha N.º:** (se asignará al guardar) · fichas de esta sesión: "
+                f"{almacen.count(st.session_state.session_id)}")
+
+    esquema.renderizar("datos_personales")
+
+
+@metricas.medido("guardar")
+def guardar_respuesta(token):
+    """
+    Guarda la respuesta de las tres pestañas (callback de "Guardar
+    respuesta"); ``token`` es el del botón que se pulsó.
+    """
+    estado = st.session_state
+    # Envío repetido (mismo token) o persona que ya respondió (misma huella)
+    huella = esquema.huella(esquema.registro(estado))
+    duplicado = almacen.buscar_duplicado(token, huella)
+    if duplicado is not None:
+        estado.mensaje_encuesta = ("warning", aviso(*duplicado))
+        st.rerun(["encuesta"])
+    # Número global: único aunque varios procesos guarden fichas a la vez
+    nueva_ficha = almacen.asignar_ficha()
+    respuesta = esquema.registro(estado, nueva_ficha, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    almacen.append(estado.session_id, respuesta, token=token, huella=huella)
+    estado.token_envio = uuid.uuid4().hex
+    if sincronizador is not None:
+        sincronizador.avisar()
+    estado.mensaje_encuesta = ("success", f"Respuesta guardada correctamente. Ficha N° {nueva_ficha}")
+    # Solo cambian el número de ficha, la encuesta, el área de datos y el
+    # análisis (que cuenta la respuesta nueva al volver a dibujarse)
+    st.rerun(["datos_personales", "encuesta", "datos"] + (["analisis"] if analitica is not None else []))
+
 
 # ---------- PESTAÑA 3: Encuesta sobre el producto ----------
-with tab3:
-    st.header("Encuesta")
-    st.markdown("**Este aderezo tiene aceite de oliva, aceite de girasol y leche de cabra**")
-
-    conoce = st.radio("¿Conoce este tipo de producto?", options=["Sí", "No"], index=1, key="conoce")
-    ha_probado = st.radio("¿Ha probado este tipo de producto antes?", options=["Sí", "No"], index=1, key="ha_probado")
-
-    st.markdown("**¿Suele consumir aderezos similares?**")
-    col1, col2, col3, col4 = st.columns(4)
-    with col1:
-        mayonesa = st.checkbox("Mayonesa", key="sim_mayonesa")
-    with col2:
-        aioli = st.checkbox("Aioli", key="sim_aioli")
-    with col3:
-        cesar = st.checkbox("Salsas César", key="sim_cesar")
-    with col4:
-        otros_sim = st.checkbox("Otros", key="sim_otros")
-    otros_sim_text = ""
-    if otros_sim:
-        otros_sim_text = st.text_input("Especifique otros aderezos similares", key="sim_otros_text")
-
-    consumirian = st.radio(
-        "¿Cree que todos los integrantes de su hogar consumirían este aderezo por sus ingredientes?",
-        options=["Sí", "No"],
-        index=1,
-        key="consumirian"
-    )
-
-    frecuencia = st.text_input("¿Con qué frecuencia consume aderezos?", key="frecuencia")
-    cantidad = st.text_input("¿Qué cantidad de aderezos consumen en su hogar por mes?", key="cantidad")
-
-    marca = st.selectbox(
-        "Marca de aderezos más consumida normalmente en su hogar",
-        options=["Mayonesa", "Aioli", "Salsas César", "Otros"],
-        key="marca"
-    )
-    otros_marca_text = ""
-    if marca == "Otros":
-        otros_marca_text = st.text_input("Especifique otra marca", key="marca_otros_text")
-
-    # Botón para guardar la respuesta
-    if st.button("Guardar respuesta"):
-        nueva_ficha = len(st.session_state.responses) + 1
-        respuesta = {
-            "Ficha N°": nueva_ficha,
-            "Fecha": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            # Tab1
-            "Condición médica": st.session_state.cond_medica,
-            "Medicamentos": st.session_state.medicamentos,
-            "Alergias": st.session_state.alergias,
-            "Fumado última hora": st.session_state.fumado,
-            "Alcohol última hora": st.session_state.alcohol,
-            "Café/chicles/menta": st.session_state.cafe,
-            "Cepillado antes": st.session_state.cepillado,
-            "Fatiga/sueño": st.session_state.fatigado,
-            "Estrés/ansiedad": st.session_state.estres,
-            # Tab2
-            "Nombre": st.session_state.nombre,
-            "Apellido": st.session_state.apellido,
-            "Edad": st.session_state.edad,
-            "Género": st.session_state.genero,
-            "Volvería a participar": st.session_state.volveria,
-            "Contacto": st.session_state.contacto if st.session_state.volveria == "Sí" else "",
-            # Tab3
-            "Conoce producto": st.session_state.conoce,
-            "Ha probado antes": st.session_state.ha_probado,
-            "Consume Mayonesa": "Sí" if st.session_state.sim_mayonesa else "No",
-            "Consume Aioli": "Sí" if st.session_state.sim_aioli else "No",
-            "Consume Salsas César": "Sí" if st.session_state.sim_cesar else "No",
-            "Consume Otros similares": otros_sim_text if otros_sim else "",
-            "Todos consumirían": st.session_state.consumirian,
-            "Frecuencia consumo": st.session_state.frecuencia,
-            "Cantidad mensual": st.session_state.cantidad,
-            "Marca preferida": st.session_state.marca,
-            "Otra marca especificada": otros_marca_text if marca == "Otros" else ""
-        }
-        st.session_state.responses.append(respuesta)
-        st.success(f"Respuesta guardada correctamente. Ficha N° {nueva_ficha}")
+@st.fragment(key="encuesta")
+@metricas.medido("encuesta")
+def panel_encuesta():
+    st.header(esquema.secciones["encuesta"].titulo)
+    esquema.renderizar("encuesta")
+
+    # Botón para guardar la respuesta: se guarda en el callback, antes del rerun
+    token = st.session_state.token_envio
+    st.button("Guardar respuesta", key=f"guardar_{token}", on_click=guardar_respuesta, args=(token,))
+    if 'mensaje_encuesta' in st.session_state:
+        tipo, mensaje = st.session_state.pop('mensaje_encuesta')
+        getattr(st, tipo)(mensaje)
 
 # ---------- Área de descarga de datos ----------
+@st.fragment(key="datos")
+@metricas.medido("datos")
+def panel_datos():
+    st.header("Exportar datos")
+
+    sesion = st.session_state.session_id
+    if almacen.count(sesion):
+        # El visor (numpy/pandas) solo se carga cuando hay datos para mostrar
+        from visor import mostrar_paginado
+
+        mostrar_paginado(
+            "respuestas", almacen.version(sesion), partial(frame_sesion, sesion),
+            fecha="Fecha", edad="Edad", categoricas=esquema.categoricas,
+            presentar=codec.presentar, buscar=buscar_en_sesion
+        )
+
+        # El XLSX se escribe por bloques recién al hacer clic en la descarga
+        st.download_button(
+            label="📥 Descargar como Excel",
+            data=partial(construir_excel, sesion),
+            file_name=f"evaluacion_sensorial_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+            mime=MIME["xlsx"]
+        )
+    else:
+        st.info("Aún no hay respuestas guardadas. Complete y guarde al menos una para poder exportar.")
+
+# ---------- Análisis (todas las sesiones) ----------
+@st.fragment(key="analisis")
+@metricas.medido("analisis")
+def panel_analisis():
+    st.header("Análisis")
+    mostrar_analitica(analitica, almacen)
+
+
+def panel_admin():
+    metricas.mostrar_admin()
+    st.subheader("Sesiones")
+    sesiones.mostrar_admin()
+    st.subheader("Sincronización")
+    sincronizacion.mostrar_admin(sincronizador)
+
+
+# Crear las pestañas: cada panel es un fragmento, de modo que interactuar con
+# uno vuelve a ejecutar solo ese panel y no todo el script
+# La pestaña de administración solo aparece con ?admin=1 en la URL
+pestanas = [esquema.secciones[s].pestana for s in ("condiciones", "datos_personales", "encuesta")]
+extras = []
+if analitica is not None:
+    extras.append(("análisis", panel_analisis))
+if st.query_params.get("admin") == "1":
+    extras.append(("admin", panel_admin))
+tab1, tab2, tab3, *tabs_extra = st.tabs(pestanas + [nombre for nombre, _ in extras])
+with tab1:
+    panel_condiciones()
+with tab2:
+    panel_datos_personales()
+with tab3:
+    panel_encuesta()
+for tab, (_, panel) in zip(tabs_extra, extras):
+    with tab:
+        panel()
+
 st.divider()
-st.header("Exportar datos")
-
-if st.session_state.responses:
-    df = pd.DataFrame(st.session_state.responses)
-    st.dataframe(df)
-
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, index=False, sheet_name='Respuestas')
-    output.seek(0)
-
-    st.download_button(
-        label="📥 Descargar como Excel",
-        data=output,
-        file_name=f"evaluacion_sensorial_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
-else:
-    st.info("Aún no hay respuestas guardadas. Complete y guarde al menos una para poder exportar.")
+panel_datos()
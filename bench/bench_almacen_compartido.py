@@ -0,0 +1,109 @@
+"""
+Prueba de carga del almacén compartido: N procesos x M sesiones concurrentes.
+
+Uso:
+    python bench/bench_almacen_compartido.py [--procesos 1 2 4 8] [--sesiones 8] [--fichas 100]
+
+Cada proceso abre su propio ``AlmacenSQLite`` sobre la misma base (como varios
+workers de Streamlit en un host) y lanza ``--sesiones`` hilos que guardan
+``--fichas`` respuestas cada uno: ``asignar_ficha()`` y luego ``append()``,
+que vuelve cuando la fila está confirmada. Se informa el throughput de filas
+confirmadas, los commits (lotes) por segundo, el tamaño medio de lote y la
+latencia de ``append``; al final se verifica que los números de ficha sean
+únicos y crecientes dentro de cada sesión.
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from almacen import AlmacenSQLite  # noqa: E402
+
+
+def trabajador(ruta, proceso, sesiones, fichas, barrera, resultados):
+    almacen = AlmacenSQLite(ruta)
+    por_sesion = {}
+    latencias = []
+
+    def sesion(numero):
+        nombre = f"p{proceso}_s{numero}"
+        asignadas = por_sesion[nombre] = []
+        for i in range(fichas):
+            ficha = almacen.asignar_ficha()
+            inicio = time.perf_counter()
+            almacen.append(nombre, {"Ficha N°": ficha, "Fecha": "2024-05-01 10:00:00", "P1_Nombre": f"N{i}"})
+            latencias.append(time.perf_counter() - inicio)
+            asignadas.append(ficha)
+
+    hilos = [threading.Thread(target=sesion, args=(n,)) for n in range(sesiones)]
+    barrera.wait()
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.perf_counter() - inicio
+    commits = almacen.commits
+    almacen.close()
+    resultados.put((duracion, commits, latencias, por_sesion))
+
+
+def medir(procesos, sesiones, fichas):
+    carpeta = tempfile.mkdtemp(prefix="bench_almacen_")
+    ruta = os.path.join(carpeta, "respuestas.db")
+    AlmacenSQLite(ruta).close()  # crea las tablas antes de arrancar
+
+    contexto = multiprocessing.get_context("spawn")
+    barrera = contexto.Barrier(procesos)
+    resultados = contexto.Queue()
+    hijos = [contexto.Process(target=trabajador, args=(ruta, p, sesiones, fichas, barrera, resultados))
+             for p in range(procesos)]
+    for hijo in hijos:
+        hijo.start()
+    salidas = [resultados.get() for _ in hijos]
+    for hijo in hijos:
+        hijo.join()
+
+    duracion = max(s[0] for s in salidas)
+    commits = sum(s[1] for s in salidas)
+    latencias = sorted(l for s in salidas for l in s[2])
+    asignadas = [f for s in salidas for fichas_sesion in s[3].values() for f in fichas_sesion]
+    if len(set(asignadas)) != len(asignadas):
+        raise AssertionError("Números de ficha repetidos")
+    for s in salidas:
+        for fichas_sesion in s[3].values():
+            if fichas_sesion != sorted(fichas_sesion):
+                raise AssertionError("Números de ficha no crecientes dentro de una sesión")
+    almacen = AlmacenSQLite(ruta)
+    filas = almacen.count()
+    almacen.close()
+    if filas != len(asignadas):
+        raise AssertionError(f"Se esperaban {len(asignadas)} filas y hay {filas}")
+    return filas, duracion, commits, latencias
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--procesos", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--sesiones", type=int, default=8, help="sesiones concurrentes por proceso")
+    parser.add_argument("--fichas", type=int, default=100, help="fichas guardadas por sesión")
+    args = parser.parse_args()
+
+    print(f"{'procesos':>8} {'sesiones':>8} {'filas':>7} {'filas/s':>9} {'commits/s':>10} "
+          f"{'filas/commit':>12} {'append p50 (ms)':>16} {'p95 (ms)':>9}")
+    for procesos in args.procesos:
+        filas, duracion, commits, latencias = medir(procesos, args.sesiones, args.fichas)
+        p95 = latencias[int(0.95 * (len(latencias) - 1))]
+        print(f"{procesos:>8} {procesos * args.sesiones:>8} {filas:>7} {filas / duracion:>9.0f} "
+              f"{commits / duracion:>10.0f} {filas / commits:>12.1f} "
+              f"{statistics.median(latencias) * 1e3:>16.2f} {p95 * 1e3:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
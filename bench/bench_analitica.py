@@ -0,0 +1,104 @@
+"""
+Tablas de análisis: contadores incrementales vs. recálculo con pandas.
+
+Uso:
+    python bench/bench_analitica.py [--respuestas 1000 10000 100000] [--esquema evaluacion_sensorial]
+
+Se precarga un almacén SQLite temporal con respuestas sintéticas y se mide:
+
+- ``reconstruir``: contar todo el almacén desde cero (primer uso del proceso);
+- ``guardar + actualizar``: una respuesta nueva y la puesta al día de los
+  contadores (lo que paga cada envío), mediana de 200;
+- ``tablas``: armar todas las tablas de la pestaña a partir de los contadores;
+- ``pandas``: lo que costaría cada dibujo recalculando desde el almacén
+  (``to_frame`` más ``crosstab``/``value_counts`` de las mismas tablas).
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pandas as pd  # noqa: E402
+
+from almacen import AlmacenSQLite  # noqa: E402
+from analitica import TablasAnaliticas  # noqa: E402
+from bench_apptest import valores_sinteticos  # noqa: E402
+from esquema import cargar_esquema  # noqa: E402
+
+
+def tablas_pandas(almacen, definicion):
+    df = almacen.to_frame()
+    tablas = []
+    for columna, cortes, etiquetas in definicion["por"]:
+        grupos = df[columna]
+        if cortes is not None:
+            grupos = pd.cut(pd.to_numeric(grupos, errors="coerce"), [-float("inf"), *cortes, float("inf")],
+                            right=False, labels=etiquetas)
+        for pregunta in definicion["aceptacion"]:
+            tablas.append(pd.crosstab(grupos, df[pregunta], margins=True, normalize="index"))
+    marcadas = (~df[definicion["coocurrencia"]].isin(["", "No"])).astype(int)
+    tablas.append(marcadas.T @ marcadas)
+    tablas.append(df[definicion["participacion"]].value_counts())
+    return tablas
+
+
+def todas_las_tablas(tablas):
+    return ([tablas.tabla_aceptacion(columna) for columna, _, _ in tablas.definicion["por"]]
+            + [tablas.tabla_coocurrencia(), tablas.tabla_participacion()])
+
+
+def medir(esquema, n):
+    carpeta = tempfile.mkdtemp(prefix="bench_analitica_")
+    almacen = AlmacenSQLite(os.path.join(carpeta, "respuestas.db"))
+    rng = random.Random(n)
+    fecha = "2024-05-01 10:00:00"
+    for i in range(n):
+        almacen.append("s", esquema.registro(valores_sinteticos(esquema, rng), i + 1, fecha), esperar=False)
+    almacen.flush()
+
+    tablas = TablasAnaliticas(esquema.analitica)
+    inicio = time.perf_counter()
+    tablas.reconstruir(almacen)
+    reconstruir = time.perf_counter() - inicio
+
+    envios = []
+    for i in range(200):
+        registro = esquema.registro(valores_sinteticos(esquema, rng), n + i + 1, fecha)
+        inicio = time.perf_counter()
+        almacen.append("s", registro)
+        tablas.actualizar(almacen)
+        envios.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    for _ in range(20):
+        todas_las_tablas(tablas)
+    armar = (time.perf_counter() - inicio) / 20
+
+    inicio = time.perf_counter()
+    tablas_pandas(almacen, esquema.analitica)
+    pandas = time.perf_counter() - inicio
+    almacen.close()
+    return reconstruir, statistics.median(envios), armar, pandas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--respuestas", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--esquema", default="evaluacion_sensorial")
+    args = parser.parse_args()
+    esquema = cargar_esquema(args.esquema)
+
+    print(f"{'respuestas':>10} {'reconstruir (ms)':>17} {'guardar+actualizar (ms)':>24} "
+          f"{'tablas (ms)':>12} {'pandas (ms)':>12}")
+    for n in args.respuestas:
+        reconstruir, envio, armar, pandas = medir(esquema, n)
+        print(f"{n:>10} {reconstruir * 1e3:>17.1f} {envio * 1e3:>24.2f} {armar * 1e3:>12.3f} {pandas * 1e3:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
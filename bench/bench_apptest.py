@@ -0,0 +1,277 @@
+"""
+Suite de carga y latencia de rerun de las apps con streamlit.testing AppTest.
+
+Uso:
+    python bench/bench_apptest.py [--apps app.py app5.py app0.py] [--respuestas 10 100 1000 10000]
+                                  [--repeticiones 30] [--salida resultados.json]
+                                  [--comparar resultados_anteriores.json]
+
+Para cada app y cada volumen de respuestas se abre un proceso nuevo (así el
+pico de RSS de cada caso es independiente), se precargan las respuestas y se
+mide, con encuestados sintéticos generados a partir del esquema de la app:
+
+- ``enviar``: completar el formulario y guardar;
+- ``rerun``: rerun sin cambios (el cambio de pestaña ocurre en el navegador y
+  no ejecuta el script, de modo que su costo del lado del servidor es este);
+- ``visor``: cambiar las columnas visibles del visor de respuestas;
+- exportación: tiempo de construir el archivo del botón de descarga (la misma
+  función diferida que Streamlit ejecuta al hacer clic), sin caché; en las
+  apps con exportación en segundo plano, desde el clic en "Preparar
+  exportación" hasta que el archivo está confirmado.
+
+De cada operación se informan los percentiles 50/95/99 del rerun. El
+resultado se escribe en JSON (con el commit medido) para comparar entre
+versiones con ``--comparar``.
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, RAIZ)
+
+# app -> (esquema, columnas previas sintéticas, clave del visor)
+APPS = {
+    "app.py": ("evaluacion_sensorial", "respuestas"),
+    "app5.py": ("evaluacion_sensorial_completa", "respuestas"),
+    "app0.py": ("recoleccion_datos", "registros"),
+}
+OPERACIONES = ("enviar", "rerun", "visor")
+
+# tipo de pregunta -> widget de AppTest
+WIDGETS = {"texto": "text_input", "numero": "number_input", "opcion": "radio", "lista": "selectbox",
+           "casilla": "checkbox"}
+
+
+def valores_sinteticos(esquema, rng):
+    """Respuestas al azar (clave -> valor) para todas las preguntas del esquema."""
+    valores = {}
+    for clave, pregunta in esquema.preguntas.items():
+        tipo = pregunta["tipo"]
+        if tipo == "texto":
+            valores[clave] = f"{clave}_{rng.randrange(1000)}"
+        elif tipo == "numero":
+            minimo, maximo = pregunta.get("minimo", 0), pregunta.get("maximo", 100)
+            if isinstance(pregunta.get("paso", 1), float):
+                valores[clave] = round(rng.uniform(minimo, maximo), 1)
+            else:
+                valores[clave] = rng.randint(minimo, maximo)
+        elif tipo in ("opcion", "lista"):
+            valores[clave] = rng.choice(pregunta["opciones"])
+        elif tipo == "casilla":
+            valores[clave] = rng.random() < 0.5
+    return valores
+
+
+def precargar(at, app, esquema, n, rng):
+    fecha = "2024-05-01 10:00:00"
+    if app == "app0.py":
+        from buffer_columnar import BufferColumnar
+
+        if at.session_state["registros"] is None:
+            at.session_state["registros"] = BufferColumnar(esquema.tipos_columnas)
+        registros, estadisticas = at.session_state["registros"], at.session_state["estadisticas"]
+        for _ in range(n):
+            registro = esquema.registro(valores_sinteticos(esquema, rng), fecha)
+            registros.append(registro)
+            estadisticas.agregar(registro)
+        return
+    from almacen import abrir_almacen
+
+    almacen = abrir_almacen()
+    sesion = at.session_state["session_id"]
+    for _ in range(n):
+        almacen.append(sesion, esquema.registro(valores_sinteticos(esquema, rng), almacen.asignar_ficha(), fecha),
+                       esperar=False)
+    almacen.close()
+
+
+def completar(at, esquema, rng):
+    for clave, valor in valores_sinteticos(esquema, rng).items():
+        try:
+            widget = getattr(at, WIDGETS[esquema.preguntas[clave]["tipo"]])(key=clave)
+        except KeyError:
+            continue  # pregunta condicional que no está visible
+        widget.set_value(valor)
+    next(b for b in at.button if "Guardar" in b.label).click()
+
+
+def percentiles(tiempos):
+    cortes = statistics.quantiles(tiempos, n=100, method="inclusive")
+    return {"p50_ms": cortes[49] * 1e3, "p95_ms": cortes[94] * 1e3, "p99_ms": cortes[98] * 1e3,
+            "n": len(tiempos)}
+
+
+def medir_caso(app, n, repeticiones, cola):
+    """Ejecuta un caso (app, n) en el proceso actual y deja el resultado en ``cola``."""
+    carpeta = tempfile.mkdtemp(prefix="bench_apptest_")
+    os.environ["KEPCHUP_ALMACEN"] = "sqlite:///" + os.path.join(carpeta, "respuestas.db")
+    os.environ["KEPCHUP_EXPORTACIONES"] = os.path.join(carpeta, "exportaciones")
+    capturadas = []
+    trabajos = []
+
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.testing.v1 import AppTest
+
+    from esquema import cargar_esquema
+    from exportaciones import ColaExportaciones
+
+    # Se guarda la función diferida de cada botón de descarga para medirla
+    add_deferred = MediaFileManager.add_deferred
+
+    def capturar(self, data_callable, *args, **kwargs):
+        capturadas.append(data_callable)
+        return add_deferred(self, data_callable, *args, **kwargs)
+
+    MediaFileManager.add_deferred = capturar
+
+    # ... y cada trabajo de exportación en segundo plano
+    encolar = ColaExportaciones.encolar
+
+    def capturar_trabajo(self, *args, **kwargs):
+        trabajo = encolar(self, *args, **kwargs)
+        trabajos.append(trabajo)
+        return trabajo
+
+    ColaExportaciones.encolar = capturar_trabajo
+
+    nombre_esquema, clave_visor = APPS[app]
+    esquema = cargar_esquema(nombre_esquema)
+    rng = random.Random(n)
+    at = AppTest.from_file(os.path.join(RAIZ, app), default_timeout=300).run()
+    precargar(at, app, esquema, n, rng)
+    at.run()
+
+    tiempos = {operacion: [] for operacion in OPERACIONES}
+    for i in range(repeticiones):
+        completar(at, esquema, rng)
+        inicio = time.perf_counter()
+        at.run()
+        tiempos["enviar"].append(time.perf_counter() - inicio)
+        at.run()  # el guardado reejecuta solo algunos fragmentos: se vuelve al árbol completo
+
+        inicio = time.perf_counter()
+        at.run()
+        tiempos["rerun"].append(time.perf_counter() - inicio)
+
+        columnas = at.multiselect(key=f"{clave_visor}_columnas")
+        columnas.set_value(columnas.options[:3] if i % 2 == 0 else columnas.options)
+        inicio = time.perf_counter()
+        at.run()
+        tiempos["visor"].append(time.perf_counter() - inicio)
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+
+    # Exportación: la función diferida del último rerun, contra una versión
+    # nueva de los datos (sin caché)
+    completar(at, esquema, rng)
+    at.run()
+    capturadas.clear()
+    at.run()
+    preparar = [b for b in at.button if b.key == "exportar_preparar"]
+    inicio = time.perf_counter()
+    if preparar:
+        preparar[0].click().run()
+        trabajos[-1].esperar()
+        exportar = time.perf_counter() - inicio
+        with open(trabajos[-1].ruta, "rb") as f:
+            datos = f.read()
+    else:
+        datos = capturadas[-1]()
+        exportar = time.perf_counter() - inicio
+
+    cola.put({
+        "app": app,
+        "respuestas": n,
+        "operaciones": {operacion: percentiles(t) for operacion, t in tiempos.items()},
+        "exportar_s": exportar,
+        "exportar_bytes": len(datos),
+        # ru_maxrss está en KiB en Linux
+        "rss_pico_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    })
+
+
+def commit_actual():
+    try:
+        return subprocess.run(["git", "-C", RAIZ, "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(actual, anterior):
+    previos = {(r["app"], r["respuestas"]): r for r in anterior["resultados"]}
+    print(f"\nComparación con {anterior['metadatos'].get('commit')} (actual / anterior):")
+    print(f"{'app':<8} {'respuestas':>10} {'operación':<10} {'p50':>7} {'p95':>7} {'p99':>7}")
+    for r in actual["resultados"]:
+        previo = previos.get((r["app"], r["respuestas"]))
+        if previo is None:
+            continue
+        for operacion, medidas in r["operaciones"].items():
+            if operacion not in previo["operaciones"]:
+                continue
+            razones = [medidas[p] / previo["operaciones"][operacion][p] for p in ("p50_ms", "p95_ms", "p99_ms")]
+            print(f"{r['app']:<8} {r['respuestas']:>10} {operacion:<10} "
+                  + " ".join(f"{x:>7.2f}" for x in razones))
+        print(f"{r['app']:<8} {r['respuestas']:>10} {'exportar':<10} {r['exportar_s'] / previo['exportar_s']:>7.2f}")
+        print(f"{r['app']:<8} {r['respuestas']:>10} {'rss':<10} {r['rss_pico_mib'] / previo['rss_pico_mib']:>7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--apps", nargs="+", default=list(APPS), choices=list(APPS))
+    parser.add_argument("--respuestas", type=int, nargs="+", default=[10, 100, 1_000, 10_000])
+    parser.add_argument("--repeticiones", type=int, default=30)
+    parser.add_argument("--salida", help="archivo JSON donde guardar los resultados")
+    parser.add_argument("--comparar", help="JSON de una corrida anterior")
+    args = parser.parse_args()
+
+    contexto = multiprocessing.get_context("spawn")
+    resultados = []
+    print(f"{'app':<8} {'respuestas':>10} {'operación':<10} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9}")
+    for app in args.apps:
+        for n in args.respuestas:
+            cola = contexto.Queue()
+            proceso = contexto.Process(target=medir_caso, args=(app, n, args.repeticiones, cola))
+            proceso.start()
+            proceso.join()
+            if proceso.exitcode != 0:
+                print(f"{app:<8} {n:>10} falló (código {proceso.exitcode})")
+                continue
+            r = cola.get()
+            resultados.append(r)
+            for operacion, medidas in r["operaciones"].items():
+                print(f"{app:<8} {n:>10} {operacion:<10} {medidas['p50_ms']:>9.1f} {medidas['p95_ms']:>9.1f} "
+                      f"{medidas['p99_ms']:>9.1f}")
+            print(f"{app:<8} {n:>10} {'exportar':<10} {r['exportar_s'] * 1e3:>9.1f} ms · "
+                  f"{r['exportar_bytes'] / 1024:.0f} KiB · RSS pico {r['rss_pico_mib']:.0f} MiB")
+
+    salida = {
+        "metadatos": {
+            "commit": commit_actual(),
+            "fecha": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "streamlit": __import__("streamlit").__version__,
+            "repeticiones": args.repeticiones,
+        },
+        "resultados": resultados,
+    }
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(salida, f, ensure_ascii=False, indent=2)
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            comparar(salida, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
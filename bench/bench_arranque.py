@@ -0,0 +1,96 @@
+"""
+Arranque en frío de las apps: tiempo de import y tiempo hasta el primer dibujo.
+
+Uso:
+    python bench/bench_arranque.py [--apps app.py app5.py app0.py] [--repeticiones 5]
+
+Cada medición se hace en un proceso nuevo (como el primer ingreso a un
+kiosco recién encendido):
+
+- ``streamlit``: importar Streamlit (piso común a todas las apps);
+- ``imports app``: importar los módulos que la app importa al principio (se
+  leen del archivo con ``ast``), ya con Streamlit cargado;
+- ``primer dibujo``: primera ejecución completa del script con AppTest, con
+  un almacén vacío;
+- módulos pesados (pandas, numpy, pyarrow, xlsxwriter) cargados al terminar.
+
+Se informa la mediana de ``--repeticiones`` procesos.
+"""
+import argparse
+import ast
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+APPS = ("app.py", "app5.py", "app0.py")
+PESADOS = ("pandas", "numpy", "pyarrow", "xlsxwriter")
+
+
+def imports_de(app):
+    """Módulos importados en el nivel superior del script."""
+    with open(os.path.join(RAIZ, app), encoding="utf-8") as f:
+        arbol = ast.parse(f.read())
+    modulos = []
+    for nodo in arbol.body:
+        if isinstance(nodo, ast.Import):
+            modulos.extend(alias.name for alias in nodo.names)
+        elif isinstance(nodo, ast.ImportFrom) and nodo.module:
+            modulos.append(nodo.module)
+    return modulos
+
+
+def medir_arranque(app, cola):
+    """Una medición en el proceso actual (recién creado)."""
+    sys.path.insert(0, RAIZ)
+    os.environ["KEPCHUP_ALMACEN"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="bench_arranque_"),
+                                                               "respuestas.db")
+    inicio = time.perf_counter()
+    import streamlit  # noqa: F401
+    from streamlit.testing.v1 import AppTest
+    streamlit_s = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    for modulo in imports_de(app):
+        __import__(modulo)
+    imports_s = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    at = AppTest.from_file(os.path.join(RAIZ, app), default_timeout=120).run()
+    dibujo_s = time.perf_counter() - inicio
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    cola.put((streamlit_s, imports_s, dibujo_s, [m for m in PESADOS if m in sys.modules]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--apps", nargs="+", default=list(APPS), choices=APPS)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    contexto = multiprocessing.get_context("spawn")
+    print(f"{'app':<8} {'streamlit (ms)':>15} {'imports app (ms)':>17} {'primer dibujo (ms)':>19}  módulos pesados")
+    for app in args.apps:
+        medidas = []
+        for _ in range(args.repeticiones):
+            cola = contexto.Queue()
+            proceso = contexto.Process(target=medir_arranque, args=(app, cola))
+            proceso.start()
+            proceso.join()
+            if proceso.exitcode != 0:
+                print(f"{app:<8} falló (código {proceso.exitcode})")
+                break
+            medidas.append(cola.get())
+        if not medidas:
+            continue
+        streamlit_s, imports_s, dibujo_s = (statistics.median(m[i] for m in medidas) for i in range(3))
+        print(f"{app:<8} {streamlit_s * 1e3:>15.0f} {imports_s * 1e3:>17.0f} {dibujo_s * 1e3:>19.0f}  "
+              f"{', '.join(medidas[-1][3]) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark de inserción: ``pd.concat`` por registro vs ``BufferColumnar``.
+
+Uso:
+    python bench/bench_buffer_columnar.py [--hasta 20000] [--muestra 200]
+
+Para cada tamaño alcanzado se informa la latencia media de un "submit"
+(agregar un registro) medida sobre las últimas ``--muestra`` inserciones.
+Con ``pd.concat`` crece linealmente con las filas; con el buffer se mantiene
+plana.
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from buffer_columnar import BufferColumnar  # noqa: E402
+
+COLUMNAS = {
+    "fecha": "texto",
+    "cuantitativo_1": "float64", "cuantitativo_2": "float64", "cuantitativo_3": "float64",
+    "cualitativo_1": "texto", "cualitativo_2": "texto", "cualitativo_3": "texto",
+}
+
+
+def registro(i):
+    return {
+        "fecha": "2024-05-01 10:00:00",
+        "cuantitativo_1": i * 0.5, "cuantitativo_2": float(i % 7), "cuantitativo_3": 1.0,
+        "cualitativo_1": ["Alto", "Medio", "Bajo"][i % 3],
+        "cualitativo_2": ["Verde", "Rojo"][i % 2],
+        "cualitativo_3": "Aprobado",
+    }
+
+
+def medir(agregar, hasta, muestra, puntos):
+    resultados = {}
+    tiempos = []
+    for i in range(hasta):
+        inicio = time.perf_counter()
+        agregar(registro(i))
+        tiempos.append(time.perf_counter() - inicio)
+        if i + 1 in puntos:
+            ultimos = tiempos[-muestra:]
+            resultados[i + 1] = sum(ultimos) / len(ultimos)
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hasta", type=int, default=20_000)
+    parser.add_argument("--muestra", type=int, default=200)
+    args = parser.parse_args()
+    puntos = [p for p in (1_000, 2_000, 5_000, 10_000, 20_000, 50_000, 100_000) if p <= args.hasta]
+
+    estado = {"df": pd.DataFrame(columns=list(COLUMNAS))}
+
+    def agregar_concat(r):
+        estado["df"] = pd.concat([estado["df"], pd.DataFrame([r])], ignore_index=True)
+
+    buffer = BufferColumnar(COLUMNAS)
+    concat = medir(agregar_concat, args.hasta, args.muestra, puntos)
+    columnar = medir(buffer.append, args.hasta, args.muestra, puntos)
+
+    print(f"{'filas':>8} {'pd.concat (µs)':>15} {'BufferColumnar (µs)':>20}")
+    for p in puntos:
+        print(f"{p:>8} {concat[p] * 1e6:>15.1f} {columnar[p] * 1e6:>20.1f}")
+
+    inicio = time.perf_counter()
+    buffer.frame()
+    print(f"\nframe() sobre {len(buffer)} filas: {(time.perf_counter() - inicio) * 1e3:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
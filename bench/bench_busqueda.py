@@ -0,0 +1,124 @@
+"""
+Buscador de la pestaña de datos: costo de indexar y de consultar.
+
+Uso:
+    python bench/bench_busqueda.py [--respuestas 100000] [--consultas 200]
+
+Se indexan ``--respuestas`` respuestas sintéticas de ``evaluacion_sensorial``
+(nombres y apellidos con y sin tildes, teléfonos con separadores) y se
+informa el costo de agregar una respuesta (lo que cuesta cada envío) y, para
+cada tipo de consulta, la mediana y el p99 de:
+
+- ``índice``: ``IndiceBusqueda.buscar``;
+- ``recorrido``: buscar en el DataFrame con ``str.contains`` sobre las
+  columnas (sin ignorar tildes), como haría un filtro sin índice.
+
+Se verifica que el índice devuelva lo mismo que comparar cada fila.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pandas as pd  # noqa: E402
+
+from bench_apptest import valores_sinteticos  # noqa: E402
+from busqueda import IndiceBusqueda, palabras  # noqa: E402
+from esquema import cargar_esquema  # noqa: E402
+
+NOMBRES = ["José", "María", "Juan", "Lucía", "Martín", "Sofía", "Joaquín", "Valentina", "Andrés", "Inés",
+           "Julián", "Ramón", "Belén", "Agustín", "Mónica", "Sebastián", "Ángela", "Tomás", "Florencia", "Iván"]
+APELLIDOS = ["Pérez", "González", "Rodríguez", "Fernández", "López", "Martínez", "Gómez", "Sánchez", "Díaz",
+             "Álvarez", "Romero", "Sosa", "Benítez", "Peralta", "Acuña", "Muñoz", "Giménez", "Ibáñez", "Suárez"]
+SILABAS = ["al", "bé", "car", "do", "es", "fú", "gar", "ho", "ir", "la", "mén", "ño", "quí", "rra", "só", "tón", "va", "zá"]
+
+
+def respuesta(esquema, ficha, rng):
+    valores = valores_sinteticos(esquema, rng)
+    valores["nombre"] = rng.choice(NOMBRES) + (" " + rng.choice(NOMBRES) if rng.random() < 0.3 else "")
+    if rng.random() < 0.3:  # apellidos poco comunes
+        valores["apellido"] = "".join(rng.choice(SILABAS) for _ in range(3)).capitalize()
+    else:
+        valores["apellido"] = rng.choice(APELLIDOS) + (" " + rng.choice(APELLIDOS) if rng.random() < 0.2 else "")
+    valores["volveria"] = "Sí"
+    valores["contacto"] = f"11 {rng.randrange(1000, 9999)}-{rng.randrange(1000, 9999)}"
+    return esquema.registro(valores, ficha, "2024-05-01 10:00:00")
+
+
+def consultas(filas, n, rng):
+    """(tipo, [consultas]) armadas con valores de las filas."""
+    columnas = ("P1_Nombre", "P2_Apellido", "P5_Contacto")
+    elegidas = [rng.choice(filas) for _ in range(n)]
+    nombre, apellido, contacto = ([fila[c] for fila in elegidas] for c in columnas)
+    return [
+        ("apellido sin tilde", [a.split()[0].replace("é", "e").replace("á", "a").lower() for a in apellido]),
+        ("prefijo (3 letras)", [a[:3] for a in apellido]),
+        ("nombre y apellido", [f"{n.split()[0]} {a.split()[0]}" for n, a in zip(nombre, apellido)]),
+        ("teléfono sin guion", [c.replace(" ", "").replace("-", "")[:8] for c in contacto]),
+        ("N° de ficha", [str(fila["Ficha N°"]) for fila in elegidas]),
+    ]
+
+
+def medir(funcion, argumentos):
+    tiempos, resultados = [], []
+    for argumento in argumentos:
+        inicio = time.perf_counter()
+        resultados.append(funcion(argumento))
+        tiempos.append(time.perf_counter() - inicio)
+    tiempos.sort()
+    return statistics.median(tiempos), tiempos[int(0.99 * (len(tiempos) - 1))], resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--respuestas", type=int, default=100_000)
+    parser.add_argument("--consultas", type=int, default=200)
+    args = parser.parse_args()
+    esquema = cargar_esquema("evaluacion_sensorial")
+    rng = random.Random(0)
+    filas = [respuesta(esquema, ficha, rng) for ficha in range(1, args.respuestas + 1)]
+
+    indice = IndiceBusqueda(esquema.columnas_busqueda)
+    tiempos = []
+    for fila in filas:
+        inicio = time.perf_counter()
+        indice.agregar(fila)
+        tiempos.append(time.perf_counter() - inicio)
+    tiempos.sort()
+    print(f"{args.respuestas} respuestas, {len(indice.vocabulario)} palabras, "
+          f"{indice.nbytes / 2**20:.1f} MiB; agregar una: mediana {statistics.median(tiempos) * 1e6:.1f} µs, "
+          f"p99 {tiempos[int(0.99 * (len(tiempos) - 1))] * 1e6:.1f} µs")
+
+    df = pd.DataFrame.from_records(filas)[esquema.columnas_busqueda].astype(str)
+    por_fila = [set(palabras(fila[c] for c in esquema.columnas_busqueda)) for fila in filas]
+
+    def recorrer(consulta):
+        coincide = pd.Series(True, index=df.index)
+        for termino in consulta.split():
+            en_alguna = pd.Series(False, index=df.index)
+            for columna in df.columns:
+                en_alguna |= df[columna].str.contains(termino, case=False, regex=False)
+            coincide &= en_alguna
+        return coincide.to_numpy().nonzero()[0]
+
+    print(f"{'consulta':<20} {'filas (media)':>13} {'índice mediana (ms)':>20} {'índice p99 (ms)':>16} "
+          f"{'recorrido mediana (ms)':>23}")
+    for tipo, lista in consultas(filas, args.consultas, rng):
+        mediana, p99, resultados = medir(indice.buscar, lista)
+        for consulta, resultado in zip(lista[:20], resultados):
+            terminos = palabras([consulta])
+            esperado = [i for i, conjunto in enumerate(por_fila)
+                        if all(any(p.startswith(t) for p in conjunto) for t in terminos)]
+            if list(resultado) != esperado:
+                raise AssertionError(f"{consulta!r}: el índice devolvió {len(resultado)} filas y no {len(esperado)}")
+        recorrido, _, _ = medir(recorrer, lista[:5])
+        media = sum(map(len, resultados)) / len(resultados)
+        print(f"{tipo:<20} {media:>13.0f} {mediana * 1e3:>20.3f} {p99 * 1e3:>16.3f} {recorrido * 1e3:>23.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Detección de duplicados: huella del encuestado, consulta al enviar y reenvíos.
+
+Uso:
+    python bench/bench_duplicados.py [--respuestas 10000 100000 1000000] [--duplicadas 0.1]
+                                     [--apps app.py app5.py app0.py]
+
+- ``huella``: huellas de un conjunto con una fracción de respuestas repetidas
+  (con otra capitalización, tildes y espacios, y la edad como texto, como
+  llegan de distintos kioscos) sobre un ``IndiceDuplicados``. Se verifica que
+  encuentre exactamente las repetidas y se informa filas/s, que debe
+  mantenerse constante al crecer el conjunto (costo lineal).
+- ``enviar``: ``buscar_duplicado`` (token y huella) sobre un almacén SQLite con
+  las mismas respuestas guardadas; mediana de 1000 consultas.
+- ``reenvío``: en cada app (con AppTest) se guarda un formulario y se vuelve a
+  enviar el mismo formulario ya dibujado, como un doble toque o un reintento
+  del navegador. Se verifica que el reenvío se rechace por su token y no
+  agregue filas. En ``app0.py`` se verifica además que una medición con los
+  mismos valores en un formulario nuevo pida confirmación y se guarde al
+  confirmarla, una sola vez aunque se confirme dos veces.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from almacen import AlmacenSQLite, abrir_almacen  # noqa: E402
+from bench_apptest import APPS, RAIZ, completar  # noqa: E402
+from duplicados import IndiceDuplicados, aviso  # noqa: E402
+from esquema import cargar_esquema  # noqa: E402
+
+NOMBRES = ["José", "María", "Ana", "Luis", "Sofía", "Martín", "Lucía", "Ramón", "Inés", "Tomás"]
+APELLIDOS = ["Pérez", "Gómez", "Rodríguez", "Fernández", "López", "Díaz", "Martínez", "Sánchez", "Ortíz"]
+
+
+def respuestas(esquema, n, duplicadas, rng):
+    nombre, apellido, edad, contacto = esquema.columnas_huella
+    filas = []
+    originales = []
+    for i in range(n):
+        if originales and rng.random() < duplicadas:
+            # La misma persona cargada en otro kiosco
+            fila = dict(rng.choice(originales))
+            fila[nombre] = "  " + fila[nombre].upper() + " "
+            fila[apellido] = fila[apellido].lower().replace("é", "e").replace("í", "i")
+            fila[edad] = str(fila[edad])
+        else:
+            fila = {nombre: rng.choice(NOMBRES), apellido: f"{rng.choice(APELLIDOS)} {i}",
+                    edad: float(rng.randint(18, 80)), contacto: f"555-{i:07d}"}
+            originales.append(fila)
+        filas.append(fila)
+    return filas, n - len(originales)
+
+
+def filas_app(at, app):
+    if app == "app0.py":
+        registros = at.session_state["registros"]
+        return 0 if registros is None else len(registros)
+    almacen = abrir_almacen()
+    try:
+        return almacen.count()
+    finally:
+        almacen.close()
+
+
+def reenvio(app):
+    """Filas después de guardar, después del reenvío y motivo del rechazo del reenvío."""
+    from streamlit.testing.v1 import AppTest
+
+    os.environ["KEPCHUP_ALMACEN"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="bench_reenvio_"),
+                                                                "respuestas.db")
+    esquema = cargar_esquema(APPS[app][0])
+    at = AppTest.from_file(os.path.join(RAIZ, app), default_timeout=60).run()
+    completar(at, esquema, random.Random(0))
+    # El botón del formulario tal como se dibujó: volver a pulsarlo envía el
+    # mismo formulario (con su token) después de guardado
+    boton = next(b for b in at.button if "Guardar" in b.label)
+    at.run()
+    guardadas = filas_app(at, app)
+    at = boton.click().run()
+    avisos = [str(w.value) for w in at.warning]
+    if app == "app0.py":
+        rechazado = any("ya estaban guardados" in a for a in avisos) and "posible_duplicado" not in at.session_state
+    else:
+        rechazado = any(a.startswith(aviso("token", "").split("(")[0]) for a in avisos)
+    reenviadas = filas_app(at, app)
+    if reenviadas != guardadas or not rechazado:
+        raise AssertionError(f"{app}: el reenvío no se rechazó por token ({guardadas} -> {reenviadas}, {avisos})")
+    if app == "app0.py":
+        verificar_posible_duplicado(at, esquema)
+    return guardadas, reenviadas
+
+
+def verificar_posible_duplicado(at, esquema):
+    """app0.py: los mismos valores en un formulario nuevo se guardan solo al confirmar, una vez."""
+    completar(at, esquema, random.Random(0))  # los mismos valores del primer registro
+    at.run()
+    if len(at.session_state["registros"]) != 1 or "posible_duplicado" not in at.session_state:
+        raise AssertionError("app0.py: una medición repetida no pidió confirmación")
+    confirmar = next(b for b in at.button if "de todos modos" in b.label)
+    confirmar.click().run()
+    at = confirmar.click().run()  # doble clic en la confirmación
+    if len(at.session_state["registros"]) != 2:
+        raise AssertionError(f"app0.py: se esperaban 2 registros al confirmar, hay {len(at.session_state['registros'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--respuestas", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--duplicadas", type=float, default=0.1)
+    parser.add_argument("--esquema", default="evaluacion_sensorial")
+    parser.add_argument("--apps", nargs="*", default=list(APPS), help="Apps del chequeo de reenvío")
+    args = parser.parse_args()
+    esquema = cargar_esquema(args.esquema)
+
+    print(f"{'respuestas':>10} {'repetidas':>9} {'encontradas':>11} {'huella (s)':>10} {'filas/s':>9} "
+          f"{'enviar p50 (µs)':>16}")
+    for n in args.respuestas:
+        filas, repetidas = respuestas(esquema, n, args.duplicadas, random.Random(n))
+        inicio = time.perf_counter()
+        indice = IndiceDuplicados()
+        encontradas = 0
+        for i, fila in enumerate(filas):
+            huella = esquema.huella(fila)
+            if indice.buscar(huella=huella) is not None:
+                encontradas += 1
+            else:
+                indice.agregar(i, huella=huella)
+        lote = time.perf_counter() - inicio
+        if encontradas != repetidas:
+            raise AssertionError(f"Se esperaban {repetidas} repetidas y se encontraron {encontradas}")
+
+        almacen = AlmacenSQLite(os.path.join(tempfile.mkdtemp(prefix="bench_duplicados_"), "respuestas.db"))
+        for i, fila in enumerate(filas):
+            almacen.append("s", fila, esperar=False, token=f"t{i}", huella=esquema.huella(fila))
+        almacen.flush()
+        rng = random.Random(0)
+        tiempos = []
+        for _ in range(1000):
+            fila = rng.choice(filas)
+            inicio = time.perf_counter()
+            almacen.buscar_duplicado(f"otro{rng.random()}", esquema.huella(fila))
+            tiempos.append(time.perf_counter() - inicio)
+        almacen.close()
+        print(f"{n:>10} {repetidas:>9} {encontradas:>11} {lote:>10.2f} {n / lote:>9.0f} "
+              f"{statistics.median(tiempos) * 1e6:>16.1f}")
+
+    if args.apps:
+        print(f"\n{'app':<8} {'guardadas':>9} {'tras reenvío':>12}")
+    # Un proceso por app: cada una con su almacén (st.cache_resource es del proceso)
+    contexto = multiprocessing.get_context("spawn")
+    for app in args.apps:
+        with contexto.Pool(1) as pool:
+            guardadas, reenviadas = pool.apply(reenvio, (app,))
+        print(f"{app:<8} {guardadas:>9} {reenviadas:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Precisión y costo de ``EstadisticasColumnas`` frente a ``DataFrame.describe()``.
+
+Uso:
+    python bench/bench_estadisticas.py [--filas 50 1000 100000] [--shards 4]
+
+Para cada tamaño se alimentan los acumuladores en ``--shards`` partes, se
+combinan y se compara el resumen con pandas: error relativo máximo de
+count/mean/std/min/max y error absoluto de los cuartiles expresado en
+desvíos estándar de la columna. ``cuantitativo_3`` es entera (muchos
+empates): ahí el digest interpola entre valores repetidos y el error de los
+cuartiles es mayor que en las columnas continuas. ``err. exactos`` es el
+error con los valores a mano (lo que hace ``app0.py`` con su buffer): se
+verifica que sea 0 hasta ``EXACTO_HASTA`` filas; con más, es el del digest.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from estadisticas import EXACTO_HASTA, EstadisticasColumnas  # noqa: E402
+
+COLUMNAS = ["cuantitativo_1", "cuantitativo_2", "cuantitativo_3"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--filas", type=int, nargs="+", default=[50, 1_000, 5_000, 100_000, 1_000_000])
+    parser.add_argument("--shards", type=int, default=4)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    print(f"{'filas':>8} {'columna':>15} {'err. momentos':>14} {'err. cuartiles (σ)':>19} {'err. exactos (σ)':>17} "
+          f"{'µs/registro':>12} {'resumen (ms)':>13} {'exacto (ms)':>12}")
+    for n in args.filas:
+        df = pd.DataFrame({
+            "cuantitativo_1": rng.normal(50, 10, n),
+            "cuantitativo_2": rng.exponential(3, n),
+            "cuantitativo_3": rng.integers(0, 10, n).astype(float),
+        })
+        registros = df.to_dict("records")
+        partes = np.array_split(np.arange(n), args.shards)
+
+        inicio = time.perf_counter()
+        acumuladores = []
+        for parte in partes:
+            acumulador = EstadisticasColumnas(COLUMNAS)
+            for i in parte:
+                acumulador.agregar(registros[i])
+            acumuladores.append(acumulador)
+        por_registro = (time.perf_counter() - inicio) / n
+        total = acumuladores[0]
+        for otro in acumuladores[1:]:
+            total.combinar(otro)
+
+        inicio = time.perf_counter()
+        obtenido = total.describe()
+        duracion_resumen = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        exacto = total.describe(lambda columna: df[columna].to_numpy())
+        duracion_exacto = time.perf_counter() - inicio
+        esperado = df[COLUMNAS].describe()
+
+        momentos = ["count", "mean", "std", "min", "max"]
+        err_momentos = ((obtenido.loc[momentos] - esperado.loc[momentos]).abs()
+                        / esperado.loc[momentos].abs().clip(lower=1e-12)).max()
+        cuartiles = ["25%", "50%", "75%"]
+        err_cuartiles = ((obtenido.loc[cuartiles] - esperado.loc[cuartiles]).abs()
+                         / esperado.loc["std"]).max()
+        err_exactos = ((exacto.loc[cuartiles] - esperado.loc[cuartiles]).abs() / esperado.loc["std"]).max()
+        if n <= EXACTO_HASTA and err_exactos.max() > 1e-9:
+            raise AssertionError(f"{n} filas: los cuartiles con los valores a mano no son exactos")
+        for columna in COLUMNAS:
+            print(f"{n:>8} {columna:>15} {err_momentos[columna]:>14.2e} {err_cuartiles[columna]:>19.4f} "
+                  f"{err_exactos[columna]:>17.4f} {por_registro * 1e6:>12.1f} {duracion_resumen * 1e3:>13.2f} "
+                  f"{duracion_exacto * 1e3:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
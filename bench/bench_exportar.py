@@ -0,0 +1,78 @@
+"""
+Benchmark del motor de exportación: pico de memoria y tiempo por formato.
+
+Uso:
+    python bench/bench_exportar.py [--filas 1000 10000 100000 1000000] [--formatos xlsx csv jsonl parquet]
+
+El pico se mide con tracemalloc sobre la exportación completa, alimentada por
+un generador de filas sintéticas (el origen no acumula nada en memoria).
+Antes se verifica que Parquet respete los tipos aunque el primer bloque
+tenga una columna vacía o solo enteros en una columna de decimales.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pyarrow.parquet as pq  # noqa: E402
+
+from exportar import TAM_BLOQUE, exportar_temporal  # noqa: E402
+
+TIPOS = {"Ficha N°": "texto", "P3_Edad": "int64"}
+
+
+def filas_sinteticas(n):
+    generos = ["Femenino", "Masculino", "Prefiero no responder"]
+    marcas = ["Mayonesa", "Aioli", "Salsas César", "Otros"]
+    for i in range(n):
+        yield {
+            "Ficha N°": f"sesion_{i + 1}",
+            "Fecha": "2024-05-01 10:00:00",
+            "P1_Nombre": f"Nombre{i % 997}",
+            "P2_Apellido": f"Apellido{i % 991}",
+            "P3_Edad": 18 + i % 60,
+            "P4_Género": generos[i % 3],
+            "P6_Conoce producto": "Sí" if i % 2 else "No",
+            "P10_Frecuencia consumo": "2 veces por semana",
+            "P12_Marca preferida": marcas[i % 4],
+        }
+
+
+def verificar_parquet():
+    """Columnas vacías o enteras en el primer bloque y con valores (o decimales) después."""
+    n = TAM_BLOQUE + 500
+    filas = ({"Frecuencia": None if i < TAM_BLOQUE else 2.5, "Cantidad": 1 if i < TAM_BLOQUE else 0.5}
+             for i in range(n))
+    ruta = exportar_temporal(filas, "parquet", tipos={"Frecuencia": "float64", "Cantidad": "float64"})
+    tabla = pq.read_table(ruta)
+    os.remove(ruta)
+    if tabla["Frecuencia"].null_count != TAM_BLOQUE or tabla["Cantidad"].to_pylist()[-1] != 0.5:
+        raise AssertionError("La exportación Parquet no respetó los tipos declarados")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--filas", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--formatos", nargs="+", default=["xlsx", "csv", "jsonl", "parquet"])
+    args = parser.parse_args()
+    verificar_parquet()
+
+    print(f"{'formato':<8} {'filas':>9} {'tiempo (s)':>11} {'pico (MiB)':>11} {'archivo (MiB)':>14}")
+    for formato in args.formatos:
+        for n in args.filas:
+            tracemalloc.start()
+            inicio = time.perf_counter()
+            ruta = exportar_temporal(filas_sinteticas(n), formato, tipos=TIPOS)
+            duracion = time.perf_counter() - inicio
+            _, pico = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            tam = os.path.getsize(ruta)
+            os.remove(ruta)
+            print(f"{formato:<8} {n:>9} {duracion:>11.2f} {pico / 2**20:>11.2f} {tam / 2**20:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Costo por interacción de las apps: tiempo de ejecución del script y bytes de
+deltas enviados al navegador.
+
+Uso:
+    python bench/bench_fragmentos.py [--raiz .] [--repeticiones 20] [--fichas 20]
+
+Cada app se ejecuta sin navegador con ``streamlit.testing.v1.AppTest``. Para
+cada interacción se mide la duración del rerun y el tamaño serializado de los
+``ForwardMsg`` de tipo delta que ese rerun produce (lo que viajaría por el
+websocket). AppTest siempre reejecuta el script completo ante un cambio de
+widget; cuando el panel del widget es un fragmento (``@st.fragment(key=...)``)
+el benchmark pide el rerun acotado a ese fragmento, como lo hace el navegador.
+
+``--raiz`` permite medir otra copia del repositorio (por ejemplo un
+``git worktree`` de una versión anterior) para comparar antes/después.
+"""
+import argparse
+import dataclasses
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+
+_ultima_corrida = {}
+_fragmentos_pedidos = []
+
+_run_original = LocalScriptRunner.run
+_request_rerun_original = LocalScriptRunner.request_rerun
+
+
+def _run(self, *args, **kwargs):
+    arbol = _run_original(self, *args, **kwargs)
+    _ultima_corrida["bytes"] = sum(
+        m.ByteSize() for m in self.forward_msgs() if m.WhichOneof("type") == "delta"
+    )
+    return arbol
+
+
+def _request_rerun(self, rerun_data):
+    aceptado = _request_rerun_original(self, rerun_data)
+    # LocalScriptRunner arranca con un pedido de rerun completo ya encolado, que
+    # absorbe al nuestro: se fija la cola de fragmentos sobre el pedido final.
+    pendiente = self._requests._rerun_data
+    if _fragmentos_pedidos and not pendiente.fragment_id_queue:
+        self._requests._rerun_data = dataclasses.replace(pendiente, fragment_id_queue=list(_fragmentos_pedidos))
+    return aceptado
+
+
+LocalScriptRunner.run = _run
+LocalScriptRunner.request_rerun = _request_rerun
+
+
+def _ids_fragmento(at, clave):
+    try:
+        return at._fragment_storage.resolve_target(clave)
+    except Exception:
+        return []
+
+
+def medir(at, interaccion, fragmento):
+    """Aplica la interacción sobre un árbol completo y mide el rerun resultante."""
+    at.run()
+    interaccion(at)
+    _fragmentos_pedidos[:] = _ids_fragmento(at, fragmento) if fragmento else []
+    inicio = time.perf_counter()
+    try:
+        at.run()
+    finally:
+        _fragmentos_pedidos.clear()
+    duracion = time.perf_counter() - inicio
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return duracion, _ultima_corrida["bytes"]
+
+
+def _guardar_app(at):
+    at.text_input(key="nombre").input("Ana")
+    at.button[0].click()
+
+
+def _guardar_app0(at):
+    for i, texto in enumerate(["Alto", "Verde", "Aprobado"], start=1):
+        at.text_input(key=f"cual_{i}").input(texto)
+    at.button[0].click()
+
+
+def _elegir_columnas(clave):
+    def interaccion(at):
+        at.multiselect(key=f"{clave}_columnas").set_value(at.multiselect(key=f"{clave}_columnas").value[:3])
+    return interaccion
+
+
+# app -> [(nombre de la interacción, fragmento que la contiene, función)]
+ESCENARIOS = {
+    "app.py": [
+        ("condiciones: radio", "condiciones", lambda at: at.radio(key="cond_medica").set_value("Sí")),
+        ("encuesta: guardar", None, _guardar_app),
+        ("datos: columnas", "datos", _elegir_columnas("respuestas")),
+    ],
+    "app5.py": [
+        ("condiciones: radio", "condiciones", lambda at: at.radio(key="cond_medica").set_value("Sí")),
+        ("datos personales: nombre", "datos_personales", lambda at: at.text_input(key="nombre").input("Ana")),
+        ("encuesta: guardar", None, lambda at: at.button[0].click()),
+        ("datos: columnas", "datos", _elegir_columnas("respuestas")),
+    ],
+    "app0.py": [
+        ("formulario: guardar", None, _guardar_app0),
+        ("datos: formato", "datos", lambda at: at.radio[0].set_value("Parquet")),
+    ],
+}
+
+PRECARGA = {"app.py": _guardar_app, "app5.py": lambda at: at.button[0].click(), "app0.py": _guardar_app0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--raiz", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+    parser.add_argument("--repeticiones", type=int, default=20)
+    parser.add_argument("--fichas", type=int, default=20, help="respuestas cargadas antes de medir")
+    args = parser.parse_args()
+    raiz = os.path.abspath(args.raiz)
+    sys.path.insert(0, raiz)
+    carpeta = tempfile.mkdtemp(prefix="bench_fragmentos_")
+    os.environ.setdefault("KEPCHUP_ALMACEN", "sqlite:///" + os.path.join(carpeta, "respuestas.db"))
+
+    print(f"{'app':<8} {'interacción':<26} {'tiempo p50 (ms)':>16} {'bytes delta':>12}")
+    for app, escenarios in ESCENARIOS.items():
+        at = AppTest.from_file(os.path.join(raiz, app), default_timeout=60).run()
+        try:
+            for _ in range(args.fichas):
+                at.run()
+                PRECARGA[app](at)
+                at.run()
+        except Exception as error:
+            # Versiones anteriores de una app pueden no tener las claves de widget.
+            print(f"{app:<8} omitida: {error}")
+            continue
+        for nombre, fragmento, interaccion in escenarios:
+            tiempos, tamanos = [], []
+            try:
+                for _ in range(args.repeticiones):
+                    duracion, tam = medir(at, interaccion, fragmento)
+                    tiempos.append(duracion)
+                    tamanos.append(tam)
+            except Exception as error:
+                print(f"{app:<8} {nombre:<26} omitida: {error}")
+                continue
+            print(f"{app:<8} {nombre:<26} {statistics.median(tiempos) * 1e3:>16.1f} "
+                  f"{statistics.median(tamanos):>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
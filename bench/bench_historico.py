@@ -0,0 +1,166 @@
+"""
+Archivo histórico: consultas con poda de particiones contra leer todas las exportaciones.
+
+Uso:
+    python bench/bench_historico.py [--sesiones 360] [--respuestas 50] [--dias 180] [--repeticiones 3]
+
+Se simulan ``--sesiones`` sesiones de ``app.py``, ``app5.py`` y ``app0.py``
+repartidas en ``--dias`` días, de ``--respuestas`` respuestas cada una. Cada sesión deja
+lo que deja hoy: una exportación suelta con la fecha en el nombre (XLSX,
+CSV o JSONL, alternando) y sus respuestas en el almacén, que después se
+pasa al archivo con ``historico.archivar``. ``app.py`` y ``app5.py`` son el
+mismo estudio con dos versiones de esquema. Para cada consulta se mide:
+
+- ``exportaciones``: lo que hay que hacer hoy, leer y reconciliar cada
+  archivo con ``importar.leer_archivo`` y filtrar las filas en Python;
+- ``histórico``: ``historico.consultar`` (poda por estudio y día, columnas y
+  filtros leídos por pyarrow).
+
+Se informa la mediana de ``--repeticiones``, los archivos que lee cada una y
+las filas devueltas, y se verifica que las dos devuelvan las mismas
+respuestas (estudio, ficha y fecha).
+"""
+import argparse
+import datetime
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import historico  # noqa: E402
+import importar  # noqa: E402
+from almacen import AlmacenSQLite  # noqa: E402
+from bench_apptest import APPS, valores_sinteticos  # noqa: E402
+from esquema import cargar_esquema  # noqa: E402
+from exportar import exportar  # noqa: E402
+
+FORMATOS = ("xlsx", "csv", "jsonl")
+ULTIMO_DIA = datetime.date(2024, 6, 30)
+
+
+def simular(carpeta, sesiones, respuestas, dias):
+    """Escribe las exportaciones y el almacén; devuelve (carpeta de exportaciones, almacén)."""
+    exportaciones = os.path.join(carpeta, "exportaciones")
+    os.makedirs(exportaciones)
+    almacen = AlmacenSQLite(os.path.join(carpeta, "respuestas.db"))
+    rng = random.Random(0)
+    for i in range(sesiones):
+        app = ("app.py", "app5.py", "app0.py")[i % 3]
+        esquema = cargar_esquema(APPS[app][0])
+        momento = datetime.datetime.combine(ULTIMO_DIA - datetime.timedelta(days=rng.randrange(dias) if i else 0),
+                                            datetime.time(9)) + datetime.timedelta(seconds=rng.randrange(8 * 3600))
+        filas = []
+        for j in range(respuestas):
+            fecha = (momento + datetime.timedelta(seconds=30 * j)).strftime("%Y-%m-%d %H:%M:%S")
+            previos = (fecha,) if app == "app0.py" else (almacen.asignar_ficha(), fecha)
+            filas.append(esquema.registro(valores_sinteticos(esquema, rng), *previos))
+        for fila in filas:
+            almacen.append(f"sesion_{i}", fila, esperar=False)
+        formato = FORMATOS[i // 3 % len(FORMATOS)]
+        nombre = f"evaluacion_sensorial_{momento.strftime('%Y%m%d_%H%M%S')}_{i}.{formato}"
+        exportar(filas, os.path.join(exportaciones, nombre), formato)
+    almacen.flush()
+    return exportaciones, almacen
+
+
+def consultas():
+    sensorial = cargar_esquema("evaluacion_sensorial").nombre
+    mes = str(ULTIMO_DIA - datetime.timedelta(days=30))
+    return [
+        ("último mes, mujeres 30–45", dict(estudios=[sensorial], desde=mes, hasta=str(ULTIMO_DIA),
+                                           filtro={"genero": "Femenino", "edad": (30, 45)})),
+        ("un día", dict(desde=str(ULTIMO_DIA), hasta=str(ULTIMO_DIA))),
+        ("un estudio, 3 campos", dict(estudios=[sensorial], columnas=["edad", "marca"])),
+        ("todo", dict()),
+    ]
+
+
+def cumple(valor, condicion):
+    if valor is None:
+        return False
+    if isinstance(condicion, tuple):
+        minimo, maximo = condicion
+        return (minimo is None or valor >= minimo) and (maximo is None or valor <= maximo)
+    if isinstance(condicion, list):
+        return valor in condicion
+    return valor == condicion
+
+
+def con_exportaciones(rutas, estudios=None, desde=None, hasta=None, filtro=None, columnas=None):
+    """La consulta como hoy: se leen todas las exportaciones; devuelve {(estudio, ficha, fecha): veces}."""
+    columna = {campo: c for c, campo in historico.version_consolidada()["campos"].items()}
+    filtro = {columna[campo]: valor for campo, valor in (filtro or {}).items()}
+    encontradas = Counter()
+    for ruta in rutas:
+        _, filas = importar.leer_archivo(ruta)
+        for _, _, fila in filas:
+            dia = fila["Fecha"][:10]
+            if estudios is not None and fila["Estudio"] not in estudios:
+                continue
+            if (desde is not None and dia < desde) or (hasta is not None and dia > hasta):
+                continue
+            if all(cumple(fila.get(c), valor) for c, valor in filtro.items()):
+                encontradas[fila["Estudio"], fila.get("Ficha N°") or None, fila["Fecha"]] += 1
+    return encontradas
+
+
+def con_historico(raiz, columnas=None, **consulta):
+    if columnas is not None:
+        columnas = ["Ficha N°", "Fecha"] + columnas
+    tabla = historico.consultar(raiz, columnas=columnas, **consulta)
+    if not tabla.num_rows:
+        return Counter()
+    fichas = tabla["Ficha N°"].to_pylist() if "Ficha N°" in tabla.column_names else [None] * tabla.num_rows
+    fichas = [None if ficha is None else str(ficha) for ficha in fichas]  # texto, como en la importación
+    return Counter(zip(tabla["estudio"].to_pylist(), fichas, tabla["Fecha"].to_pylist()))
+
+
+def mediana(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return statistics.median(tiempos), resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sesiones", type=int, default=360)
+    parser.add_argument("--respuestas", type=int, default=50, help="Respuestas por sesión")
+    parser.add_argument("--dias", type=int, default=180)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+    carpeta = tempfile.mkdtemp(prefix="bench_historico_")
+    exportaciones, almacen = simular(carpeta, args.sesiones, args.respuestas, args.dias)
+    rutas = importar.expandir([exportaciones])
+    raiz = os.path.join(carpeta, "historico")
+    inicio = time.perf_counter()
+    archivado = historico.archivar(almacen, raiz)
+    segundos = time.perf_counter() - inicio
+    almacen.close()
+    total = sum(map(len, historico.archivos(raiz).values()))
+    print(f"{archivado.filas} respuestas: {len(rutas)} exportaciones; archivadas en {segundos:.2f} s "
+          f"({total} archivos Parquet)")
+
+    print(f"{'consulta':<26} {'filas':>7} {'exportaciones (s)':>18} {'archivos':>9} {'histórico (s)':>14} "
+          f"{'archivos':>9} {'aceleración':>12}")
+    for nombre, consulta in consultas():
+        antes, esperadas = mediana(lambda: con_exportaciones(rutas, **consulta), args.repeticiones)
+        despues, obtenidas = mediana(lambda: con_historico(raiz, **consulta), args.repeticiones)
+        if obtenidas != esperadas:
+            raise AssertionError(f"{nombre}: el histórico devolvió {obtenidas.total()} respuestas y las "
+                                 f"exportaciones {esperadas.total()}")
+        leidos = sum(map(len, historico.archivos(raiz, consulta.get("estudios"), consulta.get("desde"),
+                                                 consulta.get("hasta")).values()))
+        print(f"{nombre:<26} {esperadas.total():>7} {antes:>18.3f} {len(rutas):>9} {despues:>14.3f} "
+              f"{leidos:>9} {antes / despues:>11.0f}x")
+
+
+if __name__ == "__main__":
+    main()
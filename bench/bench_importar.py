@@ -0,0 +1,118 @@
+"""
+Importación masiva: filas por segundo según procesos y destino.
+
+Uso:
+    python bench/bench_importar.py [--archivos 24] [--fichas 2000] [--procesos 1 2 4]
+
+Se generan exportaciones sintéticas como las de un día de trabajo en varios
+kioscos: un tercio con el formato de ``app.py``, un tercio con el de
+``app5.py`` (XLSX) y un tercio de ``app0.py`` (CSV). Cada kiosco exporta dos
+veces y la segunda exportación repite la primera mitad de sus fichas, de modo
+que una de cada tres filas leídas es repetida. Se verifica que la
+importación descarte exactamente esas y se informa, para cada cantidad de
+procesos y para los dos destinos (almacén SQLite y dataset Parquet), el
+tiempo total y las filas leídas por segundo.
+
+Antes se verifica que importar dos veces una planilla de las primeras
+versiones de ``app.py`` (fichas "<sesión>_<número>", encuestados anónimos)
+no duplique filas y conserve las fichas.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bench_apptest import valores_sinteticos  # noqa: E402
+from esquema import cargar_esquema  # noqa: E402
+from exportar import exportar  # noqa: E402
+from importar import importar  # noqa: E402
+from almacen import abrir_almacen  # noqa: E402
+
+FORMATOS = (("evaluacion_sensorial", "xlsx"), ("evaluacion_sensorial_completa", "xlsx"),
+            ("recoleccion_datos", "csv"))
+
+
+def generar(carpeta, archivos, fichas):
+    """Escribe las exportaciones y devuelve (filas escritas, filas repetidas)."""
+    rng = random.Random(0)
+    total = repetidas = 0
+    ficha = 0
+    for kiosco in range(archivos // 2):
+        nombre, formato = FORMATOS[kiosco % len(FORMATOS)]
+        esquema = cargar_esquema(nombre)
+        registros = []
+        for _ in range(fichas):
+            ficha += 1
+            previos = (ficha, "2024-05-01 10:00:00") if "Ficha N°" in esquema.columnas_previas \
+                else ("2024-05-01 10:00:00",)
+            registros.append(esquema.registro(valores_sinteticos(esquema, rng), *previos))
+        # Exportación de media mañana (primera mitad) y de fin del día (todas)
+        mitad = registros[:fichas // 2]
+        exportar(mitad, os.path.join(carpeta, f"kiosco{kiosco:02d}_a.{formato}"), formato, esquema.columnas)
+        exportar(registros, os.path.join(carpeta, f"kiosco{kiosco:02d}_b.{formato}"), formato, esquema.columnas)
+        total += len(mitad) + len(registros)
+        repetidas += len(mitad)
+    return total, repetidas
+
+
+def verificar_reimportacion(carpeta):
+    esquema = cargar_esquema("evaluacion_sensorial")
+    rng = random.Random(0)
+    sesion = str(uuid.uuid4())
+    registros = []
+    for i in range(1, 4):
+        registro = esquema.registro(valores_sinteticos(esquema, rng), f"{sesion}_{i}", "2024-05-01 10:00:00")
+        for columna in esquema.columnas_huella:
+            if esquema.tipos_columnas[columna] == "texto":
+                registro[columna] = ""  # anónimo: sin huella
+        registros.append(registro)
+    planilla = os.path.join(carpeta, "evaluacion_sensorial_anterior.xlsx")
+    exportar(registros, planilla, "xlsx", esquema.columnas)
+    destino = "sqlite:///" + os.path.join(carpeta, "reimportacion.db")
+    nuevas = [importar([planilla], destino=destino, procesos=1, informar=lambda _: None).nuevas for _ in range(2)]
+    almacen = abrir_almacen(destino)
+    fichas = sorted(r["Ficha N°"] for r in almacen.iterate())
+    almacen.close()
+    if nuevas != [3, 0] or fichas != sorted(r["Ficha N°"] for r in registros):
+        raise AssertionError(f"Reimportación: nuevas {nuevas}, fichas {fichas}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--archivos", type=int, default=24)
+    parser.add_argument("--fichas", type=int, default=2000, help="Fichas por kiosco")
+    parser.add_argument("--procesos", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    carpeta = tempfile.mkdtemp(prefix="bench_importar_")
+    verificar_reimportacion(carpeta)
+    print("Reimportar una planilla con fichas \"<sesión>_<número>\" no duplica filas")
+    origen = os.path.join(carpeta, "exportaciones")
+    os.makedirs(origen)
+    total, repetidas = generar(origen, args.archivos, args.fichas)
+    print(f"{len(os.listdir(origen))} archivos, {total} filas ({repetidas} repetidas), CPU: {os.cpu_count()}")
+
+    print(f"{'procesos':>8} {'destino':<8} {'segundos':>9} {'filas/s':>9}")
+    for procesos in args.procesos:
+        for destino in ("sqlite", "parquet"):
+            salida = tempfile.mkdtemp(dir=carpeta)
+            inicio = time.perf_counter()
+            if destino == "sqlite":
+                importacion = importar([origen], destino="sqlite:///" + os.path.join(salida, "consolidado.db"),
+                                       procesos=procesos)
+            else:
+                importacion = importar([origen], parquet=salida, procesos=procesos)
+            segundos = time.perf_counter() - inicio
+            if importacion.repetidas != repetidas or importacion.nuevas != total - repetidas:
+                raise AssertionError(f"Se esperaban {repetidas} repetidas y {total - repetidas} nuevas; "
+                                     f"hubo {importacion.repetidas} y {importacion.nuevas}")
+            print(f"{procesos:>8} {destino:<8} {segundos:>9.2f} {total / segundos:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+Informe de análisis sensorial: filas por segundo y memoria sobre millones de filas.
+
+Uso:
+    python bench/bench_informe.py [--filas 2000000] [--estudios 4] [--procesos 1 2]
+                                  [--memoria-mb 64 256] [--almacen 100000]
+
+Se genera un dataset Parquet consolidado sintético (``--filas`` respuestas de
+``--estudios`` estudios mezclados en los mismos archivos, con las columnas de
+identificación y de texto además de las que usa el informe) y se ejecuta
+``informe.py`` en un proceso aparte para cada combinación de ``--procesos`` y
+``--memoria-mb``. Se informa:
+
+- ``filas/s``: respuestas analizadas por segundo (lectura, conteo y HTML);
+- ``RSS máx``: memoria residente máxima del proceso principal o de cualquier
+  proceso del pool (se lee de ``/proc``, solo en Linux); para comparar, se
+  informa la de un proceso que solo importó NumPy y pyarrow. Lo que la
+  supera debe acompañar a ``--memoria-mb`` y no al tamaño del dataset.
+
+Se verifica que los conteos de ``informe.contar`` coincidan con los de
+pandas sobre las columnas generadas, y que en un almacén con una respuesta
+guardada por ``app.py`` y otra importada de una exportación (más una de
+``app0.py``, sin analítica) haya un solo estudio con las dos. Con ``--almacen`` se mide además la
+lectura desde un almacén SQLite con esa cantidad de respuestas.
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+import pyarrow as pa  # noqa: E402
+import pyarrow.parquet as pq  # noqa: E402
+
+import informe  # noqa: E402
+from almacen import AlmacenSQLite  # noqa: E402
+from bench_apptest import valores_sinteticos  # noqa: E402
+from esquema import cargar_esquema  # noqa: E402
+from exportar import exportar  # noqa: E402
+from importar import importar  # noqa: E402
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+ESTUDIOS = ["evaluacion_sensorial_completa", "evaluacion_sensorial"]
+NOMBRES = ["José", "María", "Juan", "Lucía", "Martín", "Sofía", "Joaquín", "Valentina"]
+FILAS_POR_ARCHIVO = 500_000
+
+
+def generar(n, estudios, rng):
+    """Columnas consolidadas sintéticas (aceptación distinta por género y edad)."""
+    analitica = informe.definicion()
+    genero, edad = (columna for columna, _, _ in analitica["por"])
+    generos = np.array(analitica["por"][0][2] + [None], dtype=object)
+    codigo_genero = rng.choice(len(generos), n, p=[0.48, 0.45, 0.05, 0.02])
+    edades = rng.integers(15, 80, n).astype(float)
+    edades[rng.random(n) < 0.01] = np.nan
+    columnas = {
+        "Estudio": np.array(estudios, dtype=object)[rng.integers(0, len(estudios), n)],
+        "Archivo": np.array([f"evaluacion_sensorial_{d:02d}.xlsx" for d in range(30)], dtype=object)[
+            rng.integers(0, 30, n)],
+        "Ficha N°": np.arange(1, n + 1),
+        "Fecha": np.array([f"2024-05-{d:02d} 10:00:00" for d in range(1, 31)], dtype=object)[rng.integers(0, 30, n)],
+        "Nombre": np.array(NOMBRES, dtype=object)[rng.integers(0, len(NOMBRES), n)],
+        "Contacto": np.array([f"11 {i:04d}-0000" for i in range(100)], dtype=object)[rng.integers(0, 100, n)],
+        genero: generos[codigo_genero],
+        edad: edades,
+    }
+    # Más aceptación entre las mujeres y los menores de 30
+    base = 0.5 + 0.1 * (codigo_genero == 0) + 0.1 * (edades < 30)
+    for pregunta in analitica["aceptacion"]:
+        valores = np.where(rng.random(n) < base, "Sí", "No").astype(object)
+        valores[rng.random(n) < 0.02] = None
+        columnas[pregunta] = valores
+    marcas = np.array(analitica["opciones_participacion"] + [None], dtype=object)
+    columnas[analitica["participacion"]] = marcas[rng.choice(len(marcas), n, p=[0.4, 0.3, 0.15, 0.1, 0.05])]
+    return columnas
+
+
+def escribir(carpeta, columnas):
+    n = len(columnas["Estudio"])
+    for i, inicio in enumerate(range(0, n, FILAS_POR_ARCHIVO)):
+        tabla = pa.table({c: v[inicio:inicio + FILAS_POR_ARCHIVO] for c, v in columnas.items()})
+        pq.write_table(tabla, os.path.join(carpeta, f"importacion_{i:03d}.parquet"), row_group_size=100_000)
+
+
+def verificar(conteos, columnas):
+    """Compara las tablas de aceptación y de marcas con ``pd.crosstab``."""
+    analitica = informe.definicion()
+    genero, _, etiquetas = analitica["por"][0]
+    df = pd.DataFrame(columnas)
+    for estudio, conteo in conteos.items():
+        parte = df[df["Estudio"] == estudio]
+        for j, pregunta in enumerate(analitica["aceptacion"]):
+            esperado = pd.crosstab(parte[genero], parte[pregunta]).reindex(
+                index=etiquetas, columns=list(informe.RESPUESTAS), fill_value=0).to_numpy()
+            if not (conteo.aceptacion[genero][:-1, j, :2] == esperado).all():
+                raise AssertionError(f"{estudio}, {pregunta}: los conteos no coinciden con pandas")
+        esperado = parte[analitica["participacion"]].value_counts().reindex(
+            analitica["opciones_participacion"], fill_value=0).to_numpy()
+        if not (conteo.marcas[:-1] == esperado).all() or conteo.n != len(parte):
+            raise AssertionError(f"{estudio}: las marcas o el total no coinciden con pandas")
+
+
+def verificar_estudios(carpeta):
+    """Respuestas guardadas por la app e importadas del mismo esquema cuentan como un solo estudio."""
+    rng = random.Random(0)
+    exportaciones = os.path.join(carpeta, "estudios")
+    os.makedirs(exportaciones)
+    for nombre, formato in (("evaluacion_sensorial", "xlsx"), ("recoleccion_datos", "csv")):
+        esquema = cargar_esquema(nombre)
+        previos = (1, "2024-05-01 10:00:00") if "Ficha N°" in esquema.columnas_previas else ("2024-05-01 10:00:00",)
+        exportar([esquema.registro(valores_sinteticos(esquema, rng), *previos)],
+                 os.path.join(exportaciones, f"{nombre}.{formato}"), formato, esquema.columnas)
+    url = "sqlite:///" + os.path.join(carpeta, "estudios.db")
+    importar([exportaciones], destino=url, procesos=1)
+    esquema = cargar_esquema("evaluacion_sensorial")
+    almacen = AlmacenSQLite(url[len("sqlite:///"):])
+    almacen.append("app", esquema.registro(valores_sinteticos(esquema, rng), 2, "2024-05-01 11:00:00"))
+    almacen.close()
+    conteos = informe.contar(url, procesos=1)
+    if {e: c.n for e, c in conteos.items()} != {esquema.nombre: 2}:
+        raise AssertionError(f"Se esperaba un estudio {esquema.nombre!r} con 2 respuestas: "
+                             f"{ {e: c.n for e, c in conteos.items()} }")
+
+
+def pico_mb(pid):
+    """Memoria residente máxima (VmHWM) de un proceso vivo, en MiB; 0 si ya terminó."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            return next(int(linea.split()[1]) for linea in f if linea.startswith("VmHWM")) / 1024
+    except (OSError, StopIteration):
+        return 0
+
+
+def hijos(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def ejecutar(origen, procesos, memoria_mb, carpeta):
+    """Corre ``informe.py`` en un proceso aparte; devuelve (segundos, RSS máx en MiB)."""
+    # ru_maxrss no sirve: un hijo hereda el máximo del benchmark al hacer fork.
+    # VmHWM es el máximo de cada proceso desde su exec; se consulta mientras corren.
+    inicio = time.perf_counter()
+    proceso = subprocess.Popen([sys.executable, os.path.join(RAIZ, "informe.py"), origen, "--procesos",
+                                str(procesos), "--memoria-mb", str(memoria_mb),
+                                "--salida", os.path.join(carpeta, "informe.html")], stdout=subprocess.DEVNULL)
+    pico = 0
+    while proceso.poll() is None:
+        pico = max([pico] + [pico_mb(pid) for pid in [proceso.pid] + hijos(proceso.pid)])
+        time.sleep(0.02)
+    segundos = time.perf_counter() - inicio
+    if proceso.returncode:
+        raise RuntimeError(f"informe.py terminó con código {proceso.returncode}")
+    return segundos, pico
+
+
+def base_mb():
+    codigo = "import numpy, pyarrow.dataset, pyarrow.compute; " \
+             "print(next(l.split()[1] for l in open('/proc/self/status') if l.startswith('VmHWM')))"
+    return int(subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True).stdout) / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--filas", type=int, default=2_000_000)
+    parser.add_argument("--estudios", type=int, default=4)
+    parser.add_argument("--procesos", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--memoria-mb", type=float, nargs="+", default=[64, 256])
+    parser.add_argument("--almacen", type=int, default=100_000, help="Respuestas del almacén (0: no se mide)")
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+    estudios = (ESTUDIOS + [f"estudio_{i:02d}" for i in range(len(ESTUDIOS), args.estudios)])[:args.estudios]
+    carpeta = tempfile.mkdtemp(prefix="bench_informe_")
+    dataset = os.path.join(carpeta, "consolidado")
+    os.makedirs(dataset)
+
+    verificar_estudios(carpeta)
+    columnas = generar(args.filas, estudios, rng)
+    escribir(dataset, columnas)
+    verificar(informe.contar(dataset, procesos=1, memoria_mb=64), columnas)
+    tamano = sum(os.path.getsize(os.path.join(dataset, f)) for f in os.listdir(dataset))
+    print(f"{args.filas} respuestas de {len(estudios)} estudios en Parquet ({tamano / 2**20:.0f} MiB); "
+          f"proceso base {base_mb():.0f} MiB")
+
+    casos = [("parquet", dataset)]
+    if args.almacen:
+        ruta = os.path.join(carpeta, "consolidado.db")
+        almacen = AlmacenSQLite(ruta)
+        elegidas = random.Random(0).sample(range(args.filas), args.almacen)
+        for i in elegidas:
+            fila = {c: (None if v[i] != v[i] else v[i].item() if hasattr(v[i], "item") else v[i])
+                    for c, v in columnas.items()}
+            almacen.append("importado", fila, esperar=False, token=str(i))
+        almacen.close()
+        verificar(informe.contar("sqlite:///" + ruta, procesos=1, memoria_mb=64),
+                  {c: v[elegidas] for c, v in columnas.items()})
+        casos.append(("almacén", "sqlite:///" + ruta))
+
+    print(f"{'origen':<8} {'procesos':>8} {'memoria (MiB)':>14} {'filas':>10} {'segundos':>9} {'filas/s':>10} "
+          f"{'RSS máx (MiB)':>14}")
+    for nombre, origen in casos:
+        filas = args.filas if nombre == "parquet" else args.almacen
+        for procesos in args.procesos:
+            for memoria_mb in args.memoria_mb:
+                segundos, rss = ejecutar(origen, procesos, memoria_mb, carpeta)
+                print(f"{nombre:<8} {procesos:>8} {memoria_mb:>14g} {filas:>10} {segundos:>9.2f} "
+                      f"{filas / segundos:>10.0f} {rss:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Normalización de frecuencia y cantidad sobre una columna grande.
+
+Uso:
+    python bench/bench_normalizacion.py [--filas 1000000] [--distintas 2000]
+
+Se arma una columna sintética de respuestas libres (con variantes de
+mayúsculas, tildes y espacios, como las escriben los encuestadores) y se
+compara, para frecuencia y cantidad:
+
+- ``reglas por fila``: aplicar las reglas a cada fila sin memoria;
+- ``memo por fila``: ``Series.map`` con la función memorizada (lo que
+  cuesta al guardar, una respuesta por vez);
+- ``vectorizado``: ``normalizar_serie`` (factorizar, interpretar los valores
+  distintos y repartir con ``take``).
+
+Se verifica que los tres den lo mismo y se informa el porcentaje de filas
+reconocidas. Antes se verifican los ``CASOS`` con valor conocido ("2 y
+medio kilos", "3 frascos cada 2 meses", "2 frascos por año"...).
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from normalizacion import INTERPRETES, normalizar_serie  # noqa: E402
+
+PLANTILLAS = {
+    "frecuencia": ["{n} veces por semana", "{n} veces al mes", "{n} vez a la semana", "{n}x semana",
+                   "{n} días a la semana", "{n} veces al día", "cada {n} días", "{n}-{m} veces por semana",
+                   "todos los días", "diario", "quincenal", "nunca", "a veces", "semanalmente"],
+    "cantidad": ["{n} frascos", "{n} kg", "{n} gr por semana", "{n} sobres al mes", "medio kilo",
+                 "{n} litros", "{n}-{m} botellas", "{n} kilos y medio", "una botella por semana",
+                 "{n} y medio kilos", "{n} frascos cada {m} meses", "{n} frascos por año", "no sé", "{n}"],
+}
+# Respuesta -> resultado esperado
+CASOS = {
+    "frecuencia": {"2 y medio veces por semana": (2.5,), "cada 2 días": (3.5,), "2-3 veces por semana": (2.5,)},
+    "cantidad": {
+        "2 y medio kilos": (2500.0, "g"), "1 y medio kilo": (1500.0, "g"), "1 kilo y medio": (1500.0, "g"),
+        "3 frascos cada 2 meses": (1.5, "unidades"), "2 frascos por año": (0.167, "unidades"),
+        "500 g cada 15 días": (1013.889, "g"), "1 kilo por quincena": (2000.0, "g"),
+        "una botella por semana": (4.333, "unidades"), "2 frascos por temporada": (None, ""),
+        "1 kilo por 3 personas": (1000.0, "g"),
+    },
+}
+NUMEROS = ["1", "2", "3", "4", "5", "1,5", "2.5", "250", "500", "una", "dos", "tres"]
+
+
+def vocabulario(tipo, distintas, rng):
+    variantes = set()
+    while len(variantes) < distintas:
+        texto = rng.choice(PLANTILLAS[tipo]).format(n=rng.choice(NUMEROS), m=rng.choice(NUMEROS))
+        texto = rng.choice([str.lower, str.upper, str.capitalize, str])(texto)
+        texto = texto.replace("dias", "días") if rng.random() < 0.5 else texto
+        variantes.add(" " * rng.randint(0, 2) + texto + " " * rng.randint(0, 2))
+    return sorted(variantes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--filas", type=int, default=1_000_000)
+    parser.add_argument("--distintas", type=int, default=2000)
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    for tipo, casos in CASOS.items():
+        for texto, esperado in casos.items():
+            if INTERPRETES[tipo](texto) != esperado:
+                raise AssertionError(f"{tipo}({texto!r}) = {INTERPRETES[tipo](texto)}, se esperaba {esperado}")
+    print(f"{sum(map(len, CASOS.values()))} casos verificados\n")
+
+    print(f"{'tipo':<11} {'filas':>9} {'distintas':>9} {'reglas por fila (s)':>20} {'memo por fila (s)':>18} "
+          f"{'vectorizado (s)':>16} {'reconocidas':>12}")
+    for tipo, interpretar in INTERPRETES.items():
+        palabras = vocabulario(tipo, args.distintas, rng)
+        serie = pd.Series(np.array(palabras, dtype=object)[np.random.default_rng(0).integers(
+            0, len(palabras), args.filas)])
+
+        sin_memo = interpretar.__wrapped__
+        inicio = time.perf_counter()
+        esperado = [sin_memo(texto)[0] for texto in serie]
+        reglas = time.perf_counter() - inicio
+
+        interpretar.cache_clear()
+        inicio = time.perf_counter()
+        memo = serie.map(lambda texto: interpretar(texto)[0])
+        memo_s = time.perf_counter() - inicio
+
+        interpretar.cache_clear()
+        inicio = time.perf_counter()
+        vectorizado = normalizar_serie(serie, tipo)[0]
+        vectorizado_s = time.perf_counter() - inicio
+
+        esperado = np.array([np.nan if v is None else v for v in esperado], dtype=float)
+        if not (np.array_equal(esperado, vectorizado, equal_nan=True)
+                and np.array_equal(esperado, memo.to_numpy(dtype=float, na_value=np.nan), equal_nan=True)):
+            raise AssertionError(f"Los resultados de {tipo} no coinciden")
+        reconocidas = np.count_nonzero(~np.isnan(vectorizado)) / len(serie)
+        print(f"{tipo:<11} {args.filas:>9} {len(palabras):>9} {reglas:>20.2f} {memo_s:>18.2f} "
+              f"{vectorizado_s:>16.3f} {reconocidas:>11.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Memoria por sesión y costo de armar el DataFrame: diccionarios vs. colección por columnas.
+
+Uso:
+    python bench/bench_registro_compacto.py [--respuestas 1000 10000 100000] [--esquema evaluacion_sensorial]
+
+Las respuestas sintéticas pasan por JSON, como cuando se leen del almacén. Se
+comparan dos representaciones de las mismas respuestas:
+
+- ``dicts``: lista de diccionarios con etiquetas (lo que devuelve el almacén);
+- ``columnas``: la colección por columnas que arman ``app.py`` y ``app5.py``
+  (``CodecRegistro.coleccion`` llenada con ``agregar``).
+
+La memoria es la que queda asignada según tracemalloc después de construir
+cada representación. El DataFrame se arma con ``DataFrame.from_records`` para
+los diccionarios (lo que hacía el visor) y con ``frame()`` para las columnas;
+también se informa su tamaño con ``memory_usage(deep=True)``.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pandas as pd  # noqa: E402
+
+from bench_apptest import valores_sinteticos  # noqa: E402
+from esquema import cargar_esquema  # noqa: E402
+from registro_compacto import CodecRegistro  # noqa: E402
+
+
+def memoria(construir):
+    tracemalloc.start()
+    resultado = construir()
+    actual, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return resultado, actual
+
+
+def cronometrar(funcion, repeticiones=5):
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return resultado, mejor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--respuestas", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--esquema", default="evaluacion_sensorial")
+    args = parser.parse_args()
+    esquema = cargar_esquema(args.esquema)
+    codec = CodecRegistro(esquema)
+
+    print(f"{'respuestas':>10} {'dicts (MiB)':>12} {'columnas':>9} {'agregar (µs)':>13} "
+          f"{'frame dicts (ms)':>17} {'frame cols (ms)':>16} {'df dicts (MiB)':>15} {'df cols (MiB)':>14}")
+    for n in args.respuestas:
+        rng = random.Random(n)
+        lineas = [
+            json.dumps(esquema.registro(valores_sinteticos(esquema, rng), i + 1, f"2024-05-{1 + i % 28:02d} 10:00:00"),
+                       ensure_ascii=False)
+            for i in range(n)
+        ]
+        dicts, mem_dicts = memoria(lambda: [json.loads(linea) for linea in lineas])
+
+        def llenar():
+            coleccion = codec.coleccion()
+            for r in dicts:
+                codec.agregar(coleccion, r)
+            return coleccion
+        coleccion, mem_columnas = memoria(llenar)
+        _, t_llenar = cronometrar(llenar, repeticiones=3)
+
+        df_dicts, t_dicts = cronometrar(lambda: pd.DataFrame.from_records(dicts))
+        # frame() se reutiliza hasta el próximo append: se invalida para medir la construcción
+        def frame():
+            coleccion._frame = None
+            return coleccion.frame()
+        df_cols, t_cols = cronometrar(frame)
+
+        mib = 2 ** 20
+        print(f"{n:>10} {mem_dicts / mib:>12.2f} {mem_columnas / mib:>9.2f} {t_llenar / n * 1e6:>13.2f} "
+              f"{t_dicts * 1e3:>17.2f} {t_cols * 1e3:>16.2f} "
+              f"{df_dicts.memory_usage(deep=True).sum() / mib:>15.2f} "
+              f"{df_cols.memory_usage(deep=True).sum() / mib:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
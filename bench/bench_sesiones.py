@@ -0,0 +1,100 @@
+"""
+Registro de sesiones: estimación de memoria, costo del barrido y presupuesto.
+
+Uso:
+    python bench/bench_sesiones.py [--sesiones 50 200] [--registros 2000] [--presupuesto-mb 16]
+
+Se simulan sesiones de ``app0.py`` (buffer columnar, estadísticas e índice
+de duplicados con ``--registros`` registros cada una) registradas en un
+``RegistroSesiones`` con reloj simulado, y se informa:
+
+- ``estimado`` y ``medido``: bytes que calcula el registro y bytes que
+  asigna Python al armar las sesiones (``tracemalloc``);
+- ``barrido``: cuánto tarda un barrido (se mide cada sesión);
+- ``tras barrer``: memoria retenida después de que la mitad de las sesiones
+  quedan inactivas y el resto supera el presupuesto; debe quedar por debajo
+  de ``--presupuesto-mb``, y cada sesión desalojada queda en el almacén.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from almacen import AlmacenMemoria  # noqa: E402
+from bench_apptest import valores_sinteticos  # noqa: E402
+from buffer_columnar import BufferColumnar  # noqa: E402
+from duplicados import IndiceDuplicados  # noqa: E402
+from esquema import cargar_esquema  # noqa: E402
+from estadisticas import EstadisticasColumnas  # noqa: E402
+from sesiones import RegistroSesiones  # noqa: E402
+
+
+def sesion_app0(esquema, n, rng):
+    registros = BufferColumnar(esquema.tipos_columnas)
+    estadisticas = EstadisticasColumnas(esquema.numericas)
+    duplicados = IndiceDuplicados()
+    for i in range(n):
+        registro = esquema.registro(valores_sinteticos(esquema, rng), "2024-05-01 10:00:00")
+        registros.append(registro)
+        estadisticas.agregar(registro)
+        duplicados.agregar(i + 1, f"t{i}", esquema.huella(registro))
+    return registros, estadisticas, duplicados
+
+
+def liberar(almacen, sesion, registros):
+    for i in range(len(registros)):
+        fila = {c: registros.columna(c)[i].item() for c in registros.columnas}
+        almacen.append(sesion, fila, token=f"{sesion}:{i}")
+    registros.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sesiones", type=int, nargs="+", default=[50, 200])
+    parser.add_argument("--registros", type=int, default=2000)
+    parser.add_argument("--presupuesto-mb", type=float, default=16)
+    args = parser.parse_args()
+    esquema = cargar_esquema("recoleccion_datos")
+
+    print(f"{'sesiones':>8} {'estimado (MiB)':>15} {'medido (MiB)':>13} {'barrido (ms)':>13} "
+          f"{'tras barrer (MiB)':>18} {'desalojadas':>12}")
+    for n in args.sesiones:
+        ahora = [0.0]
+        registro = RegistroSesiones(presupuesto=float("inf"), inactividad=1800, intervalo=1e9, minimo=30,
+                                    reloj=lambda: ahora[0])
+        almacen = AlmacenMemoria()
+        rng = random.Random(n)
+        tracemalloc.start()
+        antes = tracemalloc.get_traced_memory()[0]
+        sesiones = [sesion_app0(esquema, args.registros, rng) for _ in range(n)]
+        medido = tracemalloc.get_traced_memory()[0] - antes
+        tracemalloc.stop()
+        for i, objetos in enumerate(sesiones):
+            registro.tocar(f"s{i}", "app0.py", objetos, lambda i=i: liberar(almacen, f"s{i}", sesiones[i][0]))
+            ahora[0] += 1
+
+        inicio = time.perf_counter()
+        estimado = registro.barrer()
+        barrido = time.perf_counter() - inicio
+
+        # La primera mitad queda abandonada; el resto sigue en uso hace un minuto
+        registro.presupuesto = args.presupuesto_mb * 2**20
+        ahora[0] += 1800 - n // 2
+        for i in range(n // 2, n):
+            registro.tocar(f"s{i}", "app0.py", sesiones[i], registro._sesiones[f"s{i}"].liberar)
+        ahora[0] += 60
+        tras = registro.barrer()
+        guardadas = sum(almacen.count(f"s{i}") == args.registros for i in range(n)
+                        if f"s{i}" not in registro._sesiones)
+        if tras > registro.presupuesto or guardadas != registro.desalojos:
+            raise AssertionError(f"Quedaron {tras} bytes y {guardadas} de {registro.desalojos} sesiones guardadas")
+        print(f"{n:>8} {estimado / 2**20:>15.1f} {medido / 2**20:>13.1f} {barrido * 1e3:>13.1f} "
+              f"{tras / 2**20:>18.1f} {registro.desalojos:>12}")
+
+
+if __name__ == "__main__":
+    main()
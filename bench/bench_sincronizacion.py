@@ -0,0 +1,182 @@
+"""
+Sincronización con el colector: filas por segundo, demora y fallos de red.
+
+Uso:
+    python bench/bench_sincronizacion.py [--respuestas 20000] [--ritmo 2000] [--lotes 100 500]
+                                         [--fallas 0 0.3]
+
+Se levantan en el mismo host un colector (``sincronizacion.colector`` sobre
+un almacén SQLite) y, delante, un intermediario que simula una red mala: con
+probabilidad ``--fallas`` rechaza el lote antes de que llegue (503) o lo
+entrega y pierde el acuse (el kiosco lo reenvía). Un productor guarda
+``--respuestas`` respuestas en el almacén local a ``--ritmo`` por segundo
+mientras un ``Sincronizador`` las envía (con ``--ritmo 0`` las guarda todas
+sin conexión y después las drena). Se informa, para cada tamaño de lote
+y tasa de fallas:
+
+- ``filas/s``: filas confirmadas por segundo de envío (lotes comprimidos);
+- ``compresión``: bytes de JSON por byte enviado;
+- ``demora p50/p95``: del guardado en el kiosco al acuse del colector;
+- ``reintentos``: envíos fallidos.
+
+Se verifica que el colector termine con exactamente las respuestas del
+kiosco (ni perdidas ni duplicadas). Antes se verifica que el colector no
+escuche en una interfaz pública sin clave y que un lote con filas mal
+formadas se rechace con 400 (el kiosco no lo reintenta) sin guardar nada, y
+que dos kioscos con el mismo token guarden dos filas (el token se guarda con
+el origen como prefijo).
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from almacen import AlmacenSQLite  # noqa: E402
+from bench_apptest import valores_sinteticos  # noqa: E402
+from esquema import cargar_esquema  # noqa: E402
+from sincronizacion import Sincronizador, colector, ingerir  # noqa: E402
+
+
+def intermediario(destino, fallas, rng):
+    """Reenvía los lotes a ``destino``; con probabilidad ``fallas`` no llega el lote o se pierde el acuse."""
+    class Manejador(BaseHTTPRequestHandler):
+        def do_POST(self):
+            cuerpo = self.rfile.read(int(self.headers["Content-Length"]))
+            falla = rng.random() < fallas
+            if falla and rng.random() < 0.5:
+                self.send_error(503)  # el lote no llegó
+                return
+            pedido = Request(destino + self.path, data=cuerpo, method="POST",
+                             headers={k: v for k, v in self.headers.items() if k.lower() != "host"})
+            with urlopen(pedido) as respuesta:
+                acuse = respuesta.read()
+            if falla:
+                self.send_error(503)  # llegó, pero se perdió el acuse
+                return
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(acuse)))
+            self.end_headers()
+            self.wfile.write(acuse)
+
+        def log_message(self, *args):
+            pass
+
+    return ThreadingHTTPServer(("127.0.0.1", 0), Manejador)
+
+
+def en_segundo_plano(servidor):
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{servidor.server_address[1]}"
+
+
+def verificar_rechazos(carpeta):
+    central = AlmacenSQLite(os.path.join(carpeta, "central_rechazos.db"))
+    try:
+        colector(central, 0, "0.0.0.0", clave=None)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("El colector escuchó en 0.0.0.0 sin clave")
+
+    servidor = colector(central, 0, "127.0.0.1", clave=None)
+    url = en_segundo_plano(servidor)
+    lineas = [{"id": 1, "sesion": "s", "token": "t1", "huella": None, "respuesta": {"Ficha N°": 1}},
+              {"id": 2, "token": "t2", "huella": None}]  # sin sesión ni respuesta
+    cuerpo = gzip.compress("".join(json.dumps(linea) + "\n" for linea in lineas).encode("utf-8"))
+    pedido = Request(url + "/lote", data=cuerpo, method="POST", headers={"X-Kepchup-Origen": "kiosco"})
+    try:
+        urlopen(pedido).close()
+        codigo = 200
+    except HTTPError as error:
+        codigo = error.code
+    servidor.shutdown()
+    servidor.server_close()
+    guardadas = central.count()
+    central.close()
+    if codigo != 400 or guardadas:
+        raise AssertionError(f"Lote mal formado: respuesta {codigo} y {guardadas} filas guardadas")
+
+    # La misma ficha anónima importada en dos kioscos (mismo token, sin huella)
+    central = AlmacenSQLite(os.path.join(carpeta, "central_origenes.db"))
+    fila = {"id": 1, "sesion": "s", "token": "Evaluación sensorial:1:", "huella": None, "respuesta": {"Ficha N°": 1}}
+    for origen in ("kiosco1", "kiosco2", "kiosco1"):
+        ingerir(central, origen, [fila])
+    guardadas = central.count()
+    central.close()
+    if guardadas != 2:
+        raise AssertionError(f"Dos kioscos con el mismo token: {guardadas} filas en el colector (se esperaban 2)")
+
+
+def medir(carpeta, filas, ritmo, tam_lote, fallas):
+    local = AlmacenSQLite(os.path.join(carpeta, f"kiosco_{tam_lote}_{fallas}.db"))
+    central = AlmacenSQLite(os.path.join(carpeta, f"central_{tam_lote}_{fallas}.db"))
+    servidor = colector(central, 0, "127.0.0.1")
+    proxy = intermediario(en_segundo_plano(servidor), fallas, random.Random(1))
+    sincronizador = Sincronizador(local, en_segundo_plano(proxy), origen="kiosco", tam_lote=tam_lote,
+                                  intervalo=0.05, espera_minima=0.02, espera_maxima=0.5)
+    if ritmo > 0:
+        sincronizador.iniciar()
+
+    inicio = time.perf_counter()
+    for i, fila in enumerate(filas):
+        local.append("sesion", fila, esperar=False, token=f"t{i}")
+        if i % 100 == 99 and ritmo > 0:
+            local.flush()
+            sincronizador.avisar()
+            time.sleep(max(0.0, inicio + (i + 1) / ritmo - time.perf_counter()))
+    local.flush()
+    # Con --ritmo 0 el kiosco estuvo sin conexión: se drena todo lo acumulado
+    sincronizador.iniciar()
+    while sincronizador.pendientes():
+        time.sleep(0.01)
+    sincronizador.detener()
+    for http in (proxy, servidor):
+        http.shutdown()
+        http.server_close()
+
+    if central.count() != len(filas) or local.marca_envio(sincronizador.url) != len(filas):
+        raise AssertionError(f"El colector tiene {central.count()} respuestas y el kiosco guardó {len(filas)}")
+    resumen = sincronizador.resumen()
+    local.close()
+    central.close()
+    return resumen
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--respuestas", type=int, default=20_000)
+    parser.add_argument("--ritmo", type=float, default=2000,
+                        help="Respuestas guardadas por segundo (0: todas sin conexión y luego se drenan)")
+    parser.add_argument("--lotes", type=int, nargs="+", default=[100, 500])
+    parser.add_argument("--fallas", type=float, nargs="+", default=[0.0, 0.3])
+    args = parser.parse_args()
+    esquema = cargar_esquema("evaluacion_sensorial")
+    rng = random.Random(0)
+    filas = [esquema.registro(valores_sinteticos(esquema, rng), i + 1, "2024-05-01 10:00:00")
+             for i in range(args.respuestas)]
+    carpeta = tempfile.mkdtemp(prefix="bench_sincronizacion_")
+    verificar_rechazos(carpeta)
+    print("Colector: sin clave solo local; lote mal formado -> 400; tokens separados por kiosco\n")
+
+    print(f"{'lote':>5} {'fallas':>7} {'lotes':>6} {'filas/s':>9} {'compresión':>11} {'demora p50 (s)':>15} "
+          f"{'demora p95 (s)':>15} {'reintentos':>11}")
+    for tam_lote in args.lotes:
+        for fallas in args.fallas:
+            resumen = medir(carpeta, filas, args.ritmo, tam_lote, fallas)
+            print(f"{tam_lote:>5} {fallas:>7.0%} {resumen['lotes']:>6} {resumen['filas/s']:>9} "
+                  f"{resumen['compresión']:>10.1f}x {resumen['demora p50 (s)']:>15.2f} "
+                  f"{resumen['demora p95 (s)']:>15.2f} {resumen['reintentos']:>11}")
+
+
+if __name__ == "__main__":
+    main()
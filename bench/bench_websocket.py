@@ -0,0 +1,216 @@
+"""
+Bytes por websocket y tiempo de cada rerun, medidos contra un servidor real.
+
+Uso:
+    python bench/bench_websocket.py [--raiz .] [--apps app.py app5.py] [--respuestas 500]
+                                    [--repeticiones 5] [--ancho-banda 1000]
+
+Cada app se levanta con ``streamlit run`` (desde ``--raiz``, así que toma su
+``.streamlit/config.toml``) sobre un almacén con ``--respuestas`` respuestas
+en una sesión, y un cliente se conecta a ``/_stcore/stream`` como el
+navegador: pide los reruns con ``BackMsg``, guarda los hashes de los
+mensajes que el servidor marca como cacheables y los informa en cada
+pedido (el servidor manda entonces una referencia en lugar del mensaje).
+Cada repetición es una pestaña nueva (caché del navegador vacía) que hace:
+
+- ``carga``: el primer rerun de la sesión;
+- ``rerun``: un rerun completo sin cambios (otro widget fuera de un fragmento);
+- ``página 2`` / ``página 1``: cambiar la página del visor (rerun del
+  fragmento de datos), ida y vuelta.
+
+Se informa la mediana de los mensajes, los bytes de los ``ForwardMsg``, los
+bytes recibidos por el socket (con la compresión del websocket, si el
+servidor la negocia), las
+referencias a mensajes ya cacheados, el tiempo hasta ``script_finished`` y
+una estimación del tiempo con un enlace de ``--ancho-banda`` kbit/s (el Wi-Fi
+de un evento). ``app0.py`` no se mide: sus datos viven en la sesión y no se
+pueden precargar desde afuera.
+
+``--raiz`` permite medir otra copia del repositorio (por ejemplo un
+``git worktree`` de una versión anterior) para comparar antes/después.
+"""
+import argparse
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+from urllib.request import urlopen
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from streamlit.proto.BackMsg_pb2 import BackMsg  # noqa: E402
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg  # noqa: E402
+from streamlit.proto.WidgetStates_pb2 import WidgetState  # noqa: E402
+from websockets.sync.client import connect  # noqa: E402
+
+from almacen import AlmacenSQLite  # noqa: E402
+from bench_apptest import APPS, valores_sinteticos  # noqa: E402
+from esquema import cargar_esquema  # noqa: E402
+
+SESION = "bench_websocket"
+ESCENARIOS = ("carga", "rerun", "página 2", "página 1")
+
+
+class SocketContado(socket.socket):
+    """Socket que cuenta los bytes recibidos (lo que viaja por la red)."""
+
+    recibidos = 0
+
+    def recv(self, *args):
+        datos = super().recv(*args)
+        self.recibidos += len(datos)
+        return datos
+
+    def recv_into(self, *args):
+        n = super().recv_into(*args)
+        self.recibidos += n
+        return n
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def precargar(ruta, nombre_esquema, n):
+    esquema = cargar_esquema(nombre_esquema)
+    almacen = AlmacenSQLite(ruta)
+    rng = random.Random(0)
+    for _ in range(n):
+        almacen.append(SESION, esquema.registro(valores_sinteticos(esquema, rng), almacen.asignar_ficha(),
+                                                "2024-05-01 10:00:00"), esperar=False)
+    almacen.close()
+
+
+def levantar(raiz, app, carpeta):
+    """Inicia ``streamlit run`` y espera a que responda; devuelve (proceso, puerto)."""
+    puerto = puerto_libre()
+    entorno = dict(os.environ, KEPCHUP_ALMACEN="sqlite:///" + os.path.join(carpeta, "respuestas.db"),
+                   KEPCHUP_EXPORTACIONES=os.path.join(carpeta, "exportaciones"))
+    entorno.pop("KEPCHUP_COLECTOR", None)
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", app, "--server.headless=true", f"--server.port={puerto}",
+         "--server.address=127.0.0.1", "--browser.gatherUsageStats=false", "--server.fileWatcherType=none"],
+        cwd=raiz, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    limite = time.monotonic() + 60
+    while time.monotonic() < limite:
+        try:
+            with urlopen(f"http://127.0.0.1:{puerto}/_stcore/health", timeout=1):
+                return proceso, puerto
+        except OSError:
+            time.sleep(0.2)
+    proceso.kill()
+    raise RuntimeError(f"{app} no respondió en {raiz}")
+
+
+class Navegador:
+    """Cliente del websocket de Streamlit con la caché de mensajes del navegador."""
+
+    def __init__(self, puerto):
+        self.puerto = puerto
+        self.cache = set()
+        self.pagina_app = ""
+        self.widget_pagina = None  # (id del widget "Página", id del fragmento)
+        self._pila = ExitStack()
+
+    def __enter__(self):
+        self.socket = SocketContado(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.connect(("127.0.0.1", self.puerto))
+        url = f"ws://127.0.0.1:{self.puerto}/_stcore/stream"
+        self.ws = self._pila.enter_context(connect(url, sock=self.socket, subprotocols=["streamlit"], max_size=None))
+        return self
+
+    def __exit__(self, *error):
+        self._pila.close()
+
+    def rerun(self, widgets=(), fragmento=""):
+        """Pide un rerun y lee hasta ``script_finished``; devuelve sus medidas."""
+        pedido = BackMsg()
+        estado = pedido.rerun_script
+        estado.query_string = f"sesion={SESION}"
+        estado.page_script_hash = self.pagina_app
+        estado.fragment_id = fragmento
+        estado.cached_message_hashes.extend(sorted(self.cache))
+        estado.widget_states.widgets.extend(widgets)
+
+        mensajes = bytes_mensajes = referencias = 0
+        antes = self.socket.recibidos
+        inicio = time.perf_counter()
+        self.ws.send(pedido.SerializeToString())
+        while True:
+            datos = self.ws.recv(timeout=120)
+            mensaje = ForwardMsg.FromString(datos)
+            mensajes += 1
+            bytes_mensajes += len(datos)
+            if mensaje.metadata.cacheable and mensaje.hash:
+                self.cache.add(mensaje.hash)
+            tipo = mensaje.WhichOneof("type")
+            if tipo == "ref_hash":
+                referencias += 1
+            elif tipo == "new_session":
+                self.pagina_app = mensaje.new_session.page_script_hash
+            elif tipo == "delta" and mensaje.delta.new_element.WhichOneof("type") == "number_input":
+                numero = mensaje.delta.new_element.number_input
+                if numero.label == "Página":
+                    self.widget_pagina = (numero.id, mensaje.delta.fragment_id)
+            elif tipo == "script_finished" and mensaje.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                break
+        return {"mensajes": mensajes, "bytes": bytes_mensajes, "cable": self.socket.recibidos - antes,
+                "referencias": referencias, "tiempo": time.perf_counter() - inicio}
+
+    def ir_a_pagina(self, numero):
+        if self.widget_pagina is None:
+            raise RuntimeError("El visor no mostró el selector de página")
+        widget, fragmento = self.widget_pagina
+        return self.rerun([WidgetState(id=widget, int_value=numero)], fragmento)
+
+
+def medir_app(raiz, app, respuestas, repeticiones):
+    carpeta = tempfile.mkdtemp(prefix="bench_websocket_")
+    precargar(os.path.join(carpeta, "respuestas.db"), APPS[app][0], respuestas)
+    proceso, puerto = levantar(raiz, app, carpeta)
+    medidas = {escenario: [] for escenario in ESCENARIOS}
+    try:
+        for _ in range(repeticiones):
+            with Navegador(puerto) as navegador:
+                medidas["carga"].append(navegador.rerun())
+                medidas["rerun"].append(navegador.rerun())
+                medidas["página 2"].append(navegador.ir_a_pagina(2))
+                medidas["página 1"].append(navegador.ir_a_pagina(1))
+    finally:
+        proceso.terminate()
+        proceso.wait()
+    return medidas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--raiz", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+    parser.add_argument("--apps", nargs="+", default=["app.py", "app5.py"], choices=["app.py", "app5.py"])
+    parser.add_argument("--respuestas", type=int, default=500)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--ancho-banda", type=float, default=1000, help="kbit/s para estimar el tiempo en la red")
+    args = parser.parse_args()
+    raiz = os.path.abspath(args.raiz)
+
+    print(f"{'app':<8} {'escenario':<9} {'mensajes':>8} {'bytes':>9} {'en el cable':>12} {'referencias':>12} "
+          f"{'tiempo (ms)':>12} {f'a {args.ancho_banda:g} kbit/s (ms)':>22}")
+    for app in args.apps:
+        medidas = medir_app(raiz, app, args.respuestas, args.repeticiones)
+        for escenario, lista in medidas.items():
+            mediana = {clave: statistics.median(m[clave] for m in lista) for clave in lista[0]}
+            enlace = mediana["tiempo"] * 1e3 + mediana["cable"] * 8 / args.ancho_banda
+            print(f"{app:<8} {escenario:<9} {mediana['mensajes']:>8.0f} {mediana['bytes']:>9.0f} "
+                  f"{mediana['cable']:>12.0f} {mediana['referencias']:>12.0f} {mediana['tiempo'] * 1e3:>12.1f} "
+                  f"{enlace:>22.1f}")
+
+
+if __name__ == "__main__":
+    main()
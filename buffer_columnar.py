@@ -0,0 +1,137 @@
+"""
+Buffer columnar de registros con inserción en O(1) amortizado.
+
+Cada columna vive en un arreglo de NumPy con tipo fijo que crece al doble
+cuando se llena, en lugar de copiar todo el DataFrame en cada ``pd.concat``:
+
+- ``"float64"``: valores numéricos.
+- ``"int64"``: enteros (por ejemplo números de ficha).
+- ``"uint8"``: enteros chicos (por ejemplo edades).
+- ``"bool"``: sí/no.
+- ``"texto"``: códigos ``int32`` sobre un pool de cadenas internadas (cada
+  cadena distinta se guarda una sola vez).
+- ``"categoria"``: códigos ``int8`` sobre una tabla fija de etiquetas
+  compartida (las opciones de la pregunta); -1 si el valor no es una opción.
+
+``frame()`` devuelve un DataFrame que referencia los arreglos numéricos y
+booleanos sin copiarlos; las columnas de texto y de categoría se exponen como
+``Categorical`` (pandas solo reajusta el ancho de los códigos, nunca copia
+cadenas).
+"""
+import sys
+
+import numpy as np
+
+TIPOS = {"float64": np.float64, "int64": np.int64, "uint8": np.uint8, "bool": np.bool_, "texto": np.int32, "categoria": np.int8}
+
+
+class PoolCadenas:
+    """Tabla de cadenas internadas: cadena -> código entero."""
+
+    def __init__(self):
+        self.codigos = {}
+        self.cadenas = []
+        self._bytes_cadenas = 0
+
+    def codigo(self, cadena):
+        codigo = self.codigos.get(cadena)
+        if codigo is None:
+            codigo = self.codigos[cadena] = len(self.cadenas)
+            self.cadenas.append(cadena)
+            self._bytes_cadenas += sys.getsizeof(cadena)
+        return codigo
+
+    @property
+    def nbytes(self):
+        return sys.getsizeof(self.codigos) + sys.getsizeof(self.cadenas) + self._bytes_cadenas
+
+
+class BufferColumnar:
+    """
+    Registros almacenados por columnas.
+
+    ``columnas`` es un diccionario ordenado ``nombre -> tipo`` (ver
+    ``TIPOS``). Las columnas ``"categoria"`` necesitan su tabla de etiquetas
+    en ``etiquetas`` (``nombre -> lista``). ``append`` recibe los valores ya
+    tipados, salvo texto y categoría, que se reciben como etiqueta.
+    """
+
+    def __init__(self, columnas, capacidad=64, etiquetas=None):
+        etiquetas = dict(etiquetas or {})
+        for nombre, tipo in columnas.items():
+            if tipo not in TIPOS:
+                raise ValueError(f"Tipo de columna desconocido para {nombre!r}: {tipo}")
+            if tipo == "categoria" and nombre not in etiquetas:
+                raise ValueError(f"Faltan las etiquetas de la columna {nombre!r}")
+        self.columnas = dict(columnas)
+        self.etiquetas = etiquetas
+        self._capacidad_inicial = capacidad
+        self._capacidad = capacidad
+        self._n = 0
+        self._arreglos = {c: np.empty(capacidad, dtype=TIPOS[t]) for c, t in self.columnas.items()}
+        self._pools = {c: PoolCadenas() for c, t in self.columnas.items() if t == "texto"}
+        self._categorias = {c: {e: i for i, e in enumerate(etiquetas[c])}
+                            for c, t in self.columnas.items() if t == "categoria"}
+        self._frame = None
+        self.version = 0
+
+    def __len__(self):
+        return self._n
+
+    def append(self, registro):
+        if self._n == self._capacidad:
+            self._crecer()
+        i = self._n
+        for nombre, arreglo in self._arreglos.items():
+            valor = registro[nombre]
+            pool = self._pools.get(nombre)
+            if pool is not None:
+                valor = pool.codigo(str(valor))
+            elif nombre in self._categorias:
+                valor = self._categorias[nombre].get(valor, -1)
+            arreglo[i] = valor
+        self._n += 1
+        self._frame = None
+        self.version += 1
+
+    @property
+    def nbytes(self):
+        """Memoria aproximada: arreglos (con la capacidad reservada) y pools de cadenas."""
+        return sum(a.nbytes for a in self._arreglos.values()) + sum(p.nbytes for p in self._pools.values())
+
+    def clear(self):
+        # La versión sigue creciendo para que las cachés externas se invaliden.
+        version = self.version
+        self.__init__(self.columnas, self._capacidad_inicial, self.etiquetas)
+        self.version = version + 1
+
+    def columna(self, nombre):
+        """Vista de los valores numéricos (o códigos) de una columna."""
+        return self._arreglos[nombre][:self._n]
+
+    def frame(self):
+        """DataFrame sobre los arreglos actuales (se reutiliza hasta el próximo ``append``)."""
+        import pandas as pd
+
+        if self._frame is None:
+            datos = {}
+            for nombre, arreglo in self._arreglos.items():
+                vista = arreglo[:self._n]
+                pool = self._pools.get(nombre)
+                if pool is not None:
+                    tipo = pd.CategoricalDtype(pool.cadenas)
+                    vista = pd.Categorical.from_codes(vista, dtype=tipo, validate=False)
+                elif nombre in self._categorias:
+                    tipo = pd.CategoricalDtype(self.etiquetas[nombre])
+                    vista = pd.Categorical.from_codes(vista, dtype=tipo, validate=False)
+                datos[nombre] = vista
+            self._frame = pd.DataFrame(datos, copy=False)
+        return self._frame
+
+    def _crecer(self):
+        # Crecimiento geométrico: cada elemento se copia O(1) veces en promedio.
+        self._capacidad *= 2
+        for nombre, arreglo in self._arreglos.items():
+            nuevo = np.empty(self._capacidad, dtype=arreglo.dtype)
+            nuevo[:self._n] = arreglo[:self._n]
+            self._arreglos[nombre] = nuevo
@@ -0,0 +1,134 @@
+"""
+Búsqueda de encuestados en la pestaña de datos.
+
+Para encontrar a una persona (y corregir su ficha) sin recorrer la tabla, cada
+sesión mantiene un índice invertido sobre las columnas de ``busqueda`` del
+esquema (nombre, apellido, contacto y los textos libres) y el número de ficha:
+
+- cada valor se normaliza como en ``duplicados.normalizar`` (sin tildes, en
+  minúsculas) y se parte en palabras; "Pérez" y "perez" son la misma. Un
+  valor con varios grupos de dígitos (un teléfono "11 4567-8901") agrega
+  además los dígitos juntos, para buscarlo con o sin separadores;
+- ``palabra -> posiciones`` de las filas que la contienen (arreglos
+  crecientes: las filas se agregan en orden);
+- el vocabulario ordenado, para resolver prefijos con búsqueda binaria.
+
+Agregar una fila cuesta O(palabras de la fila): las posiciones se agregan al
+final de su arreglo y las palabras nuevas a una lista chica de recientes, que
+se mezcla con el vocabulario cada ``MAX_RECIENTES`` palabras. Una consulta
+toma cada palabra como prefijo ("per" encuentra "Pérez" y "Peralta"), une
+con NumPy las posiciones de las palabras que empiezan así e intersecta las
+de cada palabra de la consulta: el costo depende de las coincidencias y no
+de las filas de la sesión.
+"""
+import bisect
+import heapq
+import re
+import sys
+from array import array
+
+from duplicados import normalizar
+
+_PALABRA = re.compile(r"[^\W_]+")
+# Palabras nuevas que se juntan antes de mezclarlas con el vocabulario ordenado
+MAX_RECIENTES = 1024
+
+
+def palabras(valores):
+    """Palabras normalizadas (sin repetir) de una secuencia de valores."""
+    encontradas = []
+    for valor in valores:
+        partes = _PALABRA.findall(normalizar(valor))
+        encontradas += partes
+        digitos = [p for p in partes if p.isdigit()]
+        if len(digitos) > 1:
+            encontradas.append("".join(digitos))
+    return list(dict.fromkeys(encontradas))
+
+
+def _rango(ordenadas, prefijo):
+    inicio = bisect.bisect_left(ordenadas, prefijo)
+    fin = bisect.bisect_left(ordenadas, prefijo[:-1] + chr(ord(prefijo[-1]) + 1), inicio)
+    return ordenadas[inicio:fin]
+
+
+class IndiceBusqueda:
+    """Índice invertido incremental de las respuestas de una sesión."""
+
+    def __init__(self, columnas):
+        self.columnas = list(columnas)
+        self.clear()
+
+    def clear(self):
+        self.n = 0  # filas indexadas (la próxima tiene esta posición)
+        self.posiciones = {}  # palabra -> array de posiciones
+        # Vocabulario ordenado en dos partes: insertar en una lista de cientos
+        # de miles de palabras mueve toda la cola, así que las nuevas van a
+        # una lista chica que se mezcla con la grande cada MAX_RECIENTES
+        self.vocabulario = []
+        self._recientes = []
+        self._bytes_palabras = 0
+        self._total = 0
+
+    def __len__(self):
+        return self.n
+
+    def agregar(self, registro):
+        """Indexa ``registro`` (diccionario columna -> valor) como la fila siguiente."""
+        posicion = self.n
+        for palabra in palabras(registro.get(columna) for columna in self.columnas):
+            lista = self.posiciones.get(palabra)
+            if lista is None:
+                lista = self.posiciones[palabra] = array("l")
+                bisect.insort(self._recientes, palabra)
+                self._bytes_palabras += sys.getsizeof(palabra) + sys.getsizeof(lista)
+            lista.append(posicion)
+            self._total += 1
+        if len(self._recientes) > MAX_RECIENTES:
+            self.vocabulario = list(heapq.merge(self.vocabulario, self._recientes))
+            self._recientes = []
+        self.n += 1
+
+    def _union(self, prefijo):
+        # Posiciones (ordenadas, sin repetir) de las palabras que empiezan con ``prefijo``
+        import numpy as np
+
+        listas = [self.posiciones[palabra]
+                  for palabra in _rango(self.vocabulario, prefijo) + _rango(self._recientes, prefijo)]
+        if len(listas) == 1:
+            return np.array(listas[0], dtype=np.intp)
+        if not listas:
+            return np.empty(0, dtype=np.intp)
+        # Una marca por fila: más barato que ordenar las posiciones concatenadas
+        marcas = np.zeros(self.n, dtype=bool)
+        for lista in listas:
+            marcas[np.array(lista, dtype=np.intp)] = True
+        return np.flatnonzero(marcas)
+
+    def buscar(self, consulta):
+        """
+        Posiciones (arreglo ordenado) de las filas que tienen, para cada
+        palabra de ``consulta``, alguna palabra que empieza así. None si la
+        consulta está vacía (sin filtro).
+        """
+        import numpy as np
+
+        terminos = palabras([consulta])
+        if not terminos:
+            return None
+        # Se intersecta empezando por el término con menos filas
+        uniones = sorted(map(self._union, terminos), key=len)
+        resultado = uniones[0]
+        for encontradas in uniones[1:]:
+            if not len(resultado):
+                break
+            # Ambas están ordenadas: se busca cada posición del resultado
+            i = np.minimum(np.searchsorted(encontradas, resultado), len(encontradas) - 1)
+            resultado = resultado[encontradas[i] == resultado] if len(encontradas) else encontradas
+        return resultado
+
+    @property
+    def nbytes(self):
+        """Memoria aproximada del índice (para el registro de sesiones)."""
+        return (sys.getsizeof(self.posiciones) + sys.getsizeof(self.vocabulario) + sys.getsizeof(self._recientes)
+                + self._bytes_palabras + self._total * array("l").itemsize)
@@ -0,0 +1,104 @@
+"""
+Detección de respuestas duplicadas.
+
+Dos verificaciones, ambas con índices hash (O(1) por respuesta):
+
+- token de idempotencia: cada envío del formulario lleva un token que se
+  genera al dibujarlo y se renueva después de guardar. Un reintento del mismo
+  envío trae el mismo token y el almacén devuelve la fila ya guardada en
+  lugar de agregar otra.
+- huella del encuestado: hash de los campos que lo identifican (``huella``
+  en el esquema; por ejemplo nombre, apellido, edad y contacto) normalizados:
+  sin tildes, en minúsculas, con los espacios colapsados y los números
+  enteros sin decimales. Una huella repetida es la misma persona respondiendo
+  de nuevo (un doble toque en "Guardar", una carga repetida). En ``app0.py``
+  la huella cubre todos los campos y dos mediciones iguales pueden ser
+  legítimas: ahí una huella repetida pide confirmación en lugar de rechazarse.
+"""
+import hashlib
+import re
+import sys
+import unicodedata
+
+_ESPACIOS = re.compile(r"\s+")
+
+
+def normalizar(valor):
+    """Forma canónica de un valor para comparar respuestas."""
+    if valor is None:
+        return ""
+    if isinstance(valor, bool):
+        return "si" if valor else "no"
+    texto = unicodedata.normalize("NFKD", str(valor))
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    texto = _ESPACIOS.sub(" ", texto).strip().casefold()
+    try:
+        numero = float(texto)
+    except ValueError:
+        return texto
+    # 25, 25.0 y "25" son la misma edad (el almacén y los CSV no conservan el tipo)
+    return str(int(numero)) if numero.is_integer() else texto
+
+
+def huella(registro, columnas):
+    """
+    Hash de las ``columnas`` normalizadas de ``registro``, o None si no hay
+    ningún dato que identifique (solo vacíos y números, como un formulario
+    con los valores por defecto).
+    """
+    partes = [normalizar(registro.get(columna)) for columna in columnas]
+    if not any(parte and not _es_numero(parte) for parte in partes):
+        return None
+    return hashlib.blake2b("\x1f".join(partes).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _es_numero(texto):
+    try:
+        float(texto)
+    except ValueError:
+        return False
+    return True
+
+
+def aviso(motivo, ficha):
+    """Mensaje para el encuestador cuando se rechaza un envío repetido."""
+    if motivo == "token":
+        return f"Esta respuesta ya estaba guardada (ficha N° {ficha}); no se guardó de nuevo."
+    return (f"Ya hay una respuesta de esta persona (ficha N° {ficha}); no se guardó de nuevo. "
+            "Revise nombre, apellido, edad y contacto.")
+
+
+class IndiceDuplicados:
+    """Índices hash de tokens y huellas en memoria (sesiones sin almacén)."""
+
+    def __init__(self):
+        self.tokens = {}
+        self.huellas = {}
+        self._bytes_claves = 0
+
+    def buscar(self, token=None, huella=None):
+        """``("token", ref)`` o ``("huella", ref)`` de la respuesta previa, o None."""
+        if token is not None and token in self.tokens:
+            return "token", self.tokens[token]
+        if huella is not None and huella in self.huellas:
+            return "huella", self.huellas[huella]
+        return None
+
+    def agregar(self, ref, token=None, huella=None):
+        if token is not None and token not in self.tokens:
+            self.tokens[token] = ref
+            self._bytes_claves += sys.getsizeof(token) + sys.getsizeof(ref)
+        if huella is not None and huella not in self.huellas:
+            self.huellas[huella] = ref
+            self._bytes_claves += sys.getsizeof(huella) + sys.getsizeof(ref)
+
+    @property
+    def nbytes(self):
+        """Memoria aproximada de los índices (para el registro de sesiones)."""
+        return sys.getsizeof(self.tokens) + sys.getsizeof(self.huellas) + self._bytes_claves
+
+    def clear(self):
+        self.tokens.clear()
+        self.huellas.clear()
+        self._bytes_claves = 0
+
@@ -0,0 +1,364 @@
+"""
+Cuestionarios declarativos.
+
+Cada estudio se describe en un archivo JSON de ``esquemas/`` (preguntas,
+opciones, campos condicionales y nombres de las columnas exportadas), de modo
+que un estudio nuevo se publica sin tocar el código de las apps.
+
+``cargar_esquema()`` compila el archivo una sola vez por proceso en un
+``Esquema`` con todo precalculado:
+
+- el dibujo de cada sección (widget de Streamlit y argumentos ya armados);
+- las claves de widgets de cada sección, para reiniciar el formulario;
+- el armado del registro (lista de extractores columna -> valor);
+- los tipos de columnas (``"float64"`` o ``"texto"``; las columnas previas
+  pueden declarar cualquier tipo de ``BufferColumnar``)
+  y la validación de campos obligatorios y opciones.
+
+Formato del archivo::
+
+    {
+      "nombre": "...",
+      "columnas_previas": {"Ficha N°": "int64", "Fecha": "texto"},
+      "secciones": [
+        {"id": "encuesta", "pestana": "encuesta", "titulo": "Encuesta", "nota": "...",
+         "elementos": [
+           {"tipo": "opcion", "clave": "volveria", "etiqueta": "...", "opciones": ["Sí", "No"],
+            "por_defecto": 1, "horizontal": true, "columna": "P5_Volvería a participar"},
+           {"tipo": "texto", "clave": "contacto", "etiqueta": "...",
+            "si": {"clave": "volveria", "igual": "Sí"}, "columna": "P5_Contacto"},
+           ...
+         ]}
+      ]
+    }
+
+``huella`` (opcional) es la lista de claves de las preguntas que identifican
+al encuestado; su hash normalizado detecta respuestas repetidas (ver
+``duplicados.py``)::
+
+    "huella": ["nombre", "apellido", "edad", "contacto"]
+
+``busqueda`` (opcional) lista las claves de las preguntas que indexa el
+buscador de la pestaña de datos, además del número de ficha (ver
+``busqueda.py``)::
+
+    "busqueda": ["nombre", "apellido", "contacto", "marca_otros_text"]
+
+Las preguntas de texto libre pueden declarar ``"normalizar": "frecuencia"``
+o ``"cantidad"``: el registro lleva además columnas numéricas derivadas (ver
+``normalizacion.py``).
+
+El bloque opcional ``analitica`` declara, por clave de pregunta, las tablas
+de la pestaña de análisis (ver ``analitica.py``)::
+
+    "analitica": {
+      "aceptacion": ["conoce", "ha_probado"],
+      "por": [{"clave": "genero"}, {"clave": "edad", "cortes": [18, 30, 45, 60]}],
+      "coocurrencia": ["sim_mayonesa", "sim_aioli"],
+      "participacion": "marca"
+    }
+
+Tipos de pregunta: ``texto``, ``numero``, ``opcion`` (radio), ``lista``
+(selectbox) y ``casilla`` (checkbox, se exporta como "Sí"/"No"). Tipos de
+presentación: ``markdown``, ``subtitulo`` y ``columnas`` (lista de columnas,
+cada una con sus propios elementos). Las preguntas sin ``columna`` se muestran
+pero no se guardan; las condicionales (``si``) solo se muestran si se cumple la
+condición y, si no, se exportan vacías.
+
+Cada app usa su esquema por defecto; ``KEPCHUP_ESQUEMA`` permite desplegarla
+con otro estudio.
+"""
+import functools
+import json
+import os
+
+import duplicados
+import normalizacion
+
+CARPETA_POR_DEFECTO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "esquemas")
+
+# tipo de pregunta -> (función de Streamlit, tipo de la columna exportada)
+PREGUNTAS = {
+    "texto": ("text_input", "texto"),
+    "numero": ("number_input", "float64"),
+    "opcion": ("radio", "texto"),
+    "lista": ("selectbox", "texto"),
+    "casilla": ("checkbox", "texto"),
+}
+
+# Argumentos del esquema -> argumentos de los widgets
+_ARGUMENTOS = {"minimo": "min_value", "maximo": "max_value", "paso": "step", "valor": "value",
+               "horizontal": "horizontal"}
+
+
+class Elemento:
+    """Un elemento compilado: qué dibujar y con qué argumentos."""
+
+    __slots__ = ("funcion", "args", "kwargs", "enunciado", "condicion", "clave", "columnas")
+
+    def __init__(self, funcion, args=(), kwargs=None, enunciado=None, condicion=None, clave=None,
+                 columnas=None):
+        self.funcion = funcion
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.enunciado = enunciado
+        self.condicion = condicion
+        self.clave = clave
+        self.columnas = columnas
+
+
+class Seccion:
+    def __init__(self, id, titulo, pestana, nota, elementos, claves):
+        self.id = id
+        self.titulo = titulo
+        self.pestana = pestana
+        self.nota = nota
+        self.elementos = elementos
+        self.claves = claves
+
+
+class Esquema:
+    """Cuestionario compilado (se construye con ``cargar_esquema``)."""
+
+    def __init__(self, definicion):
+        self.nombre = definicion.get("nombre", "")
+        self.tipos_columnas = dict(definicion.get("columnas_previas", {}))
+        self.columnas_previas = list(self.tipos_columnas)
+        self.secciones = {}
+        self.categoricas = []
+        self.preguntas = {}  # clave -> definición (tal como está en el archivo)
+        self._extractores = []
+        self._obligatorias = []
+        self._opciones = []
+        self.normalizadas = []  # (columna, tipo de normalización, columnas derivadas)
+        for seccion in definicion["secciones"]:
+            if seccion["id"] in self.secciones:
+                raise ValueError(f"Sección repetida: {seccion['id']!r}")
+            claves = []
+            elementos = self._compilar(seccion["elementos"], claves)
+            self.secciones[seccion["id"]] = Seccion(
+                seccion["id"], seccion.get("titulo", ""), seccion.get("pestana", seccion.get("titulo", "")),
+                seccion.get("nota"), elementos, tuple(claves)
+            )
+        self.columnas = list(self.tipos_columnas)
+        self.numericas = [c for c, t in self.tipos_columnas.items() if t == "float64"
+                          and c not in self.columnas_previas]
+        self.analitica = self._compilar_analitica(definicion.get("analitica"))
+        self.columnas_huella = [self._columna(clave, "La huella") for clave in definicion.get("huella", ())]
+        self.columnas_busqueda = [c for c in ("Ficha N°",) if c in self.columnas_previas] + [
+            self._columna(clave, "La búsqueda") for clave in definicion.get("busqueda", ())]
+
+    # ---- Compilación ----
+    def _compilar(self, elementos, claves):
+        compilados = []
+        for elemento in elementos:
+            tipo = elemento.get("tipo")
+            if tipo == "columnas":
+                compilados.append(Elemento(
+                    None, columnas=[self._compilar(columna, claves) for columna in elemento["columnas"]]
+                ))
+            elif tipo == "markdown":
+                compilados.append(Elemento("markdown", (elemento["texto"],)))
+            elif tipo == "subtitulo":
+                compilados.append(Elemento("subheader", (elemento["texto"],)))
+            elif tipo in PREGUNTAS:
+                compilados.append(self._compilar_pregunta(elemento, claves))
+            else:
+                raise ValueError(f"Tipo de elemento desconocido: {tipo!r}")
+        return compilados
+
+    def _compilar_pregunta(self, pregunta, claves):
+        tipo = pregunta["tipo"]
+        clave = pregunta["clave"]
+        if clave in self.preguntas:
+            raise ValueError(f"Clave de pregunta repetida: {clave!r}")
+        condicion = None
+        if "si" in pregunta:
+            condicion = (pregunta["si"]["clave"], pregunta["si"]["igual"])
+            if condicion[0] not in self.preguntas:
+                raise ValueError(f"La condición de {clave!r} usa una pregunta anterior inexistente: "
+                                 f"{condicion[0]!r}")
+        self.preguntas[clave] = pregunta
+        claves.append(clave)
+
+        funcion, tipo_columna = PREGUNTAS[tipo]
+        kwargs = {_ARGUMENTOS[k]: v for k, v in pregunta.items() if k in _ARGUMENTOS}
+        kwargs["key"] = clave
+        if pregunta.get("etiqueta_oculta"):
+            kwargs["label_visibility"] = "collapsed"
+        opciones = pregunta.get("opciones")
+        if tipo in ("opcion", "lista"):
+            if not opciones:
+                raise ValueError(f"La pregunta {clave!r} necesita opciones")
+            kwargs["options"] = opciones
+            if "por_defecto" in pregunta:
+                if not 0 <= pregunta["por_defecto"] < len(opciones):
+                    raise ValueError(f"Opción por defecto fuera de rango en {clave!r}")
+                kwargs["index"] = pregunta["por_defecto"]
+
+        columna = pregunta.get("columna")
+        if columna is not None:
+            if columna in self.tipos_columnas:
+                raise ValueError(f"Columna repetida: {columna!r}")
+            self.tipos_columnas[columna] = tipo_columna
+            if tipo == "lista":
+                self.categoricas.append(columna)
+            self._extractores.append((columna, _extractor(tipo, clave, condicion)))
+            if "normalizar" in pregunta:
+                self._compilar_normalizacion(pregunta, columna)
+        if pregunta.get("obligatoria"):
+            self._obligatorias.append((clave, pregunta["etiqueta"], condicion))
+        if opciones and tipo in ("opcion", "lista"):
+            self._opciones.append((clave, frozenset(opciones)))
+
+        return Elemento(funcion, (pregunta["etiqueta"],), kwargs, pregunta.get("enunciado"),
+                        condicion, clave)
+
+    def _compilar_normalizacion(self, pregunta, columna):
+        # Columnas derivadas, a continuación de la columna con el texto libre
+        tipo = pregunta["normalizar"]
+        if tipo not in normalizacion.DERIVADAS or pregunta["tipo"] != "texto":
+            raise ValueError(f"Normalización no soportada en {pregunta['clave']!r}: {tipo!r}")
+        derivadas = []
+        for sufijo, tipo_columna in normalizacion.DERIVADAS[tipo]:
+            derivada = columna + sufijo
+            if derivada in self.tipos_columnas:
+                raise ValueError(f"Columna repetida: {derivada!r}")
+            self.tipos_columnas[derivada] = tipo_columna
+            derivadas.append(derivada)
+        self.normalizadas.append((columna, tipo, tuple(derivadas)))
+
+    def _columna(self, clave, uso="El análisis"):
+        pregunta = self.preguntas.get(clave)
+        if pregunta is None or "columna" not in pregunta:
+            raise ValueError(f"{uso} usa una pregunta inexistente o que no se guarda: {clave!r}")
+        return pregunta["columna"]
+
+    def _compilar_analitica(self, analitica):
+        # Claves de preguntas -> columnas guardadas, y grupos en orden de las opciones
+        if analitica is None:
+            return None
+        por = []
+        for grupo in analitica.get("por", ()):
+            columna = self._columna(grupo["clave"])
+            cortes = grupo.get("cortes")
+            if cortes is not None:
+                if list(cortes) != sorted(cortes):
+                    raise ValueError(f"Los cortes de {grupo['clave']!r} deben ser crecientes")
+                etiquetas = ([f"< {cortes[0]}"] + [f"{a}–{b - 1}" for a, b in zip(cortes, cortes[1:])]
+                             + [f"{cortes[-1]}+"])
+            else:
+                etiquetas = list(self.preguntas[grupo["clave"]].get("opciones", ()))
+            por.append((columna, tuple(cortes) if cortes is not None else None, etiquetas))
+        participacion = analitica.get("participacion")
+        compilada = {
+            "aceptacion": [self._columna(clave) for clave in analitica.get("aceptacion", ())],
+            "por": por,
+            "coocurrencia": [self._columna(clave) for clave in analitica.get("coocurrencia", ())],
+            "participacion": self._columna(participacion) if participacion else None,
+            "opciones_participacion": list(self.preguntas[participacion].get("opciones", ()))
+            if participacion else [],
+        }
+        compilada["columnas"] = frozenset(
+            compilada["aceptacion"] + [columna for columna, _, _ in por] + compilada["coocurrencia"]
+            + ([compilada["participacion"]] if participacion else [])
+        )
+        return compilada
+
+    # ---- Uso desde las apps ----
+    def renderizar(self, seccion):
+        """Dibuja los widgets de una sección (el encabezado lo pone la app)."""
+        import streamlit as st
+
+        _dibujar(st, self.secciones[seccion].elementos)
+
+    def reiniciar(self, estado, seccion):
+        """Borra del estado las claves de la sección para volver a los valores por defecto."""
+        for clave in self.secciones[seccion].claves:
+            if clave in estado:
+                del estado[clave]
+
+    def registro(self, valores, *previos):
+        """
+        Registro listo para guardar: ``previos`` completa ``columnas_previas``
+        (en orden) y el resto sale de ``valores`` (por ejemplo ``st.session_state``).
+        """
+        registro = dict(zip(self.columnas_previas, previos))
+        for columna, extraer in self._extractores:
+            registro[columna] = extraer(valores)
+        for columna, tipo, derivadas in self.normalizadas:
+            registro.update(zip(derivadas, normalizacion.INTERPRETES[tipo](registro[columna])))
+        return registro
+
+    def huella(self, registro):
+        """Huella del encuestado de un registro (None si el esquema no la define o no hay datos)."""
+        if not self.columnas_huella:
+            return None
+        return duplicados.huella(registro, self.columnas_huella)
+
+    def validar(self, valores):
+        """Lista de problemas (vacía si las respuestas son válidas)."""
+        errores = []
+        for clave, etiqueta, condicion in self._obligatorias:
+            if condicion is not None and valores.get(condicion[0]) != condicion[1]:
+                continue
+            valor = valores.get(clave)
+            if valor is None or valor == "":
+                errores.append(f"Falta completar: {etiqueta}")
+        for clave, opciones in self._opciones:
+            if clave in valores and valores[clave] not in opciones:
+                errores.append(f"Valor no permitido para {clave!r}: {valores[clave]!r}")
+        return errores
+
+
+def _extractor(tipo, clave, condicion):
+    if tipo == "casilla":
+        def extraer(valores):
+            return "Sí" if valores[clave] else "No"
+    else:
+        def extraer(valores):
+            return valores[clave]
+    if condicion is None:
+        return extraer
+    clave_condicion, igual = condicion
+
+    def extraer_condicional(valores):
+        # El campo solo existe mientras se cumple la condición
+        if valores.get(clave_condicion) != igual:
+            return ""
+        return valores.get(clave, "")
+    return extraer_condicional
+
+
+def _dibujar(st, elementos):
+    estado = st.session_state
+    for elemento in elementos:
+        if elemento.columnas is not None:
+            for columna, hijos in zip(st.columns(len(elemento.columnas)), elemento.columnas):
+                with columna:
+                    _dibujar(st, hijos)
+            continue
+        if elemento.condicion is not None and estado.get(elemento.condicion[0]) != elemento.condicion[1]:
+            # Se elimina la clave para evitar valores residuales
+            if elemento.clave in estado:
+                del estado[elemento.clave]
+            continue
+        if elemento.enunciado:
+            st.markdown(elemento.enunciado)
+        getattr(st, elemento.funcion)(*elemento.args, **elemento.kwargs)
+
+
+@functools.lru_cache(maxsize=None)
+def cargar_esquema(nombre):
+    """
+    Compila (una vez por proceso) el esquema ``nombre``.
+
+    ``nombre`` es una ruta a un archivo JSON o el nombre de un archivo de la
+    carpeta indicada por ``KEPCHUP_ESQUEMAS`` (por defecto ``esquemas/``).
+    """
+    ruta = nombre
+    if not os.path.exists(ruta):
+        carpeta = os.environ.get("KEPCHUP_ESQUEMAS", CARPETA_POR_DEFECTO)
+        ruta = os.path.join(carpeta, nombre if nombre.endswith(".json") else nombre + ".json")
+    with open(ruta, encoding="utf-8") as f:
+        return Esquema(json.load(f))
@@ -0,0 +1,198 @@
+"""
+Estadísticas descriptivas incrementales y combinables.
+
+Reemplazan a ``DataFrame.describe()`` sobre columnas numéricas: cada valor
+nuevo actualiza el acumulador en O(1) amortizado y el resumen se obtiene en
+tiempo constante respecto del número de filas.
+
+- Media y varianza: algoritmo de Welford (combinación de Chan et al.).
+- Mínimo y máximo: corridos.
+- Cuartiles: t-digest "merging" con función de escala k1. Es exacto mientras
+  hay pocos valores y se mantiene acotado (``compresion`` centroides) después.
+  En columnas discretas (muchos empates) interpola entre valores repetidos y
+  se aleja de pandas (la mediana de enteros puede dar 4.5 en lugar de 4): si
+  quien llama tiene los valores a mano (por ejemplo, en el buffer columnar
+  de la app) y son pocos (hasta ``EXACTO_HASTA``), los cuartiles se calculan
+  exactos con NumPy, igual que ``describe()``. Con más valores se usa el
+  digest, para que el resumen no vuelva a costar O(n) en cada dibujo; su
+  precisión contra pandas se mide en ``bench/bench_estadisticas.py``.
+
+Los acumuladores se pueden combinar, por ejemplo para unir sesiones o shards.
+"""
+import math
+
+CUANTILES = (0.25, 0.5, 0.75)
+EXACTO_HASTA = 5_000  # valores por columna con los que se calculan cuartiles exactos (~0.1 ms)
+
+
+class TDigest:
+    """Resumen de cuantiles aproximado de tamaño acotado."""
+
+    def __init__(self, compresion=100):
+        self.compresion = compresion
+        self.n = 0
+        self._medias = []
+        self._pesos = []
+        self._pendientes = []
+
+    def agregar(self, x, peso=1):
+        self._pendientes.append((x, peso))
+        self.n += peso
+        if len(self._pendientes) >= 5 * self.compresion:
+            self._comprimir()
+
+    def combinar(self, otro):
+        otro._comprimir()
+        self._pendientes.extend(zip(otro._medias, otro._pesos))
+        self.n += otro.n
+        self._comprimir()
+
+    def cuantil(self, q):
+        """Cuantil ``q`` con interpolación lineal, como ``pandas.Series.quantile``."""
+        self._comprimir()
+        if not self._medias:
+            return math.nan
+        # Cada centroide representa el punto medio de su peso acumulado; con
+        # centroides de peso 1 esto coincide exactamente con pandas.
+        objetivo = q * (self.n - 1) + 0.5
+        acumulado = 0.0
+        anterior_centro = anterior_media = None
+        for media, peso in zip(self._medias, self._pesos):
+            centro = acumulado + peso / 2
+            if objetivo <= centro:
+                if anterior_centro is None:
+                    return media
+                t = (objetivo - anterior_centro) / (centro - anterior_centro)
+                return anterior_media + t * (media - anterior_media)
+            anterior_centro, anterior_media = centro, media
+            acumulado += peso
+        return self._medias[-1]
+
+    def _k(self, q):
+        return self.compresion / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _comprimir(self):
+        if not self._pendientes:
+            return
+        puntos = sorted(list(zip(self._medias, self._pesos)) + self._pendientes)
+        self._pendientes = []
+        medias, pesos = [], []
+        acumulado = 0.0
+        media_actual, peso_actual = puntos[0]
+        k_inicio = self._k(0.0)
+        for media, peso in puntos[1:]:
+            q_fin = (acumulado + peso_actual + peso) / self.n
+            if self._k(min(q_fin, 1.0)) - k_inicio <= 1:
+                peso_actual += peso
+                media_actual += (media - media_actual) * peso / peso_actual
+            else:
+                medias.append(media_actual)
+                pesos.append(peso_actual)
+                acumulado += peso_actual
+                k_inicio = self._k(acumulado / self.n)
+                media_actual, peso_actual = media, peso
+        medias.append(media_actual)
+        pesos.append(peso_actual)
+        self._medias, self._pesos = medias, pesos
+
+
+class EstadisticaIncremental:
+    """count/mean/std/min/cuartiles/max de una variable numérica."""
+
+    def __init__(self, compresion=100):
+        self.n = 0
+        self.media = 0.0
+        self._m2 = 0.0
+        self.minimo = math.inf
+        self.maximo = -math.inf
+        self.digest = TDigest(compresion)
+
+    def agregar(self, x):
+        x = float(x)
+        if math.isnan(x):
+            return
+        self.n += 1
+        delta = x - self.media
+        self.media += delta / self.n
+        self._m2 += delta * (x - self.media)
+        self.minimo = min(self.minimo, x)
+        self.maximo = max(self.maximo, x)
+        self.digest.agregar(x)
+
+    def combinar(self, otra):
+        if otra.n == 0:
+            return
+        n = self.n + otra.n
+        delta = otra.media - self.media
+        self._m2 += otra._m2 + delta * delta * self.n * otra.n / n
+        self.media += delta * otra.n / n
+        self.n = n
+        self.minimo = min(self.minimo, otra.minimo)
+        self.maximo = max(self.maximo, otra.maximo)
+        self.digest.combinar(otra.digest)
+
+    @property
+    def varianza(self):
+        # Muestral (ddof=1), igual que pandas
+        return self._m2 / (self.n - 1) if self.n > 1 else math.nan
+
+    def resumen(self, valores=None):
+        """
+        ``valores`` (opcional): arreglo con todos los valores agregados; si
+        coincide con el acumulador y no supera ``EXACTO_HASTA``, los cuartiles
+        salen exactos de ahí en lugar del digest.
+        """
+        if self.n == 0:
+            return {"count": 0.0, "mean": math.nan, "std": math.nan, "min": math.nan,
+                    "25%": math.nan, "50%": math.nan, "75%": math.nan, "max": math.nan}
+        cuartiles = None
+        if valores is not None and self.n <= EXACTO_HASTA:
+            import numpy as np
+
+            valores = np.asarray(valores, dtype=np.float64)
+            valores = valores[~np.isnan(valores)]
+            if len(valores) == self.n:  # si no, el buffer no es el que alimentó al acumulador
+                cuartiles = np.quantile(valores, CUANTILES).tolist()
+        if cuartiles is None:
+            cuartiles = [self.digest.cuantil(q) for q in CUANTILES]
+        return {
+            "count": float(self.n),
+            "mean": self.media,
+            "std": math.sqrt(self.varianza),
+            "min": self.minimo,
+            "25%": cuartiles[0],
+            "50%": cuartiles[1],
+            "75%": cuartiles[2],
+            "max": self.maximo,
+        }
+
+
+class EstadisticasColumnas:
+    """Un acumulador por columna, alimentado con registros completos."""
+
+    def __init__(self, columnas, compresion=100):
+        self.columnas = list(columnas)
+        self.compresion = compresion
+        self.por_columna = {c: EstadisticaIncremental(compresion) for c in self.columnas}
+
+    def agregar(self, registro):
+        for columna, estadistica in self.por_columna.items():
+            estadistica.agregar(registro[columna])
+
+    def combinar(self, otras):
+        for columna, estadistica in self.por_columna.items():
+            estadistica.combinar(otras.por_columna[columna])
+
+    def clear(self):
+        self.__init__(self.columnas, self.compresion)
+
+    def describe(self, valores=None):
+        """
+        DataFrame con el mismo formato que ``DataFrame.describe()``.
+        ``valores`` (opcional) devuelve el arreglo de una columna, para
+        cuartiles exactos (ver ``EstadisticaIncremental.resumen``).
+        """
+        import pandas as pd
+
+        return pd.DataFrame({c: e.resumen(None if valores is None else valores(c))
+                             for c, e in self.por_columna.items()})
@@ -0,0 +1,155 @@
+"""
+Exportaciones en segundo plano.
+
+Generar un XLSX grande dentro del rerun congela la app. ``ColaExportaciones``
+las ejecuta en un pool de hilos acotado: ``encolar()`` vuelve enseguida con
+un ``Trabajo`` cuyo avance (filas escritas sobre el total) la interfaz
+consulta periódicamente, y el archivo queda en una carpeta de spool
+(``KEPCHUP_EXPORTACIONES``, por defecto ``datos/exportaciones``).
+
+El archivo se escribe con sufijo ``.parcial`` y se renombra (``os.replace``,
+atómico) recién después de cerrarlo y sincronizarlo a disco: un trabajo
+``listo`` siempre tiene su archivo completo, de modo que la app puede
+descartar los datos de la sesión sin riesgo. La cola está acotada (con más
+de ``max_pendientes`` trabajos en cola o en curso ``encolar`` lanza
+``ColaLlena``) y los archivos de más de ``vida`` segundos se borran al
+encolar y al crear la cola (incluidos los parciales de un proceso caído).
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+CARPETA_POR_DEFECTO = os.path.join("datos", "exportaciones")
+
+EN_COLA, EN_CURSO, LISTO, ERROR = "en cola", "en curso", "listo", "error"
+
+
+class ColaLlena(RuntimeError):
+    """Hay demasiadas exportaciones pendientes."""
+
+
+class Trabajo:
+    """Estado de una exportación (lo actualiza el hilo que la ejecuta)."""
+
+    __slots__ = ("clave", "estado", "filas", "total", "ruta", "error", "terminado", "_hecho")
+
+    def __init__(self, clave, total, ruta):
+        self.clave = clave
+        self.estado = EN_COLA
+        self.filas = 0
+        self.total = total
+        self.ruta = ruta
+        self.error = None
+        self.terminado = None
+        self._hecho = threading.Event()
+
+    @property
+    def pendiente(self):
+        return self.estado in (EN_COLA, EN_CURSO)
+
+    @property
+    def avance(self):
+        """Fracción entre 0 y 1 (no llega a 1 hasta que el archivo está confirmado)."""
+        if self.estado == LISTO:
+            return 1.0
+        return min(self.filas / self.total, 0.99) if self.total else 0.0
+
+    def esperar(self, timeout=None):
+        """Bloquea hasta que el trabajo termine; devuelve si terminó."""
+        return self._hecho.wait(timeout)
+
+
+class ColaExportaciones:
+    """Pool acotado de exportaciones con archivos en una carpeta de spool (uno por proceso)."""
+
+    def __init__(self, carpeta=None, max_trabajadores=2, max_pendientes=8, vida=3600.0):
+        self.carpeta = carpeta or os.environ.get("KEPCHUP_EXPORTACIONES", CARPETA_POR_DEFECTO)
+        os.makedirs(self.carpeta, exist_ok=True)
+        self.max_pendientes = max_pendientes
+        self.vida = vida
+        self._lock = threading.Lock()
+        self._trabajos = {}  # clave -> Trabajo
+        self._pendientes = 0
+        self._pool = ThreadPoolExecutor(max_trabajadores, thread_name_prefix="exportacion")
+        self.recolectar()
+
+    def buscar(self, clave):
+        """Trabajo de ``clave`` (None si no hay, o si su archivo ya se borró)."""
+        with self._lock:
+            trabajo = self._trabajos.get(clave)
+            if trabajo is not None and trabajo.estado == LISTO and not os.path.exists(trabajo.ruta):
+                del self._trabajos[clave]
+                return None
+            return trabajo
+
+    def encolar(self, clave, escribir, total=0, sufijo=""):
+        """
+        Encola ``escribir(ruta, progreso)``, que debe escribir el archivo en
+        ``ruta`` pasando sus filas por ``progreso`` (un generador que las
+        cuenta). Si ya hay un trabajo pendiente o listo para ``clave`` (por
+        ejemplo, la misma sesión en la misma versión de los datos) lo devuelve
+        en lugar de repetirlo.
+        """
+        self.recolectar()
+        with self._lock:
+            trabajo = self._trabajos.get(clave)
+            if trabajo is not None and (trabajo.pendiente or
+                                        (trabajo.estado == LISTO and os.path.exists(trabajo.ruta))):
+                return trabajo
+            if self._pendientes >= self.max_pendientes:
+                raise ColaLlena(f"Hay {self._pendientes} exportaciones pendientes")
+            trabajo = Trabajo(clave, total, os.path.join(self.carpeta, uuid.uuid4().hex + sufijo))
+            self._trabajos[clave] = trabajo
+            self._pendientes += 1
+        self._pool.submit(self._ejecutar, trabajo, escribir)
+        return trabajo
+
+    def _ejecutar(self, trabajo, escribir):
+        trabajo.estado = EN_CURSO
+        parcial = trabajo.ruta + ".parcial"
+        try:
+            escribir(parcial, partial(_contar, trabajo))
+            with open(parcial, "rb") as f:
+                os.fsync(f.fileno())
+            os.replace(parcial, trabajo.ruta)
+            trabajo.estado = LISTO
+        except Exception as error:
+            trabajo.error = str(error) or type(error).__name__
+            trabajo.estado = ERROR
+            if os.path.exists(parcial):
+                os.remove(parcial)
+        finally:
+            trabajo.terminado = time.time()
+            with self._lock:
+                self._pendientes -= 1
+            trabajo._hecho.set()
+
+    def recolectar(self):
+        """Borra los archivos de más de ``vida`` segundos y olvida sus trabajos."""
+        limite = time.time() - self.vida
+        with self._lock:
+            en_curso = {t.ruta + ".parcial" for t in self._trabajos.values() if t.pendiente}
+            for clave, trabajo in list(self._trabajos.items()):
+                if not trabajo.pendiente and trabajo.terminado < limite:
+                    del self._trabajos[clave]
+        for nombre in os.listdir(self.carpeta):
+            ruta = os.path.join(self.carpeta, nombre)
+            if ruta in en_curso:
+                continue
+            try:
+                if os.path.getmtime(ruta) < limite:
+                    os.remove(ruta)
+            except FileNotFoundError:
+                pass  # otro proceso que comparte la carpeta ya lo borró
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+
+def _contar(trabajo, filas):
+    for fila in filas:
+        trabajo.filas += 1
+        yield fila
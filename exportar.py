@@ -0,0 +1,222 @@
+"""
+Exportación por bloques, con memoria constante.
+
+Las filas (diccionarios) se leen del origen de a ``tam_bloque`` y se escriben
+directamente al archivo de destino, sin armar nunca el DataFrame completo ni
+una copia del archivo en memoria:
+
+- XLSX: xlsxwriter en modo ``constant_memory`` (una fila a la vez).
+- CSV y JSON Lines: escritura secuencial en texto.
+- Parquet: un row group por bloque con ``pyarrow.parquet.ParquetWriter``.
+  El esquema sale de ``tipos`` (columna -> "int64", "float64" o "texto"),
+  no del primer bloque: una columna vacía o entera al principio no lo fija.
+
+``exportar`` escribe a ``<ruta>.parcial`` y renombra al terminar: si la
+exportación falla no queda un archivo a medias con el nombre final.
+"""
+import csv
+import json
+import os
+import tempfile
+from itertools import islice
+
+TAM_BLOQUE = 1000
+
+MIME = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "jsonl": "application/jsonl",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def bloques(filas, tam_bloque=TAM_BLOQUE):
+    """Agrupa un iterable de filas en listas de a lo sumo ``tam_bloque``."""
+    filas = iter(filas)
+    while True:
+        bloque = list(islice(filas, tam_bloque))
+        if not bloque:
+            return
+        yield bloque
+
+
+def filas_de_frame(df, tam_bloque=TAM_BLOQUE):
+    """Recorre un DataFrame de a bloques, convirtiendo solo un bloque por vez."""
+    for inicio in range(0, len(df), tam_bloque):
+        yield from df.iloc[inicio:inicio + tam_bloque].to_dict("records")
+
+
+def _separar_columnas(filas, columnas):
+    # Si no se indican las columnas se toman de la primera fila.
+    filas = iter(filas)
+    if columnas is not None:
+        return list(columnas), filas
+    primera = next(filas, None)
+    if primera is None:
+        return [], iter(())
+    return list(primera), _encadenar(primera, filas)
+
+
+def _encadenar(primera, resto):
+    yield primera
+    yield from resto
+
+
+def exportar_xlsx(filas, ruta, columnas=None, nombre_hoja="Respuestas"):
+    import xlsxwriter
+
+    columnas, filas = _separar_columnas(filas, columnas)
+    libro = xlsxwriter.Workbook(ruta, {"constant_memory": True, "nan_inf_to_errors": True})
+    try:
+        hoja = libro.add_worksheet(nombre_hoja)
+        hoja.write_row(0, 0, columnas)
+        for i, fila in enumerate(filas, start=1):
+            hoja.write_row(i, 0, [fila.get(c) for c in columnas])
+    finally:
+        libro.close()
+
+
+def exportar_csv(filas, ruta, columnas=None, tam_bloque=TAM_BLOQUE):
+    columnas, filas = _separar_columnas(filas, columnas)
+    with open(ruta, "w", newline="", encoding="utf-8") as f:
+        escritor = csv.DictWriter(f, fieldnames=columnas, restval="", extrasaction="ignore")
+        escritor.writeheader()
+        for bloque in bloques(filas, tam_bloque):
+            escritor.writerows(bloque)
+
+
+def exportar_jsonl(filas, ruta, columnas=None, tam_bloque=TAM_BLOQUE):
+    with open(ruta, "w", encoding="utf-8") as f:
+        for bloque in bloques(filas, tam_bloque):
+            if columnas is not None:
+                bloque = [{c: fila.get(c) for c in columnas} for fila in bloque]
+            f.writelines(json.dumps(fila, ensure_ascii=False, default=str) + "\n" for fila in bloque)
+
+
+def tipos_de_frame(df):
+    """Tipos de exportación (columna -> "int64", "float64" o "texto") de un DataFrame."""
+    return {columna: {"i": "int64", "u": "int64", "f": "float64"}.get(tipo.kind, "texto")
+            for columna, tipo in df.dtypes.items()}
+
+
+def tipos_de_arrow(esquema):
+    """Tipos de exportación de un esquema de pyarrow."""
+    import pyarrow as pa
+
+    def tipo(t):
+        if pa.types.is_integer(t):
+            return "int64"
+        return "float64" if pa.types.is_floating(t) or pa.types.is_decimal(t) else "texto"
+
+    return {campo.name: tipo(campo.type) for campo in esquema}
+
+
+def _nulo(valor):
+    try:
+        return valor is None or bool(valor != valor)  # None o NaN
+    except TypeError:
+        return True  # pd.NA
+
+
+def _convertir(valor, tipo):
+    # Conversión de una celda que no encaja en el tipo de su columna
+    if _nulo(valor):
+        return None
+    if tipo == "texto":
+        return str(valor)
+    try:
+        numero = float(valor)
+    except (TypeError, ValueError):
+        return None
+    if tipo == "int64":
+        return int(numero) if numero.is_integer() else None
+    return numero
+
+
+def exportar_parquet(filas, ruta, columnas=None, tam_bloque=TAM_BLOQUE, tipos=None):
+    """
+    ``tipos`` (columna -> "int64", "float64" o "texto") fija el esquema; las
+    columnas sin tipo se escriben como texto, que admite cualquier valor. Las
+    celdas que no encajan en el tipo de su columna se convierten (texto) o
+    quedan vacías (números inválidos).
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    tipos = dict(tipos or {})
+    if columnas is None and tipos:
+        columnas = list(tipos)
+    columnas, filas = _separar_columnas(filas, columnas)
+    tipos = {c: tipos.get(c, "texto") for c in columnas}
+    tipos_arrow = {"int64": pa.int64(), "float64": pa.float64(), "texto": pa.string()}
+    esquema = pa.schema([(c, tipos_arrow[t]) for c, t in tipos.items()])
+    with pq.ParquetWriter(ruta, esquema) as escritor:
+        for bloque in bloques(filas, tam_bloque):
+            arreglos = []
+            for columna, tipo in tipos.items():
+                valores = [fila.get(columna) for fila in bloque]
+                try:
+                    arreglos.append(pa.array(valores, tipos_arrow[tipo], from_pandas=True))
+                except (pa.ArrowInvalid, pa.ArrowTypeError):
+                    arreglos.append(pa.array([_convertir(v, tipo) for v in valores], tipos_arrow[tipo]))
+            escritor.write_table(pa.Table.from_arrays(arreglos, schema=esquema))
+
+
+EXPORTADORES = {
+    "xlsx": exportar_xlsx,
+    "csv": exportar_csv,
+    "jsonl": exportar_jsonl,
+    "parquet": exportar_parquet,
+}
+
+
+def exportar(filas, ruta, formato, columnas=None, tipos=None):
+    """
+    Escribe ``filas`` en ``ruta`` con el formato indicado. ``tipos`` (ver
+    ``exportar_parquet``) solo lo usa Parquet.
+    """
+    try:
+        exportador = EXPORTADORES[formato]
+    except KeyError:
+        raise ValueError(f"Formato de exportación desconocido: {formato}") from None
+    extra = {"tipos": tipos} if formato == "parquet" else {}
+    parcial = ruta + ".parcial"
+    try:
+        exportador(filas, parcial, columnas=columnas, **extra)
+        os.replace(parcial, ruta)
+    except BaseException:
+        if os.path.exists(parcial):
+            os.remove(parcial)
+        raise
+    return ruta
+
+
+def exportar_temporal(filas, formato, columnas=None, carpeta=None, tipos=None):
+    """Exporta a un archivo temporal nuevo y devuelve su ruta."""
+    fd, ruta = tempfile.mkstemp(prefix="exportacion_", suffix="." + formato, dir=carpeta)
+    os.close(fd)
+    try:
+        return exportar(filas, ruta, formato, columnas=columnas, tipos=tipos)
+    except BaseException:
+        os.remove(ruta)
+        raise
+
+
+def contenido(filas, formato, columnas=None, tipos=None):
+    """
+    Exporta a un temporal y devuelve sus bytes, para ``st.download_button``.
+
+    La generación es por bloques; solo el resultado final (que Streamlit
+    necesita para servir la descarga) pasa por memoria.
+    """
+    ruta = exportar_temporal(filas, formato, columnas=columnas, tipos=tipos)
+    try:
+        with open(ruta, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(ruta)
+
+
+def contenido_frame(df, formato, tipos=None):
+    """Como ``contenido``, recorriendo el DataFrame de a bloques (tipos de Parquet: los del DataFrame)."""
+    return contenido(filas_de_frame(df), formato, columnas=list(df.columns), tipos=tipos or tipos_de_frame(df))
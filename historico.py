@@ -0,0 +1,397 @@
+"""
+Archivo histórico de respuestas en Parquet, particionado por estudio y fecha.
+
+Las exportaciones de las apps son archivos sueltos con fecha en el nombre:
+una consulta histórica tiene que leerlos todos. El archivo histórico guarda
+las respuestas del almacén así::
+
+    datos/historico/
+        _versiones/<versión>.json
+        estudio=Evaluaci%C3%B3n%20sensorial/dia=2024-05-01/<versión>-<primer id>.parquet
+        estudio=Recolecci%C3%B3n%20de%20Datos/dia=2024-05-01/...
+
+- Partición por estudio (el nombre del esquema de la respuesta, o la
+  columna ``Estudio`` de las importadas con ``importar.py``, que es el mismo)
+  y por día de la columna ``Fecha`` (o del guardado, si falta). ``app.py`` y
+  ``app5.py`` son el mismo estudio ("Evaluación sensorial") con dos versiones
+  de esquema: comparten la partición y se distinguen por la versión.
+- Versión de esquema: cada archivo lleva en el nombre (y en los metadatos
+  de Parquet) la versión de sus columnas, un hash de los nombres y tipos.
+  ``_versiones/<versión>.json`` dice qué "campo" es cada columna: la clave de
+  la pregunta ("nombre", "genero", "edad"), el nombre de las columnas previas
+  ("Ficha N°", "Fecha") y clave + sufijo para las normalizadas. Así
+  ``P1_Nombre`` (``app.py``) y ``Nombre`` (``app5.py``) conviven sin
+  renombrar nada y se consultan con el mismo campo.
+- ``archivar`` es incremental: la marca de agua (id de la última respuesta
+  archivada) se guarda en el almacén con ``confirmar_envio``, como en
+  ``sincronizacion.py``. Las respuestas no cambian después de guardadas, así
+  que las de una sesión abierta se pueden archivar sin esperar a que
+  termine. Cada lote escribe un archivo por partición con nombre fijo (su
+  primer id): si el proceso se corta antes de avanzar la marca, repetir el
+  lote reescribe los mismos archivos.
+
+``consultar`` descarta particiones por su nombre (estudio y rango de fechas)
+sin abrir archivos y, en los que quedan, pyarrow lee solo las columnas
+pedidas y aplica los filtros de campos con las estadísticas de cada row
+group (predicate pushdown); cada versión de esquema se lee con sus propios
+nombres y el resultado usa los campos.
+
+Uso::
+
+    python historico.py archivar [--almacen sqlite:///datos/respuestas.db] [--raiz datos/historico]
+    python historico.py consultar [--estudios E...] [--desde 2024-05-01] [--hasta 2024-05-31]
+                                  [--filtro genero=Femenino edad=30..45] [--columnas nombre edad]
+                                  [--salida consulta.csv]
+
+Las exportaciones viejas se llevan al archivo pasando por el almacén:
+``importar.py ARCHIVOS --destino URL`` y después ``archivar --almacen URL``.
+"""
+import argparse
+import functools
+import hashlib
+import json
+import os
+import re
+import time
+from urllib.parse import quote, unquote
+
+import importar
+import normalizacion
+from esquema import cargar_esquema
+
+RAIZ_POR_DEFECTO = os.environ.get("KEPCHUP_HISTORICO", os.path.join("datos", "historico"))
+TAM_LOTE = 50_000
+FILAS_POR_GRUPO = 64 * 1024  # row group de Parquet
+SIN_FECHA = "desconocida"
+_DIA = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+# ---- Versiones de esquema ----
+def _campos_esquema(esquema):
+    # columna -> campo, para las columnas de un esquema de las apps
+    campos = {columna: importar._PREVIAS.get(columna, columna) for columna in esquema.columnas_previas}
+    for clave, pregunta in esquema.preguntas.items():
+        if "columna" in pregunta:
+            campos[pregunta["columna"]] = clave
+    for columna, tipo, derivadas in esquema.normalizadas:
+        for derivada, (sufijo, _) in zip(derivadas, normalizacion.DERIVADAS[tipo]):
+            campos[derivada] = campos[columna] + sufijo
+    return campos
+
+
+def _describir(esquema, columnas, campos):
+    columnas = {"sesion": "texto", **columnas}
+    campos = {"sesion": "sesion", **campos}
+    texto = json.dumps({"esquema": esquema, "columnas": columnas, "campos": campos}, sort_keys=True,
+                       ensure_ascii=False)
+    return {"version": hashlib.sha256(texto.encode()).hexdigest()[:12], "esquema": esquema,
+            "columnas": columnas, "campos": campos}
+
+
+@functools.lru_cache(maxsize=None)
+def version_esquema(nombre):
+    """Versión (diccionario del manifiesto) de las respuestas guardadas con el esquema ``nombre``."""
+    esquema = cargar_esquema(nombre)
+    campos = _campos_esquema(esquema)
+    return _describir(nombre, {columna: esquema.tipos_columnas[columna] for columna in campos}, campos)
+
+
+@functools.lru_cache(maxsize=None)
+def version_consolidada():
+    """Versión de las respuestas importadas (columnas consolidadas de ``importar.py``)."""
+    tipos, reglas = importar.consolidado()
+    campos = {"Archivo": "Archivo", "Clave": "Clave"}
+    for nombre in importar.ESQUEMAS:
+        for columna, campo in _campos_esquema(cargar_esquema(nombre)).items():
+            campos.setdefault(reglas[nombre][columna], campo)
+    # El estudio es la partición: no se repite como columna
+    return _describir("consolidado", {columna: tipos[columna] for columna in campos}, campos)
+
+
+@functools.lru_cache(maxsize=None)
+def _reconocer(claves):
+    return importar.reconocer(claves)
+
+
+def _clasificar(respuesta):
+    # (estudio, versión) de una respuesta del almacén
+    if "Estudio" in respuesta:
+        return respuesta["Estudio"], version_consolidada()
+    nombre = _reconocer(tuple(respuesta))
+    return cargar_esquema(nombre).nombre, version_esquema(nombre)
+
+
+def _dia(respuesta, version, guardada):
+    fecha = next((respuesta.get(c) for c, campo in version["campos"].items() if campo == "Fecha"), None)
+    if isinstance(fecha, str) and _DIA.match(fecha):
+        return fecha[:10]
+    if guardada is not None:
+        return time.strftime("%Y-%m-%d", time.localtime(guardada))
+    return SIN_FECHA
+
+
+# ---- Escritura ----
+def _escribir_atomico(ruta, escribir):
+    temporal = ruta + ".tmp"
+    escribir(temporal)
+    os.replace(temporal, ruta)
+
+
+def _registrar_version(raiz, version):
+    ruta = os.path.join(raiz, "_versiones", version["version"] + ".json")
+    if not os.path.exists(ruta):
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+
+        def escribir(temporal):
+            with open(temporal, "w", encoding="utf-8") as f:
+                json.dump(version, f, ensure_ascii=False, indent=1)
+
+        _escribir_atomico(ruta, escribir)
+
+
+def _tipo_arrow(tipo):
+    import pyarrow as pa
+
+    return {"int64": pa.int64(), "float64": pa.float64()}.get(tipo, pa.string())
+
+
+def _escribir_particion(raiz, estudio, dia, version, primero, filas):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    carpeta = os.path.join(raiz, "estudio=" + quote(estudio, safe=""), "dia=" + dia)
+    os.makedirs(carpeta, exist_ok=True)
+    tabla = pa.table({
+        columna: pa.array([importar._convertir(fila.get(columna), tipo) for fila in filas], _tipo_arrow(tipo))
+        for columna, tipo in version["columnas"].items()
+    }).replace_schema_metadata({"kepchup.version": version["version"], "kepchup.esquema": version["esquema"]})
+    ruta = os.path.join(carpeta, f"{version['version']}-{primero:012d}.parquet")
+    _escribir_atomico(ruta, lambda temporal: pq.write_table(tabla, temporal, row_group_size=FILAS_POR_GRUPO,
+                                                            compression="zstd"))
+
+
+class Archivado:
+    """Contadores de una pasada de ``archivar``."""
+
+    def __init__(self):
+        self.lotes = self.filas = self.archivos = self.omitidas = 0
+
+
+def archivar(almacen, raiz=RAIZ_POR_DEFECTO, tam_lote=TAM_LOTE, informar=print):
+    """Agrega al archivo las respuestas del almacén posteriores a la marca; devuelve un ``Archivado``."""
+    destino = "historico:" + os.path.abspath(raiz)
+    marca = almacen.marca_envio(destino)
+    resultado = Archivado()
+    while True:
+        lote = almacen.pendientes(marca, tam_lote)
+        if not lote:
+            if resultado.omitidas:
+                informar(f"{resultado.omitidas} respuestas de un esquema desconocido no se archivaron")
+            return resultado
+        particiones = {}  # (estudio, día, versión) -> (versión, filas)
+        for _, sesion, _, _, guardada, respuesta in lote:
+            try:
+                estudio, version = _clasificar(respuesta)
+            except importar.EsquemaDesconocido:
+                resultado.omitidas += 1
+                continue
+            respuesta["sesion"] = sesion
+            clave = (estudio, _dia(respuesta, version, guardada), version["version"])
+            particiones.setdefault(clave, (version, []))[1].append(respuesta)
+        for (estudio, dia, _), (version, filas) in particiones.items():
+            _registrar_version(raiz, version)
+            _escribir_particion(raiz, estudio, dia, version, lote[0][0], filas)
+            resultado.filas += len(filas)
+        marca = lote[-1][0]
+        almacen.confirmar_envio(destino, marca)
+        resultado.lotes += 1
+        resultado.archivos += len(particiones)
+
+
+# ---- Consulta ----
+def _valores(carpeta, prefijo):
+    # Valores de las particiones ``prefijo=valor`` de una carpeta
+    try:
+        nombres = os.listdir(carpeta)
+    except FileNotFoundError:
+        return []
+    return sorted((unquote(n[len(prefijo) + 1:]), os.path.join(carpeta, n)) for n in nombres
+                  if n.startswith(prefijo + "="))
+
+
+def archivos(raiz=RAIZ_POR_DEFECTO, estudios=None, desde=None, hasta=None):
+    """
+    ``{versión: [rutas]}`` de los archivos de las particiones que pueden
+    tener respuestas de ``estudios`` entre ``desde`` y ``hasta`` (días
+    "AAAA-MM-DD" o fechas, incluidos); se decide solo por los nombres.
+    """
+    desde, hasta = (None if d is None else str(d)[:10] for d in (desde, hasta))
+    por_version = {}
+    for estudio, carpeta in _valores(raiz, "estudio"):
+        if estudios is not None and estudio not in estudios:
+            continue
+        for dia, carpeta_dia in _valores(carpeta, "dia"):
+            if (desde is not None or hasta is not None) and not _DIA.fullmatch(dia):
+                continue
+            if (desde is not None and dia < desde) or (hasta is not None and dia > hasta):
+                continue
+            for nombre in sorted(os.listdir(carpeta_dia)):
+                if nombre.endswith(".parquet"):
+                    por_version.setdefault(nombre.split("-", 1)[0], []).append(os.path.join(carpeta_dia, nombre))
+    return por_version
+
+
+def _condicion(columna, tipo, valor):
+    # Filtro de un campo: valor exacto, lista de valores o rango (mínimo, máximo) incluido
+    import pyarrow.dataset as ds
+
+    def convertir(v):
+        return str(v) if tipo == "texto" else float(v)
+
+    campo = ds.field(columna)
+    if isinstance(valor, tuple):
+        minimo, maximo = valor
+        condiciones = ([campo >= convertir(minimo)] if minimo is not None else []) + (
+            [campo <= convertir(maximo)] if maximo is not None else [])
+        return functools.reduce(lambda a, b: a & b, condiciones, campo.is_valid())
+    if isinstance(valor, (list, set, frozenset)):
+        return campo.isin([convertir(v) for v in valor])
+    return campo == convertir(valor)
+
+
+def _leer_version(raiz, version, rutas, filtro, columnas):
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    por_campo = {campo: columna for columna, campo in version["campos"].items()}
+    if any(campo not in por_campo for campo in filtro):
+        return None  # un campo filtrado no existe en esta versión: ninguna fila lo cumple
+    particiones = pa.schema([("estudio", pa.string()), ("dia", pa.string())])
+    esquema = pa.schema([(c, _tipo_arrow(t)) for c, t in version["columnas"].items()] + list(particiones))
+    dataset = ds.dataset(rutas, schema=esquema, format="parquet", partition_base_dir=raiz,
+                         partitioning=ds.partitioning(particiones, flavor="hive"))
+    condicion = None
+    for campo, valor in filtro.items():
+        parte = _condicion(por_campo[campo], version["columnas"][por_campo[campo]], valor)
+        condicion = parte if condicion is None else condicion & parte
+    leidas = ["estudio", "dia"] + [por_campo[c] for c in (columnas or version["campos"].values()) if c in por_campo]
+    tabla = dataset.to_table(columns=leidas, filter=condicion)
+    return tabla.rename_columns(["estudio", "dia"] + [version["campos"][c] for c in leidas[2:]])
+
+
+def consultar(raiz=RAIZ_POR_DEFECTO, estudios=None, desde=None, hasta=None, filtro=None, columnas=None):
+    """
+    Respuestas archivadas (tabla Arrow con ``estudio``, ``dia`` y los
+    ``columnas`` pedidas, por campo; todas si es None) de ``estudios`` entre
+    ``desde`` y ``hasta`` que cumplen ``filtro``: ``{campo: valor}``,
+    ``{campo: [valores]}`` o ``{campo: (mínimo, máximo)}`` (extremos
+    incluidos; None deja el extremo abierto). Por ejemplo, mujeres de 30 a 45
+    años: ``{"genero": "Femenino", "edad": (30, 45)}``.
+    """
+    import pyarrow as pa
+
+    filtro = filtro or {}
+    tablas = []
+    for numero, rutas in archivos(raiz, estudios, desde, hasta).items():
+        with open(os.path.join(raiz, "_versiones", numero + ".json"), encoding="utf-8") as f:
+            version = json.load(f)
+        tabla = _leer_version(raiz, version, rutas, filtro, columnas)
+        if tabla is not None:
+            tablas.append(tabla)
+    if not tablas:
+        return pa.table({columna: pa.array([], pa.string()) for columna in ["estudio", "dia"] + list(columnas or [])})
+    tabla = pa.concat_tables(_unificar(tablas), promote_options="default")
+    if columnas is not None:
+        tabla = tabla.select(["estudio", "dia"] + [c for c in columnas if c in tabla.column_names])
+    return tabla
+
+
+def _unificar(tablas):
+    # Un campo con tipos distintos entre versiones (la ficha: número en las
+    # apps, texto en lo importado) se devuelve como texto
+    import pyarrow as pa
+
+    tipos = {}
+    for tabla in tablas:
+        for campo in tabla.schema:
+            tipos.setdefault(campo.name, set()).add(campo.type)
+    texto = {nombre for nombre, distintos in tipos.items() if len(distintos - {pa.null()}) > 1}
+    if not texto:
+        return tablas
+    unificadas = []
+    for tabla in tablas:
+        for nombre in texto & set(tabla.column_names):
+            i = tabla.column_names.index(nombre)
+            tabla = tabla.set_column(i, nombre, tabla.column(i).cast(pa.string()))
+        unificadas.append(tabla)
+    return unificadas
+
+
+def leer_filtro(textos):
+    """``["genero=Femenino", "edad=30..45", "marca=Aioli,Otros"]`` -> filtro de ``consultar``."""
+    filtro = {}
+    for texto in textos or ():
+        campo, separador, valor = texto.partition("=")
+        if not separador:
+            raise ValueError(f"Filtro inválido (use campo=valor): {texto!r}")
+        if ".." in valor:
+            minimo, maximo = valor.split("..", 1)
+            filtro[campo] = (minimo or None, maximo or None)
+        elif "," in valor:
+            filtro[campo] = valor.split(",")
+        else:
+            filtro[campo] = valor
+    return filtro
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    archivar_cmd = comandos.add_parser("archivar", help="Agrega al archivo las respuestas nuevas del almacén")
+    archivar_cmd.add_argument("--almacen", help="Almacén de origen (por defecto KEPCHUP_ALMACEN)")
+    archivar_cmd.add_argument("--tam-lote", type=int, default=TAM_LOTE)
+    consultar_cmd = comandos.add_parser("consultar", help="Consulta el archivo")
+    consultar_cmd.add_argument("--estudios", nargs="+")
+    consultar_cmd.add_argument("--desde", help="Primer día (AAAA-MM-DD)")
+    consultar_cmd.add_argument("--hasta", help="Último día (AAAA-MM-DD)")
+    consultar_cmd.add_argument("--filtro", nargs="+", help="campo=valor, campo=mínimo..máximo o campo=v1,v2")
+    consultar_cmd.add_argument("--columnas", nargs="+", help="Campos a devolver (por defecto, todos)")
+    consultar_cmd.add_argument("--salida", help="Archivo de salida (.csv, .jsonl, .parquet o .xlsx)")
+    for comando in (archivar_cmd, consultar_cmd):
+        comando.add_argument("--raiz", default=RAIZ_POR_DEFECTO, help="Carpeta del archivo histórico")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    if args.comando == "archivar":
+        from almacen import abrir_almacen
+
+        almacen = abrir_almacen(args.almacen)
+        try:
+            resultado = archivar(almacen, args.raiz, args.tam_lote)
+        finally:
+            almacen.close()
+        segundos = time.perf_counter() - inicio
+        print(f"{'lotes':>6} {'filas':>9} {'archivos':>9} {'segundos':>9} {'filas/s':>9}")
+        print(f"{resultado.lotes:>6} {resultado.filas:>9} {resultado.archivos:>9} {segundos:>9.2f} "
+              f"{resultado.filas / segundos:>9.0f}")
+        return
+
+    try:
+        filtro = leer_filtro(args.filtro)
+    except ValueError as error:
+        parser.error(str(error))
+    leidos = sum(map(len, archivos(args.raiz, args.estudios, args.desde, args.hasta).values()))
+    tabla = consultar(args.raiz, args.estudios, args.desde, args.hasta, filtro, args.columnas)
+    segundos = time.perf_counter() - inicio
+    if args.salida:
+        from exportar import exportar, tipos_de_arrow
+
+        formato = os.path.splitext(args.salida)[1].lstrip(".").lower()
+        exportar((fila for lote in tabla.to_batches() for fila in lote.to_pylist()), args.salida, formato,
+                 columnas=tabla.column_names, tipos=tipos_de_arrow(tabla.schema))
+    print(f"{'archivos':>9} {'filas':>9} {'segundos':>9}")
+    print(f"{leidos:>9} {tabla.num_rows:>9} {segundos:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+"""
+Importación masiva de exportaciones de las apps.
+
+Uso:
+    python importar.py ARCHIVO_O_CARPETA... [--destino sqlite:///datos/consolidado.db]
+                       [--parquet CARPETA] [--procesos N]
+
+Cada encuestador termina el día con uno o más ``evaluacion_sensorial_*.xlsx``
+(``app.py`` y ``app5.py``) o ``datos_recolectados.*`` (``app0.py``; también
+CSV, JSON Lines o Parquet). Este script los consolida:
+
+- los archivos se leen en paralelo en un pool de procesos (``--procesos``,
+  por defecto uno por CPU); cada proceso reconoce el esquema del archivo por
+  sus encabezados, lleva las columnas al esquema consolidado (las preguntas
+  se identifican por su clave, de modo que "P1_Nombre" de ``app.py`` y
+  "Nombre" de ``app5.py`` son la misma columna), completa las columnas
+  normalizadas de frecuencia y cantidad si el archivo es anterior a ellas
+  (ver ``normalizacion.py``) y calcula la huella del encuestado;
+- el proceso principal recibe los archivos en orden, descarta las fichas
+  repetidas (la misma ficha exportada dos veces) con un índice por
+  ``Estudio`` + ``Ficha N°`` + huella, y escribe en streaming en un almacén
+  (``--destino``, con la clave como token de idempotencia: reimportar no
+  duplica) o en un archivo Parquet nuevo dentro de un dataset (``--parquet``;
+  las claves de los archivos ya presentes se cargan antes de empezar).
+
+Al terminar se informa cuántas filas se leyeron, descartaron y escribieron, y
+las filas por segundo.
+"""
+import argparse
+import csv
+import functools
+import json
+import os
+import sys
+import time
+import uuid
+from collections import deque
+from itertools import chain
+
+import normalizacion
+from esquema import cargar_esquema
+from exportar import exportar_parquet
+
+# Esquemas que pueden aparecer en las exportaciones; el primero da los nombres
+# de las columnas consolidadas que comparte con los demás.
+ESQUEMAS = ("evaluacion_sensorial_completa", "evaluacion_sensorial", "recoleccion_datos")
+
+EXTENSIONES = (".xlsx", ".csv", ".jsonl", ".parquet")
+
+# Columnas previas equivalentes entre esquemas (``app0.py`` usa "fecha")
+_PREVIAS = {"fecha": "Fecha"}
+
+
+class EsquemaDesconocido(ValueError):
+    """Los encabezados del archivo no corresponden a ningún esquema conocido."""
+
+
+# ---- Lectura ----
+def _leer_xlsx(ruta):
+    import openpyxl
+
+    libro = openpyxl.load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        filas = libro.worksheets[0].iter_rows(values_only=True)
+        encabezados = [str(c) for c in next(filas, ()) if c is not None]
+        for valores in filas:
+            if any(v is not None for v in valores):
+                yield dict(zip(encabezados, valores))
+    finally:
+        libro.close()
+
+
+def _leer_csv(ruta):
+    with open(ruta, newline="", encoding="utf-8-sig") as f:
+        yield from csv.DictReader(f)
+
+
+def _leer_jsonl(ruta):
+    with open(ruta, encoding="utf-8") as f:
+        for linea in f:
+            if linea.strip():
+                yield json.loads(linea)
+
+
+def _leer_parquet(ruta):
+    import pyarrow.parquet as pq
+
+    for lote in pq.ParquetFile(ruta).iter_batches():
+        yield from lote.to_pylist()
+
+
+LECTORES = {".xlsx": _leer_xlsx, ".csv": _leer_csv, ".jsonl": _leer_jsonl, ".parquet": _leer_parquet}
+
+
+# ---- Esquema consolidado ----
+@functools.lru_cache(maxsize=None)
+def consolidado():
+    """
+    ``(tipos, reglas)``: columnas consolidadas con su tipo y, por esquema,
+    las reglas ``columna de origen -> columna consolidada``.
+    """
+    # "Ficha N°" es texto: las planillas de las primeras versiones de app.py
+    # la guardaban como "<sesión>_<número>" y es la clave de las repetidas
+    tipos = {"Estudio": "texto", "Archivo": "texto", "Clave": "texto", "Ficha N°": "texto"}
+    por_clave = {}
+    reglas = {}
+    for nombre in ESQUEMAS:
+        esquema = cargar_esquema(nombre)
+        regla = {}
+        for columna in esquema.columnas_previas:
+            destino = _PREVIAS.get(columna, columna)
+            regla[columna] = destino
+            tipos.setdefault(destino, esquema.tipos_columnas[columna])
+        for clave, pregunta in esquema.preguntas.items():
+            if "columna" not in pregunta:
+                continue
+            destino = por_clave.setdefault(clave, pregunta["columna"])
+            regla[pregunta["columna"]] = destino
+            tipos.setdefault(destino, esquema.tipos_columnas[pregunta["columna"]])
+        for columna, tipo, derivadas in esquema.normalizadas:
+            for derivada, (sufijo, _) in zip(derivadas, normalizacion.DERIVADAS[tipo]):
+                regla[derivada] = regla[columna] + sufijo
+                tipos.setdefault(regla[derivada], esquema.tipos_columnas[derivada])
+        reglas[nombre] = regla
+    return tipos, reglas
+
+
+def reconocer(encabezados):
+    """Esquema (de ``ESQUEMAS``) al que pertenecen los encabezados de un archivo."""
+    encabezados = set(encabezados)
+    _, reglas = consolidado()
+    mejor = max(ESQUEMAS, key=lambda nombre: len(encabezados & reglas[nombre].keys()) / len(reglas[nombre]))
+    if len(encabezados & reglas[mejor].keys()) < len(reglas[mejor]) / 2:
+        raise EsquemaDesconocido(f"Encabezados no reconocidos: {sorted(encabezados)[:5]}...")
+    return mejor
+
+
+def _convertir(valor, tipo):
+    if valor is None or valor == "":
+        return None if tipo != "texto" else ""
+    if tipo == "texto":
+        # 3 y 3.0 (según el lector) son la misma ficha
+        return str(int(valor)) if isinstance(valor, float) and valor.is_integer() else str(valor)
+    try:
+        numero = float(valor)
+    except (TypeError, ValueError):
+        return None  # celdas con error (#NUM!) o texto en una columna numérica
+    if tipo == "int64":
+        return int(numero) if numero.is_integer() else None
+    return numero
+
+
+def leer_archivo(ruta):
+    """
+    Lee y reconcilia un archivo (se ejecuta en los procesos del pool).
+    Devuelve ``(nombre del esquema, [(clave, huella, fila consolidada), ...])``.
+    """
+    tipos, reglas = consolidado()
+    filas = iter(LECTORES[os.path.splitext(ruta)[1].lower()](ruta))
+    primera = next(filas, None)
+    if primera is None:
+        return None, []
+    nombre = reconocer(primera)
+    esquema = cargar_esquema(nombre)
+    regla = reglas[nombre]
+    estudio = esquema.nombre
+    archivo = os.path.basename(ruta)
+    resultado = []
+    for original in chain((primera,), filas):
+        fila = {"Estudio": estudio, "Archivo": archivo}
+        for columna, destino in regla.items():
+            fila[destino] = _convertir(original.get(columna), tipos[destino])
+        for columna, tipo, derivadas in esquema.normalizadas:
+            # Exportaciones anteriores a la normalización: se completa aquí
+            if columna in original and derivadas[0] not in original:
+                valores = normalizacion.INTERPRETES[tipo](fila[regla[columna]])
+                fila.update(zip((regla[d] for d in derivadas), valores))
+        # La huella se calcula con los nombres de origen (los que usa el esquema)
+        huella = esquema.huella({columna: fila[destino] for columna, destino in regla.items()})
+        ficha = fila.get("Ficha N°") or None
+        if ficha is None and huella is None:
+            clave = None
+        else:
+            clave = f"{estudio}:{'' if ficha is None else ficha}:{huella or ''}"
+        fila["Clave"] = clave
+        resultado.append((clave, huella, fila))
+    return nombre, resultado
+
+
+# ---- Consolidación ----
+def expandir(rutas):
+    """Archivos a importar: los indicados y los de las carpetas indicadas, en orden."""
+    archivos = []
+    for ruta in rutas:
+        if os.path.isdir(ruta):
+            archivos.extend(sorted(os.path.join(ruta, nombre) for nombre in os.listdir(ruta)
+                                   if nombre.lower().endswith(EXTENSIONES)))
+        else:
+            archivos.append(ruta)
+    return archivos
+
+
+def en_paralelo(funcion, archivos, procesos):
+    """
+    ``(archivo, resultado o excepción)`` en el orden de ``archivos``. Hay a lo
+    sumo dos archivos por proceso en vuelo, para no acumular resultados en
+    memoria si la escritura va más lenta que la lectura.
+    """
+    if procesos == 1:
+        for archivo in archivos:
+            try:
+                yield archivo, funcion(archivo)
+            except Exception as error:
+                yield archivo, error
+        return
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(procesos) as pool:
+        en_vuelo = deque()
+        for archivo in archivos:
+            en_vuelo.append((archivo, pool.submit(funcion, archivo)))
+            if len(en_vuelo) >= 2 * procesos:
+                yield _resultado(*en_vuelo.popleft())
+        while en_vuelo:
+            yield _resultado(*en_vuelo.popleft())
+
+
+def _resultado(archivo, futuro):
+    try:
+        return archivo, futuro.result()
+    except Exception as error:
+        return archivo, error
+
+
+class Importacion:
+    """
+    Índice de fichas ya vistas y contadores de una importación. ``claves``
+    tiene las claves ``Estudio:Ficha:huella`` (una por respuesta distinta);
+    ``fichas`` registra la huella de cada ficha para informar las fichas con
+    el mismo número y otra persona (exportaciones de almacenes distintos),
+    que se conservan.
+    """
+
+    def __init__(self, claves=()):
+        self.claves = set(claves)
+        self.fichas = {}
+        self.archivos = self.leidas = self.repetidas = self.conflictos = self.escritas = self.nuevas = 0
+        self.errores = []
+
+    def filtrar(self, resultado):
+        """Filas de ``resultado`` (de ``leer_archivo``) que no están repetidas."""
+        for clave, huella, fila in resultado:
+            self.leidas += 1
+            if clave is not None:
+                if clave in self.claves:
+                    self.repetidas += 1
+                    continue
+                self.claves.add(clave)
+                ficha = (fila["Estudio"], fila.get("Ficha N°") or None)
+                if ficha[1] is not None and self.fichas.setdefault(ficha, huella) != huella:
+                    self.conflictos += 1
+            self.escritas += 1
+            yield clave, huella, fila
+
+
+def claves_parquet(carpeta):
+    """Claves de las filas ya importadas a un dataset Parquet."""
+    import pyarrow.parquet as pq
+
+    claves = set()
+    for nombre in os.listdir(carpeta):
+        if nombre.endswith(".parquet"):
+            columna = pq.read_table(os.path.join(carpeta, nombre), columns=["Clave"]).column("Clave")
+            claves.update(c for c in columna.to_pylist() if c is not None)
+    return claves
+
+
+def importar(archivos, destino=None, parquet=None, procesos=None, tam_bloque=1000, informar=print):
+    """
+    Importa ``archivos`` en el almacén ``destino`` (URL de ``abrir_almacen``)
+    o en el dataset Parquet de la carpeta ``parquet``. Devuelve la
+    ``Importacion`` con los contadores.
+    """
+    procesos = procesos or os.cpu_count() or 1
+    archivos = expandir(archivos)
+
+    if parquet is not None:
+        os.makedirs(parquet, exist_ok=True)
+        importacion = Importacion(claves_parquet(parquet))
+    else:
+        importacion = Importacion()
+
+    def filas():
+        for archivo, resultado in en_paralelo(leer_archivo, archivos, procesos):
+            if isinstance(resultado, Exception):
+                importacion.errores.append((archivo, resultado))
+                informar(f"{archivo}: no se importó ({resultado})")
+                continue
+            importacion.archivos += 1
+            yield from importacion.filtrar(resultado[1])
+
+    if parquet is not None:
+        tipos, _ = consolidado()
+        ruta = os.path.join(parquet, f"importacion_{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.parquet")
+        exportar_parquet((fila for _, _, fila in filas()), ruta, tam_bloque=tam_bloque, tipos=tipos)
+        importacion.nuevas = importacion.escritas
+        if not importacion.nuevas:
+            os.remove(ruta)  # nada nuevo: no se agrega un archivo vacío al dataset
+    else:
+        from almacen import abrir_almacen
+
+        almacen = abrir_almacen(destino)
+        try:
+            previas = almacen.count()
+            for clave, huella, fila in filas():
+                # La clave como token: reimportar el mismo archivo no duplica filas.
+                # Sin esperar cada commit: el escritor agrupa las filas encoladas.
+                almacen.append(f"importado:{fila['Archivo']}", fila, esperar=False, token=clave, huella=huella)
+            almacen.flush()
+            importacion.nuevas = almacen.count() - previas
+        finally:
+            almacen.close()
+    return importacion
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("archivos", nargs="+", help="Archivos exportados o carpetas que los contienen")
+    parser.add_argument("--destino", help="Almacén de destino (por defecto KEPCHUP_ALMACEN)")
+    parser.add_argument("--parquet", help="Carpeta de un dataset Parquet de destino (en lugar del almacén)")
+    parser.add_argument("--procesos", type=int, help="Procesos de lectura (por defecto, uno por CPU)")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    importacion = importar(args.archivos, args.destino, args.parquet, args.procesos)
+    segundos = time.perf_counter() - inicio
+    print(f"{'archivos':>8} {'leídas':>10} {'repetidas':>10} {'conflictos':>10} {'nuevas':>10} "
+          f"{'segundos':>9} {'filas/s':>9}")
+    print(f"{importacion.archivos:>8} {importacion.leidas:>10} {importacion.repetidas:>10} "
+          f"{importacion.conflictos:>10} {importacion.nuevas:>10} {segundos:>9.2f} "
+          f"{importacion.leidas / segundos:>9.0f}")
+    if importacion.errores:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
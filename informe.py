@@ -0,0 +1,546 @@
+"""
+Informe de análisis sensorial sobre las respuestas consolidadas.
+
+Uso:
+    python informe.py ORIGEN [--estudios ESTUDIO...] [--salida informe.html informe.xlsx]
+                      [--procesos N] [--memoria-mb 256] [--confianza 0.95]
+
+``ORIGEN`` es la carpeta de un dataset Parquet (``importar.py --parquet``) o
+la URL de un almacén (``sqlite:///datos/consolidado.db``, como
+``importar.py --destino``). Para cada estudio (columna ``Estudio``; las
+respuestas que guardaron las apps se llevan al esquema consolidado como en
+``importar.py``) se calcula, con las columnas del bloque ``analitica`` del
+esquema consolidado:
+
+- aceptación (conoce, ha probado, todos consumirían) por género y por rango
+  de edad: porcentaje de "Sí" con su intervalo de Wilson y prueba z de dos
+  proporciones de cada grupo contra el resto;
+- independencia grupo × respuesta: prueba chi-cuadrado, con el porcentaje de
+  frecuencias esperadas menores que 5 (la prueba es aproximada si es alto);
+- marca preferida: participación de cada marca con su intervalo de Wilson.
+
+Las respuestas sin dato (grupo o respuesta vacíos) no entran en las pruebas.
+
+Las respuestas se leen de a bloques y cada columna se convierte a códigos
+enteros (la posición de su valor entre las opciones del esquema) con Arrow;
+las tablas de contingencia salen de un ``np.bincount`` por bloque y se suman
+entre bloques. La memoria depende del bloque, que se elige para que los
+bloques en vuelo de todos los procesos entren en ``--memoria-mb``, y no del
+tamaño del dataset. Los estudios son independientes y se reparten en un pool
+de procesos: en Parquet cada uno se lee con un filtro por ``Estudio`` que
+pyarrow aplica al leer; un almacén no se puede filtrar sin decodificar cada
+respuesta, así que se reparten rangos de ids y se separan los estudios de
+cada bloque.
+"""
+import argparse
+import functools
+import html
+import math
+import os
+import re
+import sys
+import time
+from statistics import NormalDist
+
+import numpy as np
+
+import importar
+from esquema import cargar_esquema
+
+SIN_DATO = "(sin dato)"
+RESPUESTAS = ("Sí", "No")
+
+# Bytes por fila de un bloque en memoria: columnas Arrow y códigos en Parquet;
+# en un almacén, además, la respuesta decodificada completa (un diccionario)
+BYTES_POR_FILA = {"parquet": 200, "almacen": 6000}
+MIN_BLOQUE = 1000
+
+
+@functools.lru_cache(maxsize=None)
+def definicion():
+    """Bloque ``analitica`` con los nombres de columna del esquema consolidado."""
+    return cargar_esquema(importar.ESQUEMAS[0]).analitica
+
+
+def columnas_leidas():
+    analitica = definicion()
+    return ["Estudio"] + [columna for columna, _, _ in analitica["por"]] + analitica["aceptacion"] + [
+        analitica["participacion"]]
+
+
+# ---- Pruebas ----
+def gamma_q(a, x):
+    """Función gamma incompleta superior regularizada Q(a, x)."""
+    if x <= 0:
+        return 1.0
+    logaritmo = a * math.log(x) - x - math.lgamma(a)
+    if x < a + 1:
+        # Serie de P(a, x) = 1 - Q(a, x)
+        termino = suma = 1.0 / a
+        for n in range(1, 10_000):
+            termino *= x / (a + n)
+            suma += termino
+            if termino < suma * 1e-15:
+                break
+        return max(0.0, 1.0 - suma * math.exp(logaritmo))
+    # Fracción continua de Q(a, x) (método de Lentz)
+    minimo = 1e-300
+    b = x + 1 - a
+    c, d = 1 / minimo, 1 / b
+    h = d
+    for i in range(1, 10_000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = 1 / (d if abs(d) > minimo else minimo)
+        c = b + an / c
+        c = c if abs(c) > minimo else minimo
+        h *= d * c
+        if abs(d * c - 1) < 1e-15:
+            break
+    return math.exp(logaritmo) * h
+
+
+def p_chi2(estadistico, libertad):
+    """P(X >= estadistico) para una chi-cuadrado con ``libertad`` grados de libertad."""
+    return gamma_q(libertad / 2, estadistico / 2)
+
+
+def wilson(exitos, n, z):
+    """Intervalos de Wilson (inferior, superior) de ``exitos / n``; NaN si n = 0."""
+    exitos, n = np.asarray(exitos, dtype=float), np.asarray(n, dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        p = exitos / n
+        denominador = 1 + z * z / n
+        centro = (p + z * z / (2 * n)) / denominador
+        radio = z * np.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominador
+    return centro - radio, centro + radio
+
+
+def z_contra_resto(si, n):
+    """
+    Prueba z de dos proporciones de cada grupo (filas) contra el resto, para
+    cada pregunta (columnas). Devuelve (z, p bilateral); NaN donde no aplica.
+    """
+    resto_si, resto_n = si.sum(axis=0) - si, n.sum(axis=0) - n
+    with np.errstate(invalid="ignore", divide="ignore"):
+        comun = si.sum(axis=0) / n.sum(axis=0)
+        error = np.sqrt(comun * (1 - comun) * (1 / n + 1 / resto_n))
+        z = (si / n - resto_si / resto_n) / error
+    z[~np.isfinite(z)] = np.nan
+    p = np.array([math.erfc(abs(v) / math.sqrt(2)) if v == v else np.nan for v in z.ravel()]).reshape(z.shape)
+    return z, p
+
+
+def chi2_independencia(tabla):
+    """
+    Prueba chi-cuadrado de independencia de una tabla de contingencia (sin
+    filas ni columnas vacías). Devuelve (chi², grados de libertad, p, % de
+    esperadas < 5) o None si la tabla no tiene al menos 2×2.
+    """
+    tabla = tabla[tabla.sum(axis=1) > 0][:, tabla.sum(axis=0) > 0]
+    if tabla.shape[0] < 2 or tabla.shape[1] < 2:
+        return None
+    esperadas = np.outer(tabla.sum(axis=1), tabla.sum(axis=0)) / tabla.sum()
+    estadistico = float(((tabla - esperadas) ** 2 / esperadas).sum())
+    libertad = (tabla.shape[0] - 1) * (tabla.shape[1] - 1)
+    return estadistico, libertad, p_chi2(estadistico, libertad), 100 * float((esperadas < 5).mean())
+
+
+# ---- Conteo por bloques ----
+def _codigos(columna, opciones):
+    # Posición de cada valor entre las opciones; len(opciones) si no está (sin dato)
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    indices = pc.index_in(columna.cast(pa.string()), value_set=pa.array(opciones, pa.string()))
+    return pc.fill_null(indices, len(opciones)).to_numpy().astype(np.intp)
+
+
+def _codigos_rango(columna, cortes):
+    import pyarrow as pa
+
+    valores = columna.cast(pa.float64()).to_numpy(zero_copy_only=False)
+    codigos = np.searchsorted(np.asarray(cortes, dtype=float), valores, side="right")
+    codigos[np.isnan(valores)] = len(cortes) + 1
+    return codigos
+
+
+class Conteos:
+    """Tablas de contingencia de un estudio; se suman entre bloques y procesos."""
+
+    def __init__(self):
+        analitica = definicion()
+        preguntas = len(analitica["aceptacion"])
+        self.n = 0
+        # columna de agrupación -> [grupo (+ sin dato), pregunta, Sí / No / sin dato]
+        self.aceptacion = {columna: np.zeros((len(etiquetas) + 1, preguntas, 3), dtype=np.int64)
+                           for columna, _, etiquetas in analitica["por"]}
+        self.marcas = np.zeros(len(analitica["opciones_participacion"]) + 1, dtype=np.int64)
+
+    def agregar(self, grupos, respuestas, marcas):
+        """Cuenta un bloque ya codificado (arreglos de códigos de la misma longitud)."""
+        self.n += len(marcas)
+        for columna, codigos in grupos.items():
+            tabla = self.aceptacion[columna]
+            for i, respuesta in enumerate(respuestas):
+                tabla[:, i] += np.bincount(codigos * 3 + respuesta, minlength=tabla.shape[0] * 3).reshape(-1, 3)
+        self.marcas += np.bincount(marcas, minlength=len(self.marcas))
+
+    def sumar(self, otro):
+        self.n += otro.n
+        for columna, tabla in otro.aceptacion.items():
+            self.aceptacion[columna] += tabla
+        self.marcas += otro.marcas
+        return self
+
+
+def contar_tabla(tabla, conteos):
+    """Codifica un bloque (``RecordBatch`` con ``columnas_leidas()``) y lo suma a ``conteos`` por estudio."""
+    import pyarrow.compute as pc
+
+    analitica = definicion()
+    grupos = {columna: _codigos(tabla[columna], etiquetas) if cortes is None
+              else _codigos_rango(tabla[columna], cortes)
+              for columna, cortes, etiquetas in analitica["por"]}
+    respuestas = [_codigos(tabla[columna], list(RESPUESTAS)) for columna in analitica["aceptacion"]]
+    marcas = _codigos(tabla[analitica["participacion"]], analitica["opciones_participacion"])
+
+    estudios = pc.dictionary_encode(tabla["Estudio"])
+    nombres = estudios.dictionary.to_pylist()
+    if len(nombres) == 1:
+        conteos.setdefault(nombres[0], Conteos()).agregar(grupos, respuestas, marcas)
+        return
+    indices = estudios.indices.to_numpy()
+    for i, estudio in enumerate(nombres):
+        filas = indices == i
+        conteos.setdefault(estudio, Conteos()).agregar(
+            {columna: codigos[filas] for columna, codigos in grupos.items()},
+            [codigos[filas] for codigos in respuestas], marcas[filas])
+
+
+def _lectura():
+    # Sin lectura anticipada, sin hilos y sin precargar el archivo entero: en
+    # memoria queda un bloque por proceso (y el row group que se está leyendo)
+    import pyarrow.dataset as ds
+
+    return {"batch_readahead": 1, "fragment_readahead": 1, "use_threads": False,
+            "fragment_scan_options": ds.ParquetFragmentScanOptions(pre_buffer=False)}
+
+
+def contar_parquet(carpeta, estudio, tam_bloque):
+    """Conteos de un estudio del dataset Parquet (se ejecuta en los procesos del pool)."""
+    import pyarrow.dataset as ds
+
+    conteos = {}
+    dataset = ds.dataset(carpeta, format="parquet")
+    for lote in dataset.to_batches(columns=columnas_leidas(), filter=ds.field("Estudio") == estudio,
+                                   batch_size=tam_bloque, **_lectura()):
+        if lote.num_rows:
+            contar_tabla(lote, conteos)
+    return conteos
+
+
+@functools.lru_cache(maxsize=None)
+def _regla(claves):
+    # Respuestas guardadas por las apps: nombres de su esquema -> consolidados;
+    # el estudio es el nombre del esquema, como lo escribe ``importar``
+    nombre = importar.reconocer(claves)
+    return cargar_esquema(nombre).nombre, importar.consolidado()[1][nombre]
+
+
+def _consolidar(respuesta):
+    if "Estudio" in respuesta:
+        return respuesta
+    try:
+        nombre, regla = _regla(tuple(respuesta))
+    except importar.EsquemaDesconocido:
+        return None
+    fila = {destino: respuesta.get(origen) for origen, destino in regla.items()}
+    fila["Estudio"] = nombre
+    return fila
+
+
+def _bloque_arrow(filas):
+    import pyarrow as pa
+
+    analitica = definicion()
+    numericas = {columna for columna, cortes, _ in analitica["por"] if cortes is not None}
+    datos = {}
+    for columna in columnas_leidas():
+        valores = [fila.get(columna) for fila in filas]
+        if columna in numericas:
+            datos[columna] = pa.array([importar._convertir(v, "float64") for v in valores], pa.float64())
+        else:
+            datos[columna] = pa.array([None if v in (None, "") else str(v) for v in valores], pa.string())
+    return pa.RecordBatch.from_pydict(datos)
+
+
+def contar_almacen(url, desde, hasta, tam_bloque):
+    """Conteos por estudio de las respuestas con id en (desde, hasta] de un almacén."""
+    from almacen import abrir_almacen
+
+    conteos = {}
+    almacen = abrir_almacen(url)
+    try:
+        bloque = []
+        for id_fila, respuesta in almacen.iterate_desde_id(desde, tam_bloque=min(tam_bloque, 5000)):
+            if id_fila > hasta:
+                break
+            fila = _consolidar(respuesta)
+            if fila is not None:
+                bloque.append(fila)
+            if len(bloque) >= tam_bloque:
+                contar_tabla(_bloque_arrow(bloque), conteos)
+                bloque = []
+        if bloque:
+            contar_tabla(_bloque_arrow(bloque), conteos)
+    finally:
+        almacen.close()
+    return conteos
+
+
+def estudios_parquet(carpeta, tam_bloque):
+    """Estudios presentes en el dataset (se lee solo la columna ``Estudio``)."""
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    estudios = set()
+    for lote in ds.dataset(carpeta, format="parquet").to_batches(columns=["Estudio"], batch_size=tam_bloque,
+                                                                 **_lectura()):
+        estudios.update(v for v in pc.unique(lote["Estudio"]).to_pylist() if v is not None)
+    return sorted(estudios)
+
+
+@functools.lru_cache(maxsize=None)
+def _con_analitica(estudio):
+    # Estudios de un esquema sin bloque ``analitica`` (app0.py) no tienen qué
+    # analizar; ``estudio`` es el nombre del esquema ("Recolección de Datos")
+    esquemas = [cargar_esquema(nombre) for nombre in importar.ESQUEMAS]
+    esquemas = [esquema for esquema in esquemas if esquema.nombre == estudio]
+    return not esquemas or any(esquema.analitica is not None for esquema in esquemas)
+
+
+def contar(origen, estudios=None, procesos=None, memoria_mb=256, informar=print):
+    """``{estudio: Conteos}`` de ``origen`` (carpeta Parquet o URL de almacén)."""
+    procesos = procesos or os.cpu_count() or 1
+    parquet = os.path.isdir(origen)
+    tam_bloque = max(MIN_BLOQUE, int(memoria_mb * 2**20 / (procesos * BYTES_POR_FILA[
+        "parquet" if parquet else "almacen"])))
+    if parquet:
+        if estudios is None:
+            estudios = [e for e in estudios_parquet(origen, tam_bloque) if _con_analitica(e)]
+        partes = [(origen, estudio) for estudio in estudios]
+        tarea = functools.partial(_contar_parte, contar_parquet, tam_bloque=tam_bloque)
+    else:
+        from almacen import abrir_almacen
+
+        almacen = abrir_almacen(origen)
+        try:
+            ultimo = almacen.version()
+        finally:
+            almacen.close()
+        # Rangos de ids: varios por proceso, para repartir bien la carga
+        cortes = np.linspace(0, ultimo, min(4 * procesos, max(1, ultimo // tam_bloque)) + 1).astype(int)
+        partes = [(origen, int(a), int(b)) for a, b in zip(cortes, cortes[1:])]
+        tarea = functools.partial(_contar_parte, contar_almacen, tam_bloque=tam_bloque)
+
+    total = {}
+    for parte, resultado in importar.en_paralelo(tarea, partes, procesos):
+        if isinstance(resultado, Exception):
+            raise RuntimeError(f"No se pudo leer {parte[1:]}: {resultado}") from resultado
+        for estudio, conteos in resultado.items():
+            if estudio in total:
+                total[estudio].sumar(conteos)
+            else:
+                total[estudio] = conteos
+    if estudios is None:
+        return {e: total[e] for e in sorted(total) if _con_analitica(e)}
+    faltan = [e for e in estudios if e not in total]
+    if faltan:
+        informar(f"Sin respuestas: {', '.join(faltan)}")
+    return {e: total[e] for e in estudios if e in total}
+
+
+def _contar_parte(funcion, parte, tam_bloque):
+    return funcion(*parte, tam_bloque=tam_bloque)
+
+
+# ---- Tablas del informe ----
+def _numero(valor):
+    if valor is None or valor != valor:
+        return None
+    return float(valor)
+
+
+def tablas(conteos, confianza=0.95):
+    """``[(título, filas)]`` de un estudio; las filas son diccionarios columna -> valor."""
+    analitica = definicion()
+    z = NormalDist().inv_cdf(1 - (1 - confianza) / 2)
+    nivel = f"{confianza:.0%}"
+    resultado = []
+    for columna, _, etiquetas in analitica["por"]:
+        tabla = conteos.aceptacion[columna]
+        si, no = tabla[:-1, :, 0], tabla[:-1, :, 1]  # sin la fila ni la columna "sin dato"
+        n = si + no
+        inferior, superior = wilson(si, n, z)
+        zs, ps = z_contra_resto(si, n)
+        filas = []
+        for j, pregunta in enumerate(analitica["aceptacion"]):
+            for g, grupo in enumerate(etiquetas):
+                filas.append({
+                    "Pregunta": pregunta, columna: grupo, "n": int(n[g, j]), "Sí": int(si[g, j]),
+                    "% Sí": _numero(100 * si[g, j] / n[g, j]) if n[g, j] else None,
+                    f"IC {nivel} inf.": _numero(100 * inferior[g, j]),
+                    f"IC {nivel} sup.": _numero(100 * superior[g, j]),
+                    "z (vs. resto)": _numero(zs[g, j]), "p (vs. resto)": _numero(ps[g, j]),
+                })
+            total_si, total_n = int(si[:, j].sum()), int(n[:, j].sum())
+            inf_total, sup_total = wilson(total_si, total_n, z)
+            filas.append({
+                "Pregunta": pregunta, columna: "Total", "n": total_n, "Sí": total_si,
+                "% Sí": 100 * total_si / total_n if total_n else None,
+                f"IC {nivel} inf.": _numero(100 * inf_total), f"IC {nivel} sup.": _numero(100 * sup_total),
+                "z (vs. resto)": None, "p (vs. resto)": None,
+            })
+        resultado.append((f"Aceptación por {columna}", filas))
+
+        filas = []
+        for j, pregunta in enumerate(analitica["aceptacion"]):
+            prueba = chi2_independencia(tabla[:-1, j, :2])
+            chi2, libertad, p, esperadas = prueba if prueba is not None else (None,) * 4
+            filas.append({"Pregunta": pregunta, "n": int(n[:, j].sum()), "chi²": chi2, "gl": libertad, "p": p,
+                          "% esperadas < 5": esperadas})
+        resultado.append((f"Independencia {columna} × respuesta (chi-cuadrado)", filas))
+
+    marcas = conteos.marcas[:-1]
+    respondidas = int(marcas.sum())
+    inferior, superior = wilson(marcas, respondidas, z)
+    filas = [{analitica["participacion"]: marca, "n": int(marcas[i]),
+              "%": 100 * marcas[i] / respondidas if respondidas else None,
+              f"IC {nivel} inf.": _numero(100 * inferior[i]), f"IC {nivel} sup.": _numero(100 * superior[i])}
+             for i, marca in enumerate(analitica["opciones_participacion"])]
+    filas.append({analitica["participacion"]: SIN_DATO, "n": int(conteos.marcas[-1]), "%": None,
+                  f"IC {nivel} inf.": None, f"IC {nivel} sup.": None})
+    resultado.append((analitica["participacion"], filas))
+    return resultado
+
+
+# ---- Salida ----
+def _formato(columna):
+    # Cifras con que se muestra cada columna (p-valores con cuatro decimales)
+    if columna.startswith("p"):
+        return 4
+    if columna in ("n", "Sí", "gl"):
+        return 0
+    return 1 if "%" in columna or columna.startswith("IC") else 2
+
+
+def _texto(valor, columna):
+    if valor is None:
+        return "–"
+    if isinstance(valor, str):
+        return valor
+    if columna.startswith("p") and valor < 1e-4:
+        return "< 0.0001"
+    return f"{valor:.{_formato(columna)}f}"
+
+
+def escribir_html(informe, ruta, titulo="Informe de análisis sensorial"):
+    partes = [
+        "<!DOCTYPE html>", '<html lang="es"><head><meta charset="utf-8">', f"<title>{html.escape(titulo)}</title>",
+        "<style>body{font-family:sans-serif;margin:2em}table{border-collapse:collapse;margin-bottom:1.5em}"
+        "th,td{border:1px solid #aaa;padding:4px 8px}th{background:#c3e6cb}td.n{text-align:right}</style>",
+        "</head><body>", f"<h1>{html.escape(titulo)}</h1>",
+    ]
+    for estudio, n, secciones in informe:
+        partes.append(f"<h2>{html.escape(estudio)}</h2><p>{n} respuestas</p>")
+        for subtitulo, filas in secciones:
+            columnas = list(filas[0])
+            partes.append(f"<h3>{html.escape(subtitulo)}</h3><table><tr>"
+                          + "".join(f"<th>{html.escape(c)}</th>" for c in columnas) + "</tr>")
+            for fila in filas:
+                partes.append("<tr>" + "".join(
+                    f"<td>{html.escape(fila[c])}</td>" if isinstance(fila[c], str)
+                    else f'<td class="n">{html.escape(_texto(fila[c], c))}</td>' for c in columnas) + "</tr>")
+            partes.append("</table>")
+    partes.append("</body></html>")
+    with open(ruta, "w", encoding="utf-8") as f:
+        f.write("\n".join(partes))
+
+
+def escribir_xlsx(informe, ruta, titulo="Informe de análisis sensorial"):
+    import xlsxwriter
+
+    libro = xlsxwriter.Workbook(ruta, {"nan_inf_to_errors": True})
+    try:
+        negrita = libro.add_format({"bold": True})
+        encabezado = libro.add_format({"bold": True, "bg_color": "#c3e6cb", "border": 1})
+        cifras = {d: libro.add_format({"num_format": "0" + ("." + "0" * d if d else "")}) for d in (0, 1, 2, 4)}
+        usadas = set()
+        for estudio, n, secciones in informe:
+            # Nombres de hoja: hasta 31 caracteres, sin []:*?/\ y sin repetir
+            nombre = re.sub(r"[\[\]:*?/\\]", "_", estudio)[:31]
+            while nombre.lower() in usadas:
+                nombre = nombre[:28] + f"_{len(usadas)}"
+            usadas.add(nombre.lower())
+            hoja = libro.add_worksheet(nombre)
+            hoja.write(0, 0, f"{titulo}: {estudio}", negrita)
+            hoja.write(1, 0, f"{n} respuestas")
+            fila_actual = 3
+            for subtitulo, filas in secciones:
+                columnas = list(filas[0])
+                hoja.write(fila_actual, 0, subtitulo, negrita)
+                hoja.write_row(fila_actual + 1, 0, columnas, encabezado)
+                for i, fila in enumerate(filas, start=fila_actual + 2):
+                    for j, columna in enumerate(columnas):
+                        valor = fila[columna]
+                        if isinstance(valor, str) or valor is None:
+                            hoja.write(i, j, valor)
+                        else:
+                            hoja.write_number(i, j, valor, cifras[_formato(columna)])
+                fila_actual += len(filas) + 3
+            hoja.set_column(0, 1, 24)
+            hoja.set_column(2, 10, 12)
+    finally:
+        libro.close()
+
+
+ESCRITORES = {".html": escribir_html, ".xlsx": escribir_xlsx}
+
+
+def informe(origen, estudios=None, procesos=None, memoria_mb=256, confianza=0.95, informar=print):
+    """``[(estudio, respuestas, tablas)]`` del ``origen``."""
+    return [(estudio, conteos.n, tablas(conteos, confianza))
+            for estudio, conteos in contar(origen, estudios, procesos, memoria_mb, informar).items()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("origen", help="Carpeta de un dataset Parquet o URL de un almacén")
+    parser.add_argument("--estudios", nargs="+", help="Estudios a analizar (por defecto, todos)")
+    parser.add_argument("--salida", nargs="+", default=["informe_sensorial.html"],
+                        help="Archivos de salida (.html o .xlsx)")
+    parser.add_argument("--procesos", type=int, help="Procesos de lectura (por defecto, uno por CPU)")
+    parser.add_argument("--memoria-mb", type=float, default=256,
+                        help="Memoria para los bloques en vuelo de todos los procesos")
+    parser.add_argument("--confianza", type=float, default=0.95, help="Nivel de los intervalos de confianza")
+    args = parser.parse_args()
+    for ruta in args.salida:
+        if os.path.splitext(ruta)[1].lower() not in ESCRITORES:
+            parser.error(f"Formato de salida desconocido: {ruta} (use .html o .xlsx)")
+
+    inicio = time.perf_counter()
+    resultado = informe(args.origen, args.estudios, args.procesos, args.memoria_mb, args.confianza)
+    segundos = time.perf_counter() - inicio
+    if not resultado:
+        print("No hay respuestas para analizar")
+        sys.exit(1)
+    for ruta in args.salida:
+        ESCRITORES[os.path.splitext(ruta)[1].lower()](resultado, ruta)
+    filas = sum(n for _, n, _ in resultado)
+    print(f"{'estudios':>8} {'respuestas':>11} {'segundos':>9} {'filas/s':>9}")
+    print(f"{len(resultado):>8} {filas:>11} {segundos:>9.2f} {filas / segundos:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
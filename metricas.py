@@ -0,0 +1,238 @@
+"""
+Instrumentación por sección de las apps.
+
+``medir("seccion")`` (context manager) y ``@medido("seccion")`` (decorador)
+registran la duración de cada sección en histogramas en memoria, uno por
+proceso y otro por sesión de Streamlit. ``exposicion()`` los devuelve en el
+formato de texto de Prometheus; ``iniciar_endpoint()`` los publica en un
+endpoint HTTP local (``/metrics`` en el puerto ``KEPCHUP_METRICAS_PUERTO``) y
+las apps los muestran en una pestaña oculta de administración (``?admin=1``).
+
+Está desactivada salvo que ``KEPCHUP_METRICAS=1``. Desactivada, ``medido``
+devuelve la función original y ``medir`` un context manager vacío
+compartido: el costo es una llamada a función.
+"""
+import bisect
+import contextlib
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+ACTIVO = os.environ.get("KEPCHUP_METRICAS") == "1"
+
+# Límites de los buckets (segundos), como los de los clientes de Prometheus
+LIMITES = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_SESIONES = 200
+
+_NULO = contextlib.nullcontext()
+
+
+class Histograma:
+    """Conteos por bucket, suma y cantidad de observaciones."""
+
+    __slots__ = ("conteos", "suma", "n")
+
+    def __init__(self):
+        self.conteos = [0] * (len(LIMITES) + 1)
+        self.suma = 0.0
+        self.n = 0
+
+    def observar(self, segundos):
+        self.conteos[bisect.bisect_left(LIMITES, segundos)] += 1
+        self.suma += segundos
+        self.n += 1
+
+    def cuantil(self, q):
+        """Estimación por interpolación dentro del bucket (como ``histogram_quantile``)."""
+        if self.n == 0:
+            return float("nan")
+        objetivo = q * self.n
+        acumulado = 0
+        for i, conteo in enumerate(self.conteos):
+            if acumulado + conteo >= objetivo and conteo:
+                if i == len(LIMITES):
+                    return LIMITES[-1]
+                inferior = LIMITES[i - 1] if i else 0.0
+                return inferior + (LIMITES[i] - inferior) * (objetivo - acumulado) / conteo
+            acumulado += conteo
+        return LIMITES[-1]
+
+
+class RegistroMetricas:
+    """Histogramas por (app, sección) del proceso y por sesión."""
+
+    def __init__(self, max_sesiones=MAX_SESIONES):
+        self.max_sesiones = max_sesiones
+        self._lock = threading.Lock()
+        self.proceso = {}
+        # sesión -> {(app, sección): Histograma}; se descartan las más viejas
+        self.sesiones = OrderedDict()
+
+    def observar(self, app, seccion, segundos, sesion=None):
+        clave = (app, seccion)
+        with self._lock:
+            histograma = self.proceso.get(clave)
+            if histograma is None:
+                histograma = self.proceso[clave] = Histograma()
+            histograma.observar(segundos)
+            if sesion is None:
+                return
+            propias = self.sesiones.get(sesion)
+            if propias is None:
+                propias = self.sesiones[sesion] = {}
+                if len(self.sesiones) > self.max_sesiones:
+                    self.sesiones.popitem(last=False)
+            else:
+                self.sesiones.move_to_end(sesion)
+            histograma = propias.get(clave)
+            if histograma is None:
+                histograma = propias[clave] = Histograma()
+            histograma.observar(segundos)
+
+    def resumen(self, sesion=None):
+        """Filas (app, sección, n, media, p50, p95) para mostrar en una tabla."""
+        with self._lock:
+            origen = self.proceso if sesion is None else self.sesiones.get(sesion, {})
+            return [
+                {"app": app, "sección": seccion, "n": h.n, "media (ms)": h.suma / h.n * 1e3,
+                 "p50 (ms)": h.cuantil(0.5) * 1e3, "p95 (ms)": h.cuantil(0.95) * 1e3}
+                for (app, seccion), h in sorted(origen.items())
+            ]
+
+    def exposicion(self):
+        """Texto en formato de exposición de Prometheus."""
+        lineas = []
+        with self._lock:
+            _serie(lineas, "kepchup_seccion_segundos", "Duración de cada sección de las apps.",
+                   [((("app", a), ("seccion", s)), h) for (a, s), h in sorted(self.proceso.items())])
+            _serie(lineas, "kepchup_sesion_seccion_segundos", "Duración de cada sección, por sesión.",
+                   [((("app", a), ("seccion", s), ("sesion", sesion)), h)
+                    for sesion, propias in self.sesiones.items() for (a, s), h in sorted(propias.items())])
+        return "\n".join(lineas) + "\n"
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _etiquetas(pares):
+    return ",".join(f'{k}="{_escapar(v)}"' for k, v in pares)
+
+
+def _serie(lineas, nombre, ayuda, histogramas):
+    lineas.append(f"# HELP {nombre} {ayuda}")
+    lineas.append(f"# TYPE {nombre} histogram")
+    for pares, h in histogramas:
+        acumulado = 0
+        for limite, conteo in zip(LIMITES + ("+Inf",), h.conteos):
+            acumulado += conteo
+            lineas.append(f"{nombre}_bucket{{{_etiquetas(pares + (('le', limite),))}}} {acumulado}")
+        lineas.append(f"{nombre}_sum{{{_etiquetas(pares)}}} {h.suma}")
+        lineas.append(f"{nombre}_count{{{_etiquetas(pares)}}} {h.n}")
+
+
+registro = RegistroMetricas()
+
+
+def _contexto():
+    # App y sesión de Streamlit del hilo actual (None fuera de un script,
+    # por ejemplo en la función diferida de una descarga).
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is None:
+        return None, None
+    return os.path.basename(ctx.main_script_path), ctx.session_id
+
+
+@contextlib.contextmanager
+def _medir(seccion, app):
+    app_actual, sesion = _contexto()
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registro.observar(app or app_actual or "", seccion, time.perf_counter() - inicio, sesion)
+
+
+def medir(seccion, app=None):
+    """Context manager que mide el bloque como ``seccion``."""
+    if not ACTIVO:
+        return _NULO
+    return _medir(seccion, app)
+
+
+def medido(seccion, app=None):
+    """Decorador que mide cada llamada a la función como ``seccion``."""
+    def decorador(funcion):
+        if not ACTIVO:
+            return funcion
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with _medir(seccion, app):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def exposicion():
+    return registro.exposicion()
+
+
+_servidor = None
+_lock_servidor = threading.Lock()
+
+
+def iniciar_endpoint():
+    """Levanta el endpoint una sola vez por proceso si ``KEPCHUP_METRICAS_PUERTO`` está definido."""
+    global _servidor
+    puerto = os.environ.get("KEPCHUP_METRICAS_PUERTO")
+    if not ACTIVO or not puerto:
+        return None
+    with _lock_servidor:
+        if _servidor is None:
+            _servidor = servir(int(puerto))
+    return _servidor
+
+
+def servir(puerto, host="127.0.0.1"):
+    """Publica ``/metrics`` en un hilo de fondo y devuelve el servidor."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Manejador(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            cuerpo = exposicion().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer((host, puerto), Manejador)
+    threading.Thread(target=servidor.serve_forever, name="metricas-http", daemon=True).start()
+    return servidor
+
+
+def mostrar_admin():
+    """Panel de administración con las métricas del proceso y de la sesión."""
+    import streamlit as st
+
+    if not ACTIVO:
+        st.info("Las métricas están desactivadas (KEPCHUP_METRICAS=1 para activarlas).")
+        return
+    _, sesion = _contexto()
+    st.subheader("Esta sesión")
+    st.dataframe(registro.resumen(sesion))
+    st.subheader("Proceso")
+    st.dataframe(registro.resumen())
+    with st.expander("Formato Prometheus"):
+        st.code(exposicion(), language="text")
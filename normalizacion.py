@@ -0,0 +1,226 @@
+"""
+Normalización de las respuestas libres de frecuencia y cantidad.
+
+La frecuencia de consumo y la cantidad mensual se responden con texto libre
+("2 veces por semana", "todos los días", "medio kilo", "3 frascos al mes"),
+que no se puede agregar. Las preguntas con ``"normalizar"`` en el esquema
+agregan columnas numéricas derivadas:
+
+- ``"frecuencia"`` -> "<columna> (veces por semana)";
+- ``"cantidad"`` -> "<columna> (por mes)" y "<columna> (unidad)", en gramos
+  ("g", con ml y litros como gramos) o en envases ("unidades").
+
+Las reglas son expresiones regulares compiladas una vez, que se prueban en
+orden sobre el texto sin tildes y en minúsculas (``duplicados.normalizar``);
+la primera que coincide da el valor y un texto que no coincide con ninguna
+queda vacío. Se aceptan números con coma decimal, fracciones ("1/2"),
+rangos ("2-3", "2 a 3": se toma el promedio), números en palabras ("una",
+"medio"), "2 y medio" y "1 kilo y medio". La cantidad se pasa a meses según el
+período ("por día", "a la semana", "al año", "cada 2 meses", "cada 15 días");
+si nombra un período que no se conoce ("por temporada") queda vacía.
+
+Cada texto distinto se interpreta una sola vez (``lru_cache``): al guardar una
+respuesta (``esquema.registro``) el costo es una consulta a la memoria, y
+sobre columnas enteras (exportaciones históricas) ``normalizar_serie``
+factoriza la columna, interpreta solo los valores distintos y reparte los
+resultados con un ``take`` de NumPy, de modo que el costo depende de la
+cantidad de respuestas distintas y no de filas.
+
+Uso por lotes sobre exportaciones ya descargadas::
+
+    python normalizacion.py evaluacion_sensorial_20240501.xlsx [--esquema evaluacion_sensorial]
+
+escribe ``evaluacion_sensorial_20240501_normalizado.xlsx`` con las columnas
+derivadas.
+"""
+import argparse
+import functools
+import os
+import re
+
+from duplicados import normalizar
+
+# Números en palabras (ya sin tildes)
+_PALABRAS = {"un": 1, "una": 1, "uno": 1, "dos": 2, "tres": 3, "cuatro": 4, "cinco": 5, "seis": 6,
+             "siete": 7, "ocho": 8, "nueve": 9, "diez": 10, "medio": 0.5, "media": 0.5}
+_NUMERO = r"(?:\d+/\d+|\d+(?:[.,]\d+)?|" + "|".join(sorted(_PALABRAS, key=len, reverse=True)) + r")"
+# Un número ("2", "2 y medio") o un rango "2-3" / "2 a 3" / "2 o 3"
+_RANGO = rf"(?P<n>{_NUMERO})(?P<y_medio>\s*y\s*medi[oa])?(?:\s*(?:-|a|o)\s*(?P<m>{_NUMERO}))?"
+_VECES = r"(?:\s*(?:veces|vez|dias?))?\s*"
+_POR = r"(?:al|por|a la|cada|en la|en el|x|/)\s*"
+
+# Días, semanas y meses por período (para pasar a semanas o a meses)
+_SEMANAS_POR_MES = 52 / 12
+_DIAS_POR_MES = 365 / 12
+
+# (expresión, veces por semana: número o función del número encontrado)
+REGLAS_FRECUENCIA = [(re.compile(patron), valor) for patron, valor in (
+    (r"\b(?:nunca|jamas|ninguna|no consum)", 0.0),
+    (rf"\b{_RANGO}{_VECES}{_POR}dia\b", lambda n: 7 * n),
+    (rf"\b{_RANGO}{_VECES}{_POR}semana", lambda n: n),
+    (rf"\b{_RANGO}{_VECES}{_POR}mes\b", lambda n: n / _SEMANAS_POR_MES),
+    (rf"\b{_RANGO}{_VECES}{_POR}ano\b", lambda n: n / 52),
+    (rf"\bcada\s*{_RANGO}\s*dias\b", lambda n: 7 / n),
+    (rf"\bcada\s*{_RANGO}\s*semanas\b", lambda n: 1 / n),
+    (rf"\bcada\s*{_RANGO}\s*meses\b", lambda n: 1 / (n * _SEMANAS_POR_MES)),
+    (r"\b(?:todos los dias|diari[oa]|a diario|cada dia)", 7.0),
+    (r"\b(?:semanal|cada semana|una vez por semana)", 1.0),
+    (r"\bquincenal", 0.5),
+    (r"\b(?:mensual|cada mes)", 1 / _SEMANAS_POR_MES),
+)]
+
+# (unidad, gramos o envases por unidad)
+_UNIDADES = (
+    (r"(?:kg|kgs|kilos?|kilogramos?)", "g", 1000.0),
+    (r"(?:g|gr|grs|gramos?)", "g", 1.0),
+    (r"(?:l|lt|lts|litros?)", "g", 1000.0),
+    (r"(?:ml|cc|mililitros?)", "g", 1.0),
+    (r"(?:frascos?|potes?|botellas?|sobres?|sachets?|unidades?|envases?|tarros?|pomos?|doypacks?|bolsas?|latas?)",
+     "unidades", 1.0),
+)
+# Período de la cantidad: "por semana", "cada 2 meses", "al año"; ``otro`` es
+# una palabra después de "por", "cada"... que no es un período conocido
+_PERIODO = (rf"(?:\s*(?:{_POR})(?:(?:(?P<periodos>{_NUMERO})\s*)?"
+            r"(?P<periodo>dias?|semanas?|quincenas?|mes(?:es)?|anos?)\b|(?P<otro>[a-z]+)))?")
+
+# (expresión, unidad, factor); el período opcional pasa la cantidad a meses
+REGLAS_CANTIDAD = [(re.compile(rf"\b{_RANGO}\s*(?:de\s*)?{patron}\b(?P<medio>\s*y\s*medi[oa])?{_PERIODO}"),
+                    unidad, factor)
+                   for patron, unidad, factor in _UNIDADES]
+# Veces por mes de cada período (singular y plural)
+_POR_MES = {None: 1.0, "mes": 1.0, "meses": 1.0, "semana": _SEMANAS_POR_MES, "semanas": _SEMANAS_POR_MES,
+            "dia": _DIAS_POR_MES, "dias": _DIAS_POR_MES, "quincena": 2.0, "quincenas": 2.0,
+            "ano": 1 / 12, "anos": 1 / 12}
+
+# Columnas derivadas de cada normalización: (sufijo, tipo)
+DERIVADAS = {
+    "frecuencia": ((" (veces por semana)", "float64"),),
+    "cantidad": ((" (por mes)", "float64"), (" (unidad)", "texto")),
+}
+
+
+def _numero(texto):
+    if texto in _PALABRAS:
+        return float(_PALABRAS[texto])
+    if "/" in texto:
+        numerador, denominador = texto.split("/")
+        return int(numerador) / int(denominador) if int(denominador) else None
+    return float(texto.replace(",", "."))
+
+
+def _valor(coincidencia):
+    n = _numero(coincidencia.group("n"))
+    m = coincidencia.group("m")
+    if n is None:
+        return None
+    if coincidencia.group("y_medio"):  # "2 y medio"
+        n += 0.5
+    return n if m is None or _numero(m) is None else (n + _numero(m)) / 2
+
+
+@functools.lru_cache(maxsize=4096)
+def frecuencia(texto):
+    """``(veces por semana,)`` de una respuesta libre (``(None,)`` si no se reconoce)."""
+    texto = normalizar(texto)
+    for expresion, valor in REGLAS_FRECUENCIA:
+        coincidencia = expresion.search(texto)
+        if coincidencia is None:
+            continue
+        if not callable(valor):
+            return (valor,)
+        n = _valor(coincidencia)
+        try:
+            return (None,) if n is None else (round(valor(n), 3),)
+        except ZeroDivisionError:  # "cada 0 días"
+            return (None,)
+    return (None,)
+
+
+@functools.lru_cache(maxsize=4096)
+def cantidad(texto):
+    """``(cantidad por mes, "g" o "unidades")`` de una respuesta libre (``(None, "")`` si no se reconoce)."""
+    texto = normalizar(texto)
+    for expresion, unidad, factor in REGLAS_CANTIDAD:
+        coincidencia = expresion.search(texto)
+        if coincidencia is None:
+            continue
+        n = _valor(coincidencia)
+        if n is None or coincidencia.group("otro"):  # "por temporada": no se sabe pasar a meses
+            return None, ""
+        if coincidencia.group("medio"):  # "1 kilo y medio"
+            n += 0.5
+        por_mes = _POR_MES[coincidencia.group("periodo")]
+        periodos = coincidencia.group("periodos")
+        if periodos is not None:  # "cada 2 meses"
+            periodos = _numero(periodos)
+            if not periodos:
+                return None, ""
+            por_mes /= periodos
+        return round(n * factor * por_mes, 3), unidad
+    return None, ""
+
+
+INTERPRETES = {"frecuencia": frecuencia, "cantidad": cantidad}
+
+
+def normalizar_serie(serie, tipo):
+    """
+    Columnas derivadas (lista de arreglos, en el orden de ``DERIVADAS[tipo]``)
+    de una serie de pandas con las respuestas libres.
+    """
+    import numpy as np
+    import pandas as pd
+
+    interpretar = INTERPRETES[tipo]
+    codigos, distintos = pd.factorize(serie)
+    resultados = [interpretar(valor) for valor in distintos]
+    columnas = []
+    for i, (_, tipo_columna) in enumerate(DERIVADAS[tipo]):
+        # El último elemento es el valor de los faltantes (código -1)
+        if tipo_columna == "float64":
+            tabla = np.array([np.nan if r[i] is None else r[i] for r in resultados] + [np.nan])
+        else:
+            tabla = np.array([r[i] for r in resultados] + [""], dtype=object)
+        columnas.append(tabla[codigos])
+    return columnas
+
+
+def normalizar_frame(df, esquema):
+    """Copia de ``df`` con las columnas derivadas de las preguntas con ``normalizar`` del esquema."""
+    df = df.copy(deep=False)
+    for columna, tipo, derivadas in esquema.normalizadas:
+        if columna in df:
+            for derivada, valores in zip(derivadas, normalizar_serie(df[columna], tipo)):
+                df[derivada] = valores
+    return df
+
+
+def main():
+    from esquema import cargar_esquema
+    from exportar import EXPORTADORES, exportar, filas_de_frame, tipos_de_frame
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("archivos", nargs="+", help="Exportaciones (xlsx, csv, jsonl o parquet)")
+    parser.add_argument("--esquema", default="evaluacion_sensorial")
+    args = parser.parse_args()
+    esquema = cargar_esquema(args.esquema)
+
+    import pandas as pd
+
+    lectores = {"xlsx": pd.read_excel, "csv": pd.read_csv, "parquet": pd.read_parquet,
+                "jsonl": functools.partial(pd.read_json, lines=True)}
+    for archivo in args.archivos:
+        base, extension = os.path.splitext(archivo)
+        formato = extension.lstrip(".").lower()
+        if formato not in EXPORTADORES:
+            parser.error(f"Formato no soportado: {archivo}")
+        df = normalizar_frame(lectores[formato](archivo), esquema)
+        # Tipos de Parquet: los del esquema y, para las columnas que no conoce, los que leyó pandas
+        tipos = {**tipos_de_frame(df), **{c: t for c, t in esquema.tipos_columnas.items() if c in df}}
+        df = df.astype(object).where(df.notna(), None)  # celdas vacías (no NaN) en la salida
+        destino = exportar(filas_de_frame(df), f"{base}_normalizado{extension}", formato, list(df.columns), tipos)
+        print(f"{archivo} -> {destino} ({len(df)} filas)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Representación compacta y tipada de las respuestas de una encuesta.
+
+Cada respuesta guardada es un diccionario de 20 a 30 claves con etiquetas en
+castellano repetidas ("Sí", "No", "Femenino", ...). ``CodecRegistro`` deriva
+del esquema un tipo por columna:
+
+- sí/no (``casilla`` y preguntas con opciones Sí/No) -> ``bool`` (un byte,
+  el mismo tipo que usa pandas);
+- demás opciones (``opcion``/``lista``) -> código chico sobre la tabla de
+  etiquetas de la pregunta, compartida por todas las respuestas;
+- ``numero`` entero entre 0 y 255 (la edad) -> ``uint8``;
+- texto libre -> cadena internada.
+
+Las respuestas de una sesión se guardan por columnas en un
+``BufferColumnar`` y se ven como DataFrame con columnas ``bool``, ``uint8`` y
+categóricas sin copiar los arreglos. Las etiquetas de las columnas booleanas
+solo se vuelven a armar al mostrar (``presentar``).
+"""
+import functools
+import math
+
+SI_NO = ("Sí", "No")
+
+
+def _a_float(valor):
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _a_int64(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return -1
+
+
+def _a_uint8(valor):
+    try:
+        return min(max(int(valor), 0), 255)
+    except (TypeError, ValueError):
+        return 0
+
+
+# tipo compacto -> conversión desde el valor guardado (con etiquetas)
+_CONVERSIONES = {
+    "float64": _a_float,
+    "int64": _a_int64,
+    "uint8": _a_uint8,
+    "bool": lambda valor: valor == SI_NO[0],
+    "texto": lambda valor: "" if valor is None else valor,
+    "categoria": lambda valor: valor,
+}
+
+
+class CodecRegistro:
+    """Tipos compactos de las columnas de un esquema y conversiones."""
+
+    def __init__(self, esquema):
+        self.tipos = {}
+        self.etiquetas = {}
+        for columna, tipo in esquema.tipos_columnas.items():
+            self.tipos[columna] = tipo if tipo in ("float64", "int64") else "texto"
+        for pregunta in esquema.preguntas.values():
+            columna = pregunta.get("columna")
+            if columna is None:
+                continue
+            tipo = pregunta["tipo"]
+            opciones = pregunta.get("opciones")
+            if tipo == "casilla" or (opciones and sorted(opciones) == sorted(SI_NO)):
+                self.tipos[columna] = "bool"
+            elif tipo in ("opcion", "lista"):
+                self.tipos[columna] = "categoria"
+                self.etiquetas[columna] = list(opciones)
+            elif (tipo == "numero" and pregunta.get("minimo", 0) >= 0 and pregunta.get("maximo", 256) <= 255
+                  and isinstance(pregunta.get("paso", 1), int)):
+                self.tipos[columna] = "uint8"
+        self.booleanas = [c for c, t in self.tipos.items() if t == "bool"]
+
+    def coleccion(self, capacidad=64):
+        from buffer_columnar import BufferColumnar  # numpy solo en el camino de los datos
+
+        return BufferColumnar(self.tipos, capacidad, self.etiquetas)
+
+    def agregar(self, coleccion, registro):
+        """
+        Agrega a ``coleccion`` una respuesta con etiquetas. Tolera respuestas
+        guardadas con una versión anterior del esquema (columnas faltantes o
+        de otro tipo).
+        """
+        coleccion.append({c: _CONVERSIONES[t](registro.get(c, "")) for c, t in self.tipos.items()})
+
+    def presentar(self, df):
+        """Vuelve a poner "Sí"/"No" en las columnas booleanas de ``df`` (solo para mostrar)."""
+        booleanas = [c for c in self.booleanas if c in df]
+        if not booleanas:
+            return df
+        df = df.copy(deep=False)
+        for columna in booleanas:
+            df[columna] = df[columna].map({True: SI_NO[0], False: SI_NO[1]})
+        return df
+
+
+@functools.lru_cache(maxsize=None)
+def codec_para(esquema):
+    """Codec de un esquema compilado (uno por proceso, como el esquema)."""
+    return CodecRegistro(esquema)
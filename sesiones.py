@@ -0,0 +1,200 @@
+"""
+Registro de sesiones: memoria por sesión y desalojo de las inactivas.
+
+En un evento los kioscos dejan las sesiones del navegador abiertas todo el
+día, y cada una guarda sus datos en ``st.session_state`` (las respuestas de
+``app0.py``, la copia en columnas de ``app.py``/``app5.py``). Una sesión
+abandonada retiene esa memoria hasta que se reinicia el servidor.
+
+Cada ejecución del script llama a ``tocar()`` con los objetos que la sesión
+retiene y una función ``liberar`` que los guarda en el almacén durable y
+los vacía. El registro (uno por proceso, como ``metricas``) recuerda cuándo
+se usó cada sesión y estima sus bytes; cada ``intervalo`` segundos, en la
+ejecución de cualquier sesión:
+
+- desaloja las sesiones sin uso durante ``inactividad`` segundos
+  (``KEPCHUP_INACTIVIDAD``, por defecto 1800);
+- si el total supera el presupuesto del proceso (``KEPCHUP_MEMORIA_MB``, por
+  defecto 256), desaloja además las menos usadas recientemente (nunca la
+  que está ejecutando ni una usada en los últimos ``minimo`` segundos).
+
+Desalojar es llamar a ``liberar`` y olvidar la sesión; si vuelve, ``tocar``
+devuelve True para que la app recargue sus datos del almacén. La pestaña de
+administración (``?admin=1``) muestra las sesiones y la memoria.
+"""
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+PRESUPUESTO = int(float(os.environ.get("KEPCHUP_MEMORIA_MB", "256")) * 2**20)
+INACTIVIDAD = float(os.environ.get("KEPCHUP_INACTIVIDAD", "1800"))
+MAX_DESALOJADAS = 10_000
+
+
+class Sesion:
+    __slots__ = ("id", "app", "objetos", "liberar", "visto", "bytes")
+
+    def __init__(self, id, app):
+        self.id = id
+        self.app = app
+        self.objetos = ()
+        self.liberar = None
+        self.visto = 0.0
+        self.bytes = 0
+
+
+class RegistroSesiones:
+    """Sesiones del proceso, de la usada menos recientemente a la más reciente."""
+
+    def __init__(self, presupuesto=PRESUPUESTO, inactividad=INACTIVIDAD, intervalo=10.0, minimo=30.0,
+                 reloj=time.monotonic):
+        self.presupuesto = presupuesto
+        self.inactividad = inactividad
+        self.intervalo = intervalo
+        self.minimo = minimo
+        self.reloj = reloj
+        self.desalojos = 0
+        self._lock = threading.Lock()
+        self._sesiones = OrderedDict()
+        self._desalojadas = OrderedDict()
+        self._ultimo_barrido = reloj()
+
+    def tocar(self, sesion, app, objetos, liberar):
+        """
+        Registra el uso de ``sesion`` con los ``objetos`` que retiene y la
+        función que los libera. Devuelve True si la sesión fue desalojada
+        desde su uso anterior (sus objetos ya están vacíos).
+        """
+        ahora = self.reloj()
+        with self._lock:
+            desalojada = self._desalojadas.pop(sesion, None) is not None
+            entrada = self._sesiones.get(sesion)
+            if entrada is None:
+                entrada = self._sesiones[sesion] = Sesion(sesion, app)
+            else:
+                self._sesiones.move_to_end(sesion)
+            entrada.app = app
+            entrada.objetos = tuple(objetos)
+            entrada.liberar = liberar
+            entrada.visto = ahora
+            barrer = ahora - self._ultimo_barrido >= self.intervalo
+        if barrer:
+            self.barrer(excepto=sesion)
+        return desalojada
+
+    def barrer(self, excepto=None):
+        """Vuelve a medir las sesiones y desaloja las inactivas y las que excedan el presupuesto."""
+        ahora = self.reloj()
+        with self._lock:
+            self._ultimo_barrido = ahora
+            entradas = list(self._sesiones.values())
+        total = 0
+        for entrada in entradas:
+            entrada.bytes = sum(tamano(objeto) for objeto in entrada.objetos)
+            total += entrada.bytes
+        for entrada in entradas:  # de la menos reciente a la más reciente
+            if entrada.id == excepto:
+                continue
+            inactiva = ahora - entrada.visto
+            if ((inactiva >= self.inactividad or (total > self.presupuesto and inactiva >= self.minimo))
+                    and self.desalojar(entrada.id)):
+                total -= entrada.bytes
+        return total
+
+    def desalojar(self, sesion):
+        """Guarda y libera los datos de ``sesion`` y la olvida; devuelve si se desalojó."""
+        with self._lock:
+            entrada = self._sesiones.pop(sesion, None)
+        if entrada is None:
+            return False
+        try:
+            entrada.liberar()
+        except Exception:
+            # No se pudo guardar (por ejemplo, el almacén no responde): la
+            # sesión conserva sus datos y se reintenta en el próximo barrido.
+            with self._lock:
+                self._sesiones.setdefault(sesion, entrada)
+                self._sesiones.move_to_end(sesion, last=False)
+            return False
+        with self._lock:
+            self._desalojadas[sesion] = True
+            if len(self._desalojadas) > MAX_DESALOJADAS:
+                self._desalojadas.popitem(last=False)
+            self.desalojos += 1
+        return True
+
+    def total(self):
+        with self._lock:
+            return sum(entrada.bytes for entrada in self._sesiones.values())
+
+    def resumen(self):
+        """Filas (sesión, app, MiB, inactiva) de la más reciente a la menos reciente."""
+        ahora = self.reloj()
+        with self._lock:
+            entradas = list(reversed(self._sesiones.values()))
+        return [{"sesión": entrada.id[:8], "app": entrada.app, "memoria (MiB)": round(entrada.bytes / 2**20, 2),
+                 "inactiva (s)": round(ahora - entrada.visto)} for entrada in entradas]
+
+    def __len__(self):
+        return len(self._sesiones)
+
+
+def tamano(objeto, vistos=None):
+    """
+    Bytes aproximados de ``objeto`` y lo que referencia: ``nbytes`` si lo
+    define (arreglos, ``BufferColumnar``) y si no ``sys.getsizeof`` recorriendo
+    contenedores y atributos.
+    """
+    vistos = set() if vistos is None else vistos
+    if id(objeto) in vistos:
+        return 0
+    vistos.add(id(objeto))
+    nbytes = getattr(objeto, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    bytes_ = sys.getsizeof(objeto)
+    if isinstance(objeto, (str, bytes, int, float, bool, type(None))):
+        return bytes_
+    if isinstance(objeto, dict):
+        return bytes_ + sum(tamano(k, vistos) + tamano(v, vistos) for k, v in objeto.items())
+    if isinstance(objeto, (list, tuple, set, frozenset)):
+        return bytes_ + sum(tamano(v, vistos) for v in objeto)
+    if hasattr(objeto, "__dict__"):
+        bytes_ += tamano(vars(objeto), vistos)
+    for atributo in getattr(type(objeto), "__slots__", ()):
+        bytes_ += tamano(getattr(objeto, atributo, None), vistos)
+    return bytes_
+
+
+registro = RegistroSesiones()
+
+
+def _sesion_actual():
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return None if ctx is None else ctx.session_id
+
+
+def tocar(app, objetos, liberar):
+    """``registro.tocar`` con la sesión de Streamlit que está ejecutando."""
+    sesion = _sesion_actual()
+    if sesion is None:
+        return False
+    return registro.tocar(sesion, app, objetos, liberar)
+
+
+def mostrar_admin():
+    """Sesiones del proceso y memoria que retienen."""
+    import streamlit as st
+
+    total = registro.barrer(excepto=_sesion_actual())
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Sesiones activas", len(registro))
+    col2.metric("Memoria de sesiones", f"{total / 2**20:.1f} MiB",
+                help=f"Presupuesto del proceso: {registro.presupuesto / 2**20:.0f} MiB")
+    col3.metric("Desalojadas", registro.desalojos,
+                help=f"Sesiones sin uso durante {registro.inactividad:.0f} s o por exceder el presupuesto")
+    st.dataframe(registro.resumen())
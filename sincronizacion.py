@@ -0,0 +1,388 @@
+"""
+Sincronización de las respuestas con un colector central.
+
+En las degustaciones la conexión suele ser mala: cada kiosco sigue guardando
+en su almacén local y un hilo de fondo envía después las respuestas a un
+colector central.
+
+- Bandeja de salida: la propia tabla del almacén, cuyos ids solo crecen. La
+  marca de agua (id de la última fila que el colector confirmó) se guarda en
+  el almacén (``confirmar_envio``), de modo que un reinicio retoma donde
+  quedó y lo pendiente nunca se pierde.
+- Lotes de hasta ``tam_lote`` filas en JSON Lines comprimidas con gzip. La
+  marca avanza solo con el acuse del colector.
+- Si el envío falla (sin conexión, colector caído, respuesta distinta de
+  200), se reintenta con espera exponencial con jitter, de ``espera_minima``
+  a ``espera_maxima`` segundos.
+- El colector guarda cada fila con un token de idempotencia con el origen
+  como prefijo (``"<origen>:<token del envío original>"`` o, si no tiene,
+  ``"<origen>#<id>"``): reenviar un lote cuyo acuse se perdió no duplica
+  nada, y por lo mismo varios procesos del host pueden sincronizar la misma
+  base. Los tokens de los kioscos no son únicos entre kioscos (los de
+  ``importar.py`` son ``Estudio:Ficha:huella``, los de ``app0.py``
+  ``sesion:i``): sin el prefijo, dos kioscos con la misma ficha se pisarían.
+
+Las apps sincronizan en segundo plano si ``KEPCHUP_COLECTOR`` tiene la URL
+del colector (``KEPCHUP_ORIGEN`` identifica al kiosco, por defecto el nombre
+del host). La pestaña de administración muestra lotes, filas por segundo,
+pendientes y la demora de extremo a extremo (del guardado al acuse).
+
+Uso::
+
+    python sincronizacion.py colector [--host 127.0.0.1] [--puerto 8765] [--almacen sqlite:///datos/central.db]
+    python sincronizacion.py enviar --colector http://central:8765 [--almacen sqlite:///datos/respuestas.db]
+
+``KEPCHUP_COLECTOR_CLAVE`` (la misma en kioscos y colector) exige que los
+lotes lleguen con esa clave. El colector escucha por defecto solo en
+127.0.0.1 y no acepta otra interfaz (``--host 0.0.0.0``) sin clave; como habla
+HTTP sin cifrar, en una red compartida conviene ponerlo detrás de un proxy
+HTTPS.
+"""
+import argparse
+import gzip
+import hmac
+import ipaddress
+import json
+import os
+import random
+import socket
+import statistics
+import threading
+import time
+import zlib
+from collections import deque
+
+from almacen import abrir_almacen
+
+ORIGEN = os.environ.get("KEPCHUP_ORIGEN") or socket.gethostname()
+CLAVE = os.environ.get("KEPCHUP_COLECTOR_CLAVE")
+# Tamaño máximo de un lote ya descomprimido (el colector rechaza los mayores)
+MAX_LOTE_BYTES = 64 * 2**20
+
+
+class AcuseInvalido(ValueError):
+    """El colector respondió algo que no confirma el lote enviado."""
+
+
+def empaquetar(filas):
+    """Cuerpo comprimido de un lote de filas de ``almacen.pendientes`` y su tamaño sin comprimir."""
+    lineas = "".join(
+        json.dumps({"id": id_fila, "sesion": sesion, "token": token, "huella": huella, "respuesta": respuesta},
+                   ensure_ascii=False, default=str) + "\n"
+        for id_fila, sesion, token, huella, _, respuesta in filas
+    ).encode("utf-8")
+    return gzip.compress(lineas, compresslevel=6), len(lineas)
+
+
+def desempaquetar(cuerpo, maximo=MAX_LOTE_BYTES):
+    """Filas (diccionarios) de un cuerpo comprimido; ValueError si es inválido o excede ``maximo``."""
+    descompresor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        lineas = descompresor.decompress(cuerpo, maximo)
+    except zlib.error as error:
+        raise ValueError(f"Lote mal comprimido: {error}") from None
+    if descompresor.unconsumed_tail:
+        raise ValueError(f"El lote supera {maximo} bytes")
+    filas = [json.loads(linea) for linea in lineas.decode("utf-8").splitlines() if linea]
+    for numero, fila in enumerate(filas, 1):
+        validar_fila(fila, numero)
+    return filas
+
+
+def validar_fila(fila, numero):
+    """ValueError si la fila ``numero`` del lote no tiene la forma que envía ``empaquetar``."""
+    if not isinstance(fila, dict):
+        raise ValueError(f"Fila {numero}: no es un objeto")
+    if not isinstance(fila.get("id"), int) or isinstance(fila["id"], bool):
+        raise ValueError(f"Fila {numero}: falta el id o no es entero")
+    if not isinstance(fila.get("sesion"), str):
+        raise ValueError(f"Fila {numero}: falta la sesión")
+    if not isinstance(fila.get("respuesta"), dict):
+        raise ValueError(f"Fila {numero}: falta la respuesta")
+    for campo in ("token", "huella"):
+        if not isinstance(fila.get(campo), (str, type(None))):
+            raise ValueError(f"Fila {numero}: {campo} inválido")
+
+
+class Sincronizador:
+    """Envía a ``url`` las respuestas del almacén posteriores a la marca confirmada."""
+
+    def __init__(self, almacen, url, origen=ORIGEN, tam_lote=500, intervalo=5.0, espera_minima=1.0,
+                 espera_maxima=300.0, tiempo_espera=30.0, clave=CLAVE):
+        self.almacen = almacen
+        self.url = url.rstrip("/")
+        self.origen = origen
+        self.tam_lote = tam_lote
+        self.intervalo = intervalo
+        self.espera_minima = espera_minima
+        self.espera_maxima = espera_maxima
+        self.tiempo_espera = tiempo_espera
+        self.clave = clave
+        self.lotes = self.filas = self.bytes = self.bytes_json = 0
+        self.fallos = 0  # fallos seguidos (definen la espera)
+        self.reintentos = 0
+        self.segundos = 0.0  # tiempo total de los envíos confirmados
+        self.ultimo_error = None
+        self.demoras = deque(maxlen=1000)  # segundos del guardado al acuse, de las últimas filas
+        self._despertar = threading.Event()
+        self._activo = False
+        self._hilo = None
+
+    # ---- Envío ----
+    def _enviar(self, cuerpo):
+        from urllib.request import Request, urlopen
+
+        cabeceras = {"Content-Type": "application/x-ndjson", "Content-Encoding": "gzip",
+                     "X-Kepchup-Origen": self.origen}
+        if self.clave:
+            cabeceras["Authorization"] = f"Bearer {self.clave}"
+        pedido = Request(f"{self.url}/lote", data=cuerpo, headers=cabeceras, method="POST")
+        with urlopen(pedido, timeout=self.tiempo_espera) as respuesta:
+            return json.loads(respuesta.read())
+
+    def enviar_lote(self):
+        """Envía el próximo lote pendiente; devuelve cuántas filas confirmó el colector (0 si no había)."""
+        filas = self.almacen.pendientes(self.almacen.marca_envio(self.url), self.tam_lote)
+        if not filas:
+            return 0
+        cuerpo, bytes_json = empaquetar(filas)
+        inicio = time.perf_counter()
+        acuse = self._enviar(cuerpo)
+        if acuse.get("marca") != filas[-1][0]:
+            raise AcuseInvalido(f"Se esperaba la marca {filas[-1][0]} y el colector respondió {acuse!r}")
+        self.segundos += time.perf_counter() - inicio
+        self.almacen.confirmar_envio(self.url, filas[-1][0])
+        ahora = time.time()
+        self.demoras.extend(ahora - guardada for _, _, _, _, guardada, _ in filas if guardada is not None)
+        self.lotes += 1
+        self.filas += len(filas)
+        self.bytes += len(cuerpo)
+        self.bytes_json += bytes_json
+        return len(filas)
+
+    def drenar(self):
+        """Envía lotes hasta que no quede nada pendiente; devuelve las filas enviadas."""
+        total = 0
+        while True:
+            enviadas = self.enviar_lote()
+            total += enviadas
+            if enviadas < self.tam_lote:
+                return total
+
+    # ---- Hilo de fondo ----
+    def ejecutar(self):
+        espera = 0.0
+        while True:
+            self._despertar.wait(espera)
+            self._despertar.clear()
+            if not self._activo:
+                return
+            try:
+                enviadas = self.enviar_lote()
+            except Exception as error:
+                # Sin conexión, colector caído o acuse inválido: lo pendiente
+                # sigue en el almacén y se reintenta más tarde
+                self.fallos += 1
+                self.reintentos += 1
+                self.ultimo_error = f"{type(error).__name__}: {error}"
+                espera = min(self.espera_maxima, self.espera_minima * 2 ** (self.fallos - 1))
+                espera *= random.uniform(0.5, 1.0)
+                # Un lote rechazado (4xx) no se arregla reintentando enseguida: se
+                # espera el máximo y el error queda a la vista en la administración
+                if 400 <= getattr(error, "code", 0) < 500:
+                    espera = self.espera_maxima
+                continue
+            self.fallos = 0
+            self.ultimo_error = None
+            # Un lote lleno indica que hay más pendientes: se sigue sin esperar
+            espera = 0.0 if enviadas == self.tam_lote else self.intervalo
+
+    def iniciar(self):
+        if self._hilo is None or not self._hilo.is_alive():
+            self._activo = True
+            self._hilo = threading.Thread(target=self.ejecutar, name="sincronizacion", daemon=True)
+            self._hilo.start()
+        return self
+
+    def avisar(self):
+        """Hay respuestas nuevas: envía sin esperar el intervalo (salvo durante los reintentos)."""
+        if not self.fallos:
+            self._despertar.set()
+
+    def detener(self):
+        self._activo = False
+        self._despertar.set()
+        if self._hilo is not None:
+            self._hilo.join()
+
+    # ---- Estado ----
+    def pendientes(self):
+        """Filas guardadas que el colector aún no confirmó (aproximado: los ids pueden tener huecos)."""
+        return max(0, self.almacen.version() - self.almacen.marca_envio(self.url))
+
+    def resumen(self):
+        demoras = sorted(self.demoras)
+        return {
+            "pendientes": self.pendientes(),
+            "lotes": self.lotes,
+            "filas": self.filas,
+            "filas/s": round(self.filas / self.segundos) if self.segundos else None,
+            "compresión": round(self.bytes_json / self.bytes, 1) if self.bytes else None,
+            "demora p50 (s)": round(statistics.median(demoras), 2) if demoras else None,
+            "demora p95 (s)": round(demoras[int(0.95 * (len(demoras) - 1))], 2) if demoras else None,
+            "reintentos": self.reintentos,
+            "fallos seguidos": self.fallos,
+            "último error": self.ultimo_error,
+        }
+
+
+def iniciar(almacen, url=None):
+    """Sincronizador en segundo plano hacia ``url`` o ``KEPCHUP_COLECTOR`` (None si no hay colector)."""
+    url = url or os.environ.get("KEPCHUP_COLECTOR")
+    if not url:
+        return None
+    return Sincronizador(almacen, url).iniciar()
+
+
+def mostrar_admin(sincronizador):
+    """Estado de la sincronización con el colector central."""
+    import streamlit as st
+
+    if sincronizador is None:
+        st.info("Sin colector central (KEPCHUP_COLECTOR con su URL para sincronizar).")
+        return
+    resumen = sincronizador.resumen()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Pendientes", resumen["pendientes"])
+    col2.metric("Filas por segundo", resumen["filas/s"] or "–", help=f"{resumen['lotes']} lotes confirmados")
+    col3.metric("Demora p95", "–" if resumen["demora p95 (s)"] is None else f"{resumen['demora p95 (s)']} s",
+                help="Del guardado en el kiosco al acuse del colector")
+    if resumen["último error"]:
+        st.warning(f"{resumen['fallos seguidos']} envíos fallidos seguidos: {resumen['último error']}")
+    st.caption(f"Colector: {sincronizador.url} · origen: {sincronizador.origen}")
+
+
+# ---- Colector ----
+def ingerir(almacen, origen, filas):
+    """
+    Guarda un lote en el almacén central; devuelve el id (del kiosco) de la
+    última fila. Es idempotente: cada fila lleva su token.
+    """
+    for fila in filas:
+        token = f"{origen}:{fila['token']}" if fila.get("token") else f"{origen}#{fila['id']}"
+        almacen.append(f"{origen}/{fila['sesion']}", fila["respuesta"], esperar=False, token=token,
+                       huella=fila.get("huella"))
+    almacen.flush()
+    return filas[-1]["id"] if filas else 0
+
+
+def es_local(host):
+    """Si ``host`` es una dirección (o nombre) de loopback."""
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+    except (OSError, ValueError):
+        return False
+
+
+def colector(almacen, puerto=8765, host="127.0.0.1", clave=CLAVE):
+    """
+    Servidor HTTP (sin iniciar) que recibe lotes en ``POST /lote``.
+    ValueError si ``host`` no es local y no hay ``clave``.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    if not clave and not es_local(host):
+        raise ValueError(f"El colector no escucha en {host} sin clave: defina KEPCHUP_COLECTOR_CLAVE "
+                         "o use --host 127.0.0.1")
+
+    class Manejador(BaseHTTPRequestHandler):
+        def _responder(self, codigo, contenido):
+            cuerpo = json.dumps(contenido).encode("utf-8")
+            self.send_response(codigo)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/salud":
+                self.send_error(404)
+                return
+            self._responder(200, {"respuestas": almacen.count()})
+
+        def do_POST(self):
+            if self.path.split("?")[0] != "/lote":
+                self.send_error(404)
+                return
+            if clave and not hmac.compare_digest(self.headers.get("Authorization", ""), f"Bearer {clave}"):
+                self.send_error(401)
+                return
+            largo = int(self.headers.get("Content-Length") or 0)
+            if largo > MAX_LOTE_BYTES:
+                self.send_error(413)
+                return
+            origen = self.headers.get("X-Kepchup-Origen")
+            try:
+                if not origen:
+                    raise ValueError("Falta X-Kepchup-Origen")
+                filas = desempaquetar(self.rfile.read(largo))
+            except (ValueError, KeyError) as error:
+                self.send_error(400, str(error))
+                return
+            try:
+                marca = ingerir(almacen, origen, filas)
+            except Exception as error:
+                # Sin acuse el kiosco reintenta: lo que sí se guardó no se duplica
+                self.send_error(503, str(error))
+                return
+            self._responder(200, {"recibidas": len(filas), "marca": marca})
+
+        def log_message(self, *args):
+            pass
+
+    return ThreadingHTTPServer((host, puerto), Manejador)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    servidor = comandos.add_parser("colector", help="Recibe los lotes de los kioscos")
+    servidor.add_argument("--puerto", type=int, default=8765)
+    servidor.add_argument("--host", default="127.0.0.1",
+                          help="Interfaz (otra que no sea local exige KEPCHUP_COLECTOR_CLAVE)")
+    servidor.add_argument("--almacen", default="sqlite:///" + os.path.join("datos", "central.db"))
+    enviar = comandos.add_parser("enviar", help="Envía ahora todo lo pendiente de este kiosco")
+    enviar.add_argument("--colector", default=os.environ.get("KEPCHUP_COLECTOR"),
+                        help="URL del colector (por defecto KEPCHUP_COLECTOR)")
+    enviar.add_argument("--almacen", help="Almacén local (por defecto KEPCHUP_ALMACEN)")
+    args = parser.parse_args()
+    if args.comando == "enviar" and not args.colector:
+        parser.error("Falta la URL del colector (--colector o KEPCHUP_COLECTOR)")
+
+    if args.comando == "colector" and not CLAVE and not es_local(args.host):
+        parser.error(f"Sin KEPCHUP_COLECTOR_CLAVE el colector solo escucha en la interfaz local, no en {args.host}")
+
+    almacen = abrir_almacen(args.almacen)
+    if args.comando == "colector":
+        http = colector(almacen, args.puerto, args.host)
+        print(f"Colector en http://{args.host}:{args.puerto} -> {args.almacen}")
+        try:
+            http.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            http.server_close()
+            almacen.close()
+        return
+    sincronizador = Sincronizador(almacen, args.colector)
+    inicio = time.perf_counter()
+    enviadas = sincronizador.drenar()
+    segundos = time.perf_counter() - inicio
+    print(f"{'lotes':>6} {'filas':>8} {'segundos':>9} {'filas/s':>9} {'compresión':>11}")
+    print(f"{sincronizador.lotes:>6} {enviadas:>8} {segundos:>9.2f} {enviadas / segundos:>9.0f} "
+          f"{sincronizador.resumen()['compresión'] or 0:>10.1f}x")
+    almacen.close()
+
+
+if __name__ == "__main__":
+    main()
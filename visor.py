@@ -0,0 +1,217 @@
+"""
+Visor paginado de respuestas con filtros del lado del servidor.
+
+En lugar de enviar todo el DataFrame a ``st.dataframe`` en cada rerun, solo
+se serializa la página visible. Los filtros (rango de fechas, rango de edad y
+valores de columnas categóricas) se resuelven con índices precalculados una
+vez por versión de los datos:
+
+- columnas categóricas: valor -> posiciones de las filas (ordenadas);
+- fecha y edad: permutación que ordena la columna, para buscar rangos con
+  búsqueda binaria.
+
+La búsqueda por texto (``buscar``) la resuelve el índice invertido que la app
+mantiene junto con sus datos (ver ``busqueda.py``).
+
+Cada página, ya presentada y convertida a una tabla Arrow, se guarda en la
+caché de la versión: volver a mostrarla (un rerun por otro widget, volver a
+una página vista) no repite ``presentar`` ni la conversión desde pandas, y
+como los bytes serializados son idénticos, Streamlit puede mandar solo la
+referencia al mensaje que el navegador ya tiene.
+"""
+import datetime
+import time
+from collections import OrderedDict
+
+import numpy as np
+import streamlit as st
+
+import metricas
+
+# Páginas convertidas a Arrow que se guardan por versión de los datos
+MAX_PAGINAS = 16
+
+
+class IndiceRespuestas:
+    """Índices sobre un DataFrame para filtrar sin recorrer todas las filas."""
+
+    def __init__(self, df, fecha=None, edad=None, categoricas=()):
+        self.n = len(df)
+        self.fecha = fecha
+        self.edad = edad
+        self.rangos = {}
+        for columna in (fecha, edad):
+            if columna is not None and columna in df:
+                valores = df[columna].to_numpy()
+                if columna == fecha:
+                    valores = valores.astype(str)
+                orden = np.argsort(valores, kind="stable")
+                self.rangos[columna] = (valores[orden], orden)
+        self.categorias = {}
+        for columna in categoricas:
+            if columna in df:
+                codigos, valores = df[columna].factorize(sort=True)
+                orden = np.argsort(codigos, kind="stable")
+                limites = np.searchsorted(codigos[orden], np.arange(len(valores) + 1))
+                self.categorias[columna] = {
+                    valor: orden[limites[i]:limites[i + 1]] for i, valor in enumerate(valores)
+                }
+
+    def extremos(self, columna):
+        ordenados, _ = self.rangos[columna]
+        return ordenados[0], ordenados[-1]
+
+    def filtrar(self, rangos=None, valores=None, posiciones=None):
+        """
+        Posiciones (ordenadas) de las filas que cumplen todos los filtros.
+
+        ``rangos`` es ``{columna: (desde, hasta)}`` (extremos incluidos),
+        ``valores`` es ``{columna: [valores aceptados]}`` y ``posiciones``
+        (opcional) las filas que encontró la búsqueda. Devuelve ``None`` si no
+        hay ningún filtro activo.
+        """
+        conjuntos = []
+        if posiciones is not None:
+            posiciones = np.asarray(posiciones, dtype=np.intp)
+            conjuntos.append(posiciones[posiciones < self.n])
+        for columna, (desde, hasta) in (rangos or {}).items():
+            ordenados, orden = self.rangos[columna]
+            inicio = np.searchsorted(ordenados, desde, side="left")
+            fin = np.searchsorted(ordenados, hasta, side="right")
+            conjuntos.append(np.sort(orden[inicio:fin]))
+        for columna, aceptados in (valores or {}).items():
+            indice = self.categorias[columna]
+            partes = [indice[v] for v in aceptados if v in indice]
+            conjuntos.append(np.sort(np.concatenate(partes)) if partes else np.empty(0, dtype=np.intp))
+        if not conjuntos:
+            return None
+        # Se intersecta empezando por el conjunto más chico.
+        conjuntos.sort(key=len)
+        resultado = conjuntos[0]
+        for conjunto in conjuntos[1:]:
+            resultado = np.intersect1d(resultado, conjunto, assume_unique=True)
+        return resultado
+
+
+class CacheVisor:
+    """
+    DataFrame, índices y páginas ya convertidas de la última versión mostrada.
+    Es mutable para que el registro de sesiones pueda soltarlos (``clear``)
+    desde otra sesión.
+    """
+
+    __slots__ = ("version", "df", "indice", "paginas")
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.version = self.df = self.indice = None
+        self.paginas = OrderedDict()  # (filas, columnas) -> tabla Arrow
+
+    def pagina(self, filas, columnas, presentar):
+        """Tabla Arrow de las ``filas`` y ``columnas`` pedidas, convertida una vez por versión."""
+        clave = (filas.tobytes(), tuple(columnas))
+        tabla = self.paginas.get(clave)
+        if tabla is not None:
+            self.paginas.move_to_end(clave)
+            return tabla
+        import pyarrow as pa
+
+        tabla = self.df.iloc[filas][list(columnas)]
+        if presentar is not None:
+            tabla = presentar(tabla)
+        try:
+            tabla = pa.Table.from_pandas(tabla)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            pass  # columnas mixtas: se deja el DataFrame y Streamlit lo adapta
+        self.paginas[clave] = tabla
+        if len(self.paginas) > MAX_PAGINAS:
+            self.paginas.popitem(last=False)
+        return tabla
+
+    @property
+    def nbytes(self):
+        # Índices y páginas: el DataFrame suele ser una vista del buffer de la app
+        if self.indice is None:
+            return 0
+        arreglos = [a for par in self.indice.rangos.values() for a in par]
+        arreglos += [a for grupos in self.indice.categorias.values() for a in grupos.values()]
+        return sum(a.nbytes for a in arreglos) + sum(getattr(t, "nbytes", 0) for t in self.paginas.values())
+
+
+def _datos_en_cache(clave, version, construir_frame, fecha, edad, categoricas):
+    # El DataFrame, sus índices y las páginas se rearman solo cuando cambia la versión.
+    cache = st.session_state.get(f"_visor_{clave}")
+    if cache is None:
+        cache = st.session_state[f"_visor_{clave}"] = CacheVisor()
+    if cache.df is None or cache.version != version:
+        with metricas.medir("visor.frame"):
+            df = construir_frame()
+            cache.clear()
+            cache.version, cache.df, cache.indice = version, df, IndiceRespuestas(df, fecha, edad, categoricas)
+    return cache
+
+
+def mostrar_paginado(clave, version, construir_frame, fecha=None, edad=None, categoricas=(),
+                     tam_pagina=50, presentar=None, buscar=None):
+    """
+    Muestra la página seleccionada de las respuestas, con filtros y selección de columnas.
+
+    ``construir_frame`` solo se llama cuando ``version`` cambia. ``presentar``
+    (opcional) transforma solo la página visible antes de mostrarla, por
+    ejemplo para decodificar columnas compactas a sus etiquetas. ``buscar``
+    (opcional) recibe el texto del buscador y devuelve las posiciones de las
+    filas que coinciden (None sin texto).
+    """
+    cache = _datos_en_cache(clave, version, construir_frame, fecha, edad, categoricas)
+    df, indice = cache.df, cache.indice
+
+    encontradas = None
+    if buscar is not None:
+        consulta = st.text_input("Buscar", key=f"{clave}_buscar",
+                                 placeholder="Palabras o su comienzo (sin importar tildes ni mayúsculas)")
+        with metricas.medir("visor.buscar"):
+            encontradas = buscar(consulta)
+
+    rangos, valores = {}, {}
+    with st.expander("Filtros y columnas"):
+        if fecha in indice.rangos:
+            primera, ultima = indice.extremos(fecha)
+            defecto = (datetime.date.fromisoformat(primera[:10]), datetime.date.fromisoformat(ultima[:10]))
+            # El rango por defecto sigue a los datos: si no se tocó, se extiende con las filas nuevas
+            clave_fechas, anterior = f"{clave}_fechas", st.session_state.get(f"{clave}_fechas_defecto")
+            if anterior != defecto:
+                if st.session_state.get(clave_fechas) in (None, anterior):
+                    st.session_state[clave_fechas] = defecto
+                st.session_state[f"{clave}_fechas_defecto"] = defecto
+            rango_fechas = st.date_input("Rango de fechas", key=clave_fechas)
+            if len(rango_fechas) == 2:
+                rangos[fecha] = (f"{rango_fechas[0]} 00:00:00", f"{rango_fechas[1]} 23:59:59")
+        if edad in indice.rangos:
+            minima, maxima = (int(v) for v in indice.extremos(edad))
+            if minima < maxima:
+                rango_edad = st.slider("Rango de edad", minima, maxima, (minima, maxima), key=f"{clave}_edad")
+                if rango_edad != (minima, maxima):
+                    rangos[edad] = rango_edad
+        for columna, grupos in indice.categorias.items():
+            elegidos = st.multiselect(columna, options=list(grupos), key=f"{clave}_{columna}")
+            if elegidos:
+                valores[columna] = elegidos
+        columnas = st.multiselect("Columnas", options=list(df.columns), default=list(df.columns),
+                                  key=f"{clave}_columnas")
+
+    inicio_render = time.perf_counter()
+    posiciones = indice.filtrar(rangos, valores, encontradas)
+    total = indice.n if posiciones is None else len(posiciones)
+    paginas = max(1, -(-total // tam_pagina))
+    pagina = st.number_input("Página", min_value=1, max_value=paginas, value=1, step=1, key=f"{clave}_pagina")
+    desde = (pagina - 1) * tam_pagina
+    hasta = min(desde + tam_pagina, total)
+    filas = np.arange(desde, hasta) if posiciones is None else posiciones[desde:hasta]
+    with metricas.medir("visor.pagina"):
+        tabla = cache.pagina(filas, columnas or list(df.columns), presentar)
+    st.dataframe(tabla)
+    duracion = (time.perf_counter() - inicio_render) * 1000
+    st.caption(f"Filas {desde + 1 if total else 0}–{hasta} de {total} · página {pagina}/{paginas} · "
+               f"renderizada en {duracion:.1f} ms")